@@ -0,0 +1,128 @@
+"""
+Process-wide registry of compiled LangGraph agents
+
+Each graph variant is built and compiled once, then the compiled graph is
+shared by every request. Compiled graphs keep no per-run state, so the same
+instance can be invoked concurrently.
+"""
+import sys
+import os
+import functools
+import threading
+import importlib.util
+import logging
+
+# Import agent functions directly from file path to avoid package conflicts
+agent_path = os.path.join(os.path.dirname(__file__), '../../langgraph/tools/agent.py')
+spec = importlib.util.spec_from_file_location("agent_module", agent_path)
+agent_module = importlib.util.module_from_spec(spec)
+sys.modules["agent_module"] = agent_module
+spec.loader.exec_module(agent_module)
+
+logger = logging.getLogger(__name__)
+
+# Graph mode used when a request doesn't pick one (see agent_module.AGENT_MODES)
+DEFAULT_MODE = os.getenv("AGENT_MODE", "sequential")
+if DEFAULT_MODE not in agent_module.AGENT_MODES:
+    raise ValueError(f"AGENT_MODE must be one of {agent_module.AGENT_MODES}, got {DEFAULT_MODE!r}")
+
+
+def variant_name(mode: str = None, use_async: bool = False) -> str:
+    """
+    Registry key for a graph mode and sync/async flavour
+
+    Args:
+        mode: One of agent_module.AGENT_MODES, or None for DEFAULT_MODE
+        use_async: Whether the async node implementations are wanted
+    """
+    mode = mode or DEFAULT_MODE
+    if mode not in agent_module.AGENT_MODES:
+        raise ValueError(f"Unknown agent mode: {mode}")
+    return f"{mode}_async" if use_async else mode
+
+
+# variant name -> zero-argument function returning a compiled graph
+_builders = {}
+for _mode in agent_module.AGENT_MODES:
+    _builders[variant_name(_mode)] = functools.partial(agent_module.create_agent, mode=_mode)
+    _builders[variant_name(_mode, use_async=True)] = functools.partial(agent_module.create_agent, use_async=True, mode=_mode)
+
+DEFAULT_VARIANT = variant_name()
+_compiled = {}
+_lock = threading.Lock()
+
+_status = {
+    "ready": False,
+    "llm_ready": False,
+    "llm_error": None,
+}
+
+
+def register_variant(name: str, builder):
+    """
+    Register a graph variant
+
+    Args:
+        name: Variant name used by get_agent()
+        builder: Zero-argument callable returning a compiled graph
+    """
+    with _lock:
+        _builders[name] = builder
+        _compiled.pop(name, None)
+
+
+def get_agent(variant: str = DEFAULT_VARIANT):
+    """
+    Get the shared compiled graph for a variant, compiling it on first use
+
+    Args:
+        variant: Registered variant name
+
+    Returns:
+        Compiled LangGraph graph
+    """
+    agent = _compiled.get(variant)
+    if agent is not None:
+        return agent
+
+    with _lock:
+        agent = _compiled.get(variant)
+        if agent is None:
+            if variant not in _builders:
+                raise ValueError(f"Unknown agent variant: {variant}")
+            agent = _builders[variant]()
+            _compiled[variant] = agent
+    return agent
+
+
+def warm_up():
+    """
+    Compile every registered variant and create the LLM client.
+
+    Called once at application startup so the first request doesn't pay for
+    graph construction. A missing GROQ_API_KEY does not fail startup; the
+    non-AI endpoints keep working and readiness reports the LLM as unavailable.
+    """
+    for name in list(_builders):
+        get_agent(name)
+
+    try:
+        agent_module.get_llm()
+        _status["llm_ready"] = True
+        _status["llm_error"] = None
+    except Exception as e:
+        logger.warning("LLM warm-up skipped: %s", e)
+        _status["llm_ready"] = False
+        _status["llm_error"] = str(e)
+
+    _status["ready"] = True
+
+
+def readiness() -> dict:
+    """Readiness information for the health endpoint"""
+    return {
+        "ready": _status["ready"],
+        "agents": sorted(_compiled),
+        "llm_ready": _status["llm_ready"],
+        "llm_error": _status["llm_error"],
+    }
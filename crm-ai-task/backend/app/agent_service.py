@@ -1,247 +1,594 @@
 """
 Agent service to handle LangGraph agent interactions
 """
-import sys
 import os
-import importlib.util
+import asyncio
+import logging
 
-# Import agent functions directly from file path to avoid package conflicts
-agent_path = os.path.join(os.path.dirname(__file__), '../../langgraph/tools/agent.py')
-spec = importlib.util.spec_from_file_location("agent_module", agent_path)
-agent_module = importlib.util.module_from_spec(spec)
-sys.modules["agent_module"] = agent_module
-spec.loader.exec_module(agent_module)
-
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import HumanMessage, AIMessage
 from datetime import datetime
-from typing import Optional
+from typing import Callable, Optional
 import json
 
 # Import CRUD functions
-from . import crud, schemas
+from . import crud, edit_parser, follow_ups, metrics, schemas
+from .agent_registry import agent_module, get_agent, variant_name, DEFAULT_MODE
+from .name_index import normalize_name
+
+logger = logging.getLogger(__name__)
 
 # Get functions from agent module
 create_agent = agent_module.create_agent
 tools = agent_module.tools
 
-def process_conversational_input(user_input: str, rep_id: str = "default_rep") -> dict:
+# Minimum name-search score for the agent to link a note to an existing HCP
+HCP_MATCH_MIN_SCORE = float(os.getenv("HCP_MATCH_MIN_SCORE", "0.6"))
+
+# Default number of notes a batch request runs through the agent at once
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+# Apply simple edits ("change sentiment to negative") with rules instead of the LLM
+EDIT_RULES_ENABLED = os.getenv("EDIT_RULES_ENABLED", "true").lower() not in ("0", "false", "no")
+
+def _missing_key_response() -> Optional[dict]:
+    """Error response if no LLM is available, else None"""
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    if agent_module.llm_configured():
+        return None
+    return {
+        "success": False,
+        "error": "GROQ_API_KEY environment variable is not set. Please create a .env file in the backend directory with: GROQ_API_KEY=your_api_key_here",
+        "extracted_data": {},
+        "ai_response": "⚠️ AI features require GROQ_API_KEY. Please set it in your .env file. Get your key from: https://console.groq.com/"
+    }
+
+def resolve_hcp(hcp_name: str) -> Optional[dict]:
+    """
+    Best existing HCP for an extracted name, or None
+
+    Only a confident match is reused so a fuzzy hit on a different doctor
+    doesn't absorb the interaction.
+    """
+    existing_hcps = crud.search_hcp_by_name(hcp_name, limit=1, min_score=HCP_MATCH_MIN_SCORE)
+    return existing_hcps[0] if existing_hcps else None
+
+def _initial_state(user_input: str) -> dict:
+    return {
+        "messages": [HumanMessage(content=user_input)],
+        "extracted_data": {},
+        "interaction_id": None,
+        "crud_functions": {
+            "create_interaction": crud.create_interaction,
+            "search_hcp": crud.search_hcp_by_name,
+            "get_hcp": crud.get_hcp_by_id,
+            "resolve_hcp": resolve_hcp
+        }
+    }
+
+# Fallback path: direct LLM extraction if the agent fails
+
+def _fallback_extraction_prompt(user_input: str) -> str:
+    return f"""Extract the following information from this text and return ONLY valid JSON:
+- hcp_name: Name of the healthcare professional
+- datetime: Date and time (ISO format if available)
+- summary: Summary of discussion
+- materials: Array of {{"material_type": str, "quantity": int}} if mentioned
+- samples: Array of {{"product_code": str, "quantity": int}} if mentioned
+- topics: Array of discussion topics
+- outcome: Any outcomes or decisions
+
+Text: {user_input}
+
+Return JSON:"""
+
+def _parse_fallback_extraction(content: str, user_input: str) -> dict:
+    try:
+        return json.loads(content)
+    except:
+        return {"hcp_name": "", "summary": user_input, "materials": [], "samples": [], "topics": []}
+
+def _fallback_sentiment_prompt(extracted: dict, user_input: str) -> str:
+    return f"Analyze sentiment (positive/neutral/negative) of: {extracted.get('summary', user_input)}. Return only the word."
+
+def _parse_fallback_sentiment(content: str) -> str:
+    sentiment = content.lower().strip().split()[0] if content else "neutral"
+    if sentiment not in ["positive", "neutral", "negative"]:
+        sentiment = "neutral"
+    return sentiment
+
+def _fallback_followup_prompt(extracted: dict, user_input: str) -> str:
+    return f"Suggest 2 follow-up actions for: {extracted.get('summary', user_input)}. Return JSON array with 'action_item' and 'priority'."
+
+def _parse_fallback_followups(content: str) -> list:
+    try:
+        return json.loads(content)
+    except:
+        return [{"action_item": "Follow up on discussed topics", "priority": "medium"}]
+
+def _fallback_result(extracted: dict, user_input: str) -> dict:
+    ai_response = f"Extracted information:\n- HCP: {extracted.get('hcp_name', 'Not specified')}\n- Summary: {extracted.get('summary', 'N/A')}\n- Sentiment: {extracted.get('sentiment', 'neutral')}"
+    return {"extracted_data": extracted, "messages": [HumanMessage(content=user_input), AIMessage(content=ai_response)]}
+
+def _run_fallback(llm, user_input: str, mode: str = None) -> dict:
+    if mode == "single_call":
+        return _fallback_result(agent_module.single_call_extract(user_input), user_input)
+
+    response = llm.invoke([HumanMessage(content=_fallback_extraction_prompt(user_input))])
+    extracted = _parse_fallback_extraction(response.content, user_input)
+
+    # Analyze sentiment
+    local = agent_module.local_sentiment(extracted.get("summary", user_input))
+    if local is not None:
+        extracted["sentiment"] = local["sentiment"]
+    else:
+        sentiment_resp = llm.invoke([HumanMessage(content=_fallback_sentiment_prompt(extracted, user_input))])
+        extracted["sentiment"] = _parse_fallback_sentiment(sentiment_resp.content)
+
+    # Suggest follow-ups
+    followup_resp = llm.invoke([HumanMessage(content=_fallback_followup_prompt(extracted, user_input))])
+    extracted["suggested_follow_ups"] = _parse_fallback_followups(followup_resp.content)
+
+    return _fallback_result(extracted, user_input)
+
+async def _arun_fallback(llm, user_input: str, mode: str = None) -> dict:
+    if mode == "single_call":
+        return _fallback_result(await agent_module.asingle_call_extract(user_input), user_input)
+
+    response = await llm.ainvoke([HumanMessage(content=_fallback_extraction_prompt(user_input))])
+    extracted = _parse_fallback_extraction(response.content, user_input)
+
+    # Analyze sentiment
+    local = agent_module.local_sentiment(extracted.get("summary", user_input))
+    if local is not None:
+        extracted["sentiment"] = local["sentiment"]
+    else:
+        sentiment_resp = await llm.ainvoke([HumanMessage(content=_fallback_sentiment_prompt(extracted, user_input))])
+        extracted["sentiment"] = _parse_fallback_sentiment(sentiment_resp.content)
+
+    # Suggest follow-ups
+    followup_resp = await llm.ainvoke([HumanMessage(content=_fallback_followup_prompt(extracted, user_input))])
+    extracted["suggested_follow_ups"] = _parse_fallback_followups(followup_resp.content)
+
+    return _fallback_result(extracted, user_input)
+
+def _llm_init_error(llm_error: Exception) -> dict:
+    return {
+        "success": False,
+        "error": f"Failed to initialize LLM: {str(llm_error)}",
+        "extracted_data": {},
+        "ai_response": "⚠️ Could not connect to Groq API. Please check your API key."
+    }
+
+def _prepare_interaction(result: dict, user_input: str, rep_id: str) -> dict:
+    """
+    Turn an agent result into the records to persist, without writing anything
+
+    Returns:
+        dict with extracted, ai_response, hcp_id (existing HCP or None),
+        new_hcp (HCPCreate to create, or None) and interaction (InteractionCreate
+        whose hcp_id is filled in once new_hcp exists)
+    """
+    # Extract results
+    extracted = result.get("extracted_data", {})
+    messages = result.get("messages", [])
+
+    # Get AI response from messages
+    ai_response = "Processing complete"
+    for msg in reversed(messages):
+        if hasattr(msg, 'content'):
+            if not isinstance(msg, HumanMessage):
+                ai_response = msg.content
+                break
+
+    # Try to find or create HCP. The parallel graph has already looked the
+    # name up and stored the result (possibly None) under "hcp_id".
+    hcp_id = extracted.get("hcp_id")
+    new_hcp = None
+    hcp_name = extracted.get("hcp_name", "")
+    if hcp_name and not hcp_id:
+        existing = resolve_hcp(hcp_name) if "hcp_id" not in extracted else None
+        if existing:
+            hcp_id = existing["id"]
+        else:
+            new_hcp = schemas.HCPCreate(
+                name=hcp_name,
+                title=extracted.get("title"),
+                speciality=extracted.get("speciality"),
+                organisation=extracted.get("organisation")
+            )
+
+    # Prepare interaction data
+    interaction_data = {
+        "hcp_id": hcp_id,
+        "rep_id": rep_id,
+        "mode": "conversational",
+        "datetime": extracted.get("datetime"),
+        "summary": extracted.get("summary"),
+        "sentiment": extracted.get("sentiment"),
+        "topics": extracted.get("topics", []),
+        "outcome": extracted.get("outcome"),
+        "source_raw": user_input,
+        "materials": [schemas.MaterialSharedCreate(**m) for m in extracted.get("materials", [])],
+        "samples": [schemas.SampleCreate(**s) for s in extracted.get("samples", [])],
+        "follow_ups": []
+    }
+
+    # Add suggested follow-ups, due in a few days depending on their priority
+    for sug_fu in extracted.get("suggested_follow_ups", []):
+        interaction_data["follow_ups"].append(schemas.FollowUpCreate(
+            action_item=sug_fu.get("action_item", ""),
+            due_date=follow_ups.suggested_due_date(sug_fu.get("priority")),
+            owner=rep_id,
+            status="open"
+        ))
+
+    return {
+        "extracted": extracted,
+        "ai_response": ai_response,
+        "new_hcp": new_hcp,
+        "interaction": schemas.InteractionCreate(**interaction_data)
+    }
+
+def _success_result(prepared: dict, created_interaction: dict) -> dict:
+    extracted = prepared["extracted"]
+    return {
+        "success": True,
+        "extracted_data": extracted,
+        "ai_response": prepared["ai_response"],
+        "interaction": created_interaction,
+        "sentiment": extracted.get("sentiment", "neutral"),
+        "suggested_follow_ups": extracted.get("suggested_follow_ups", [])
+    }
+
+def _finalize_result(result: dict, user_input: str, rep_id: str,
+                     on_saved: Optional[Callable[[dict], None]] = None) -> dict:
+    """
+    Resolve the HCP, persist the interaction and build the API response
+
+    on_saved, if given, gets the response as soon as the interaction exists
+    (the job queue records it so an interrupted job is not run twice).
+    """
+    prepared = _prepare_interaction(result, user_input, rep_id)
+    interaction_in = prepared["interaction"]
+
+    # Create new HCP
+    if prepared["new_hcp"] is not None:
+        interaction_in.hcp_id = crud.create_hcp(prepared["new_hcp"])["id"]
+
+    # Create interaction
+    created_interaction = crud.create_interaction(interaction_in)
+    response = _success_result(prepared, created_interaction)
+    if on_saved is not None:
+        on_saved(response)
+    return response
+
+def _error_result(e: Exception) -> dict:
+    return {
+        "success": False,
+        "error": str(e),
+        "extracted_data": {},
+        "ai_response": f"Error processing: {str(e)}"
+    }
+
+def process_conversational_input(user_input: str, rep_id: str = "default_rep", mode: Optional[str] = None,
+                                 on_saved: Optional[Callable[[dict], None]] = None) -> dict:
     """
     Process conversational input through LangGraph agent
-    
+
     Args:
         user_input: User's conversational text
         rep_id: Representative ID
-    
+        mode: Graph mode ("sequential", "single_call" or "parallel"); defaults to AGENT_MODE
+        on_saved: Called with the response once the interaction is persisted
+
     Returns:
         dict with extracted data, sentiment, follow-ups, and response
     """
+    mode = mode or DEFAULT_MODE
+
     # Check for API key first
-    from dotenv import load_dotenv
-    load_dotenv()
-    api_key = os.getenv("GROQ_API_KEY", "")
-    
-    if not api_key:
-        return {
-            "success": False,
-            "error": "GROQ_API_KEY environment variable is not set. Please create a .env file in the backend directory with: GROQ_API_KEY=your_api_key_here",
-            "extracted_data": {},
-            "ai_response": "⚠️ AI features require GROQ_API_KEY. Please set it in your .env file. Get your key from: https://console.groq.com/"
-        }
-    
+    missing_key = _missing_key_response()
+    if missing_key:
+        return missing_key
+
     try:
-        # Create agent
-        agent = create_agent()
-        
-        # Initialize state
-        initial_state = {
-            "messages": [HumanMessage(content=user_input)],
-            "extracted_data": {},
-            "interaction_id": None,
-            "crud_functions": {
-                "create_interaction": crud.create_interaction,
-                "search_hcp": crud.search_hcp_by_name,
-                "get_hcp": crud.get_hcp_by_id
-            }
-        }
-        
+        # Shared compiled agent (built once per process)
+        agent = get_agent(variant_name(mode))
+
         # Run agent
         try:
-            result = agent.invoke(initial_state)
+            result = agent.invoke(_initial_state(user_input))
         except Exception as agent_error:
-            print(f"Agent error: {agent_error}")
-            # Fallback: use direct LLM extraction if agent fails
-            from langchain_groq import ChatGroq
-            
-            # Check API key again for fallback
-            if not api_key:
-                raise ValueError("GROQ_API_KEY not set")
-            
+            _agent_failed("sync", agent_error)
             try:
-                llm = ChatGroq(model="llama-3.1-8b-instant", groq_api_key=api_key)
+                llm = agent_module.get_llm("fallback")
             except Exception as llm_error:
-                return {
-                    "success": False,
-                    "error": f"Failed to initialize LLM: {str(llm_error)}",
-                    "extracted_data": {},
-                    "ai_response": "⚠️ Could not connect to Groq API. Please check your API key."
-                }
-            extraction_prompt = f"""Extract the following information from this text and return ONLY valid JSON:
-- hcp_name: Name of the healthcare professional
-- datetime: Date and time (ISO format if available)
-- summary: Summary of discussion
-- materials: Array of {{"material_type": str, "quantity": int}} if mentioned
-- samples: Array of {{"product_code": str, "quantity": int}} if mentioned
-- topics: Array of discussion topics
-- outcome: Any outcomes or decisions
+                return _llm_init_error(llm_error)
+            result = _run_fallback(llm, user_input, mode)
 
-Text: {user_input}
+        return _finalize_result(result, user_input, rep_id, on_saved)
 
-Return JSON:"""
-            
-            response = llm.invoke([HumanMessage(content=extraction_prompt)])
+    except Exception as e:
+        return _error_result(e)
+
+async def aprocess_conversational_input(user_input: str, rep_id: str = "default_rep", mode: Optional[str] = None,
+                                        on_saved: Optional[Callable[[dict], None]] = None) -> dict:
+    """
+    Async variant of process_conversational_input
+
+    LLM calls are awaited with ainvoke, so a single worker can hold many
+    notes in flight. CRUD work runs in a worker thread so a blocking store
+    never stalls the event loop.
+
+    Args:
+        user_input: User's conversational text
+        rep_id: Representative ID
+        mode: Graph mode ("sequential", "single_call" or "parallel"); defaults to AGENT_MODE
+        on_saved: Called with the response once the interaction is persisted
+
+    Returns:
+        dict with extracted data, sentiment, follow-ups, and response
+    """
+    mode = mode or DEFAULT_MODE
+    missing_key = _missing_key_response()
+    if missing_key:
+        return missing_key
+
+    try:
+        result = await _arun_agent(user_input, mode)
+        if result.get("success") is False:
+            return result
+        return await asyncio.to_thread(_finalize_result, result, user_input, rep_id, on_saved)
+
+    except Exception as e:
+        return _error_result(e)
+
+def _agent_failed(mode: str, agent_error: Exception):
+    logger.warning("Agent run failed (%s), falling back to direct extraction: %s", mode, agent_error)
+    metrics.record_fallback(mode, agent_error)
+
+async def _arun_agent(user_input: str, mode: str) -> dict:
+    """Run the async graph, falling back to direct LLM calls if it fails"""
+    agent = get_agent(variant_name(mode, use_async=True))
+    try:
+        return await agent.ainvoke(_initial_state(user_input))
+    except Exception as agent_error:
+        _agent_failed("async", agent_error)
+        try:
+            llm = agent_module.get_llm("fallback")
+        except Exception as llm_error:
+            return _llm_init_error(llm_error)
+        return await _arun_fallback(llm, user_input, mode)
+
+async def astream_conversational_input(user_input: str, rep_id: str = "default_rep", mode: Optional[str] = None):
+    """
+    Streaming variant of aprocess_conversational_input
+
+    Yields (event, data) pairs:
+        ("node", {"node", "extracted_data"}) as each graph node finishes
+        ("token", {"text"}) for the generate_response text
+        ("fallback", {"error"}) if the graph failed and direct LLM extraction took over
+        ("done", full response, as returned by the non-streaming endpoint)
+        ("error", {"error"}) on failure; no further events follow
+    """
+    mode = mode or DEFAULT_MODE
+    missing_key = _missing_key_response()
+    if missing_key:
+        yield "error", {"error": missing_key["error"]}
+        return
+
+    try:
+        agent = get_agent(variant_name(mode, use_async=True))
+        state = _initial_state(user_input)
+        extracted, messages = {}, state["messages"]
+        try:
+            async for stream_mode, chunk in agent.astream(state, stream_mode=["updates", "custom"]):
+                if stream_mode == "custom":
+                    if "token" in chunk:
+                        yield "token", {"text": chunk["token"]}
+                    continue
+                for node, update in chunk.items():
+                    update = update or {}
+                    node_data = update.get("extracted_data") or {}
+                    extracted.update(node_data)
+                    messages = update.get("messages", messages)
+                    yield "node", {"node": node, "extracted_data": node_data}
+            result = {"extracted_data": extracted, "messages": messages}
+        except Exception as agent_error:
+            _agent_failed("stream", agent_error)
+            yield "fallback", {"error": str(agent_error)}
             try:
-                extracted = json.loads(response.content)
-            except:
-                extracted = {"hcp_name": "", "summary": user_input, "materials": [], "samples": [], "topics": []}
-            
-            # Analyze sentiment
-            sentiment_prompt = f"Analyze sentiment (positive/neutral/negative) of: {extracted.get('summary', user_input)}. Return only the word."
-            sentiment_resp = llm.invoke([HumanMessage(content=sentiment_prompt)])
-            extracted["sentiment"] = sentiment_resp.content.lower().strip().split()[0] if sentiment_resp.content else "neutral"
-            if extracted["sentiment"] not in ["positive", "neutral", "negative"]:
-                extracted["sentiment"] = "neutral"
-            
-            # Suggest follow-ups
-            followup_prompt = f"Suggest 2 follow-up actions for: {extracted.get('summary', user_input)}. Return JSON array with 'action_item' and 'priority'."
-            followup_resp = llm.invoke([HumanMessage(content=followup_prompt)])
+                llm = agent_module.get_llm("fallback")
+            except Exception as llm_error:
+                yield "error", {"error": _llm_init_error(llm_error)["error"]}
+                return
+            result = await _arun_fallback(llm, user_input, mode)
+
+        yield "done", await asyncio.to_thread(_finalize_result, result, user_input, rep_id)
+
+    except Exception as e:
+        yield "error", {"error": str(e)}
+
+def _persist_batch(prepared_items: list) -> list:
+    """
+    Create the HCPs and interactions for a batch with one bulk call each
+
+    Notes naming the same new HCP share a single created record. If a bulk
+    call is rejected, its items are retried one by one (as bulk_import
+    does), so only the failing notes are lost. Returns, per item, the
+    created interaction or the exception that stopped it.
+    """
+    new_hcps, hcp_slots = [], {}
+    for prepared in prepared_items:
+        new_hcp = prepared["new_hcp"]
+        if new_hcp is not None:
+            key = " ".join(normalize_name(new_hcp.name)) or new_hcp.name
+            if key not in hcp_slots:
+                hcp_slots[key] = len(new_hcps)
+                new_hcps.append(new_hcp)
+            prepared["hcp_slot"] = hcp_slots[key]
+
+    try:
+        created_hcps = crud.bulk_create_hcps(new_hcps) if new_hcps else []
+    except Exception:
+        created_hcps = []
+        for new_hcp in new_hcps:
             try:
-                extracted["suggested_follow_ups"] = json.loads(followup_resp.content)
-            except:
-                extracted["suggested_follow_ups"] = [{"action_item": "Follow up on discussed topics", "priority": "medium"}]
-            
-            ai_response = f"Extracted information:\n- HCP: {extracted.get('hcp_name', 'Not specified')}\n- Summary: {extracted.get('summary', 'N/A')}\n- Sentiment: {extracted.get('sentiment', 'neutral')}"
-            from langchain_core.messages import AIMessage
-            result = {"extracted_data": extracted, "messages": [HumanMessage(content=user_input), AIMessage(content=ai_response)]}
-        
-        # Extract results
-        extracted = result.get("extracted_data", {})
-        messages = result.get("messages", [])
-        
-        # Get AI response from messages
-        ai_response = "Processing complete"
-        for msg in reversed(messages):
-            if hasattr(msg, 'content'):
-                from langchain_core.messages import HumanMessage as HM
-                if not isinstance(msg, HM):
-                    ai_response = msg.content
-                    break
-        
-        # Try to find or create HCP
-        hcp_id = None
-        hcp_name = extracted.get("hcp_name", "")
-        if hcp_name:
-            # Search for existing HCP
-            existing_hcps = crud.search_hcp_by_name(hcp_name, limit=1)
-            if existing_hcps:
-                hcp_id = existing_hcps[0]["id"]
+                created_hcps.append(crud.create_hcp(new_hcp))
+            except Exception as e:
+                created_hcps.append(e)
+
+    outcomes, ready = [None] * len(prepared_items), []
+    for position, prepared in enumerate(prepared_items):
+        if "hcp_slot" in prepared:
+            hcp = created_hcps[prepared["hcp_slot"]]
+            if isinstance(hcp, Exception):
+                outcomes[position] = hcp
+                continue
+            prepared["interaction"].hcp_id = hcp["id"]
+        ready.append(position)
+
+    try:
+        created = crud.bulk_create_interactions([prepared_items[p]["interaction"] for p in ready]) if ready else []
+        for position, inter in zip(ready, created):
+            outcomes[position] = inter
+    except Exception:
+        for position in ready:
+            try:
+                outcomes[position] = crud.create_interaction(prepared_items[position]["interaction"])
+            except Exception as e:
+                outcomes[position] = e
+    return outcomes
+
+async def aprocess_conversational_batch(notes: list, max_concurrency: int = None, mode: Optional[str] = None) -> dict:
+    """
+    Process many notes through the agent concurrently
+
+    Agent runs are bounded by max_concurrency (LLM calls are additionally
+    throttled by the shared rate limiter, if configured). All resulting HCPs
+    and interactions are then written with one bulk CRUD call each. A failing
+    note is reported in its own result and never aborts the batch.
+
+    Args:
+        notes: List of objects with text, rep_id and optional mode
+        max_concurrency: Notes processed at once (default BATCH_MAX_CONCURRENCY)
+        mode: Graph mode for notes that don't set their own
+
+    Returns:
+        dict with per-note results in input order
+    """
+    missing_key = _missing_key_response()
+    if missing_key:
+        return missing_key
+
+    semaphore = asyncio.Semaphore(max_concurrency or BATCH_MAX_CONCURRENCY)
+
+    async def run_one(note):
+        async with semaphore:
+            try:
+                result = await _arun_agent(note.text, note.mode or mode or DEFAULT_MODE)
+                if result.get("success") is False:
+                    return result
+                # resolve_hcp is a blocking store lookup, so keep it off the event loop
+                return await asyncio.to_thread(_prepare_interaction, result, note.text, note.rep_id)
+            except Exception as e:
+                return _error_result(e)
+
+    outcomes = await asyncio.gather(*[run_one(note) for note in notes])
+
+    # Only notes that produced an interaction go to the bulk write
+    prepared_items = [o for o in outcomes if "interaction" in o]
+    created = await asyncio.to_thread(_persist_batch, prepared_items) if prepared_items else []
+    created_iter = iter(created)
+
+    results = []
+    for index, outcome in enumerate(outcomes):
+        if "interaction" in outcome:
+            created_interaction = next(created_iter)
+            if isinstance(created_interaction, Exception):
+                item = {"success": False, "error": str(created_interaction)}
             else:
-                # Create new HCP
-                new_hcp = crud.create_hcp(schemas.HCPCreate(
-                    name=hcp_name,
-                    title=extracted.get("title"),
-                    speciality=extracted.get("speciality"),
-                    organisation=extracted.get("organisation")
-                ))
-                hcp_id = new_hcp["id"]
-        
-        # Prepare interaction data
-        interaction_data = {
-            "hcp_id": hcp_id,
-            "rep_id": rep_id,
-            "mode": "conversational",
-            "datetime": extracted.get("datetime"),
-            "summary": extracted.get("summary"),
-            "sentiment": extracted.get("sentiment"),
-            "topics": extracted.get("topics", []),
-            "outcome": extracted.get("outcome"),
-            "source_raw": user_input,
-            "materials": [schemas.MaterialSharedCreate(**m) for m in extracted.get("materials", [])],
-            "samples": [schemas.SampleCreate(**s) for s in extracted.get("samples", [])],
-            "follow_ups": []
-        }
-        
-        # Add suggested follow-ups
-        for sug_fu in extracted.get("suggested_follow_ups", []):
-            interaction_data["follow_ups"].append(schemas.FollowUpCreate(
-                action_item=sug_fu.get("action_item", ""),
-                owner=rep_id,
-                status="open"
-            ))
-        
-        # Create interaction
-        created_interaction = crud.create_interaction(schemas.InteractionCreate(**interaction_data))
-        
-        return {
-            "success": True,
-            "extracted_data": extracted,
-            "ai_response": ai_response,
-            "interaction": created_interaction,
-            "sentiment": extracted.get("sentiment", "neutral"),
-            "suggested_follow_ups": extracted.get("suggested_follow_ups", [])
-        }
-        
-    except Exception as e:
-        return {
-            "success": False,
-            "error": str(e),
-            "extracted_data": {},
-            "ai_response": f"Error processing: {str(e)}"
-        }
+                item = _success_result(outcome, created_interaction)
+        else:
+            item = {"success": False, "error": outcome.get("error", "Processing failed")}
+        item["index"] = index
+        results.append(item)
+
+    succeeded = sum(1 for r in results if r["success"])
+    return {
+        "success": True,
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results
+    }
+
+def _edit_result(updated: Optional[dict], applied_by: str) -> dict:
+    if updated is None:
+        return {"success": False, "error": "Interaction not found"}
+    return {"success": True, "interaction": updated, "applied_by": applied_by}
+
+def _rule_edit(existing: dict, edit_request: str) -> Optional[dict]:
+    return edit_parser.parse_edit(edit_request, existing) if EDIT_RULES_ENABLED else None
 
 def edit_interaction_via_agent(interaction_id: str, edit_request: str) -> dict:
     """
     Edit an interaction using natural language
-    
+
+    Simple edits are applied by edit_parser's rules without an LLM call;
+    anything else asks the LLM with a prompt holding only the editable
+    schema and the fields the request mentions.
+
     Args:
         interaction_id: ID of interaction to edit
         edit_request: Natural language edit request
-    
+
     Returns:
-        Updated interaction
+        Updated interaction, and "applied_by" ("rules" or "llm")
     """
     try:
         # Get existing interaction
         existing = crud.get_interaction(interaction_id)
         if not existing:
             return {"success": False, "error": "Interaction not found"}
-        
+
+        updates = _rule_edit(existing, edit_request)
+        if updates is not None:
+            return _edit_result(crud.update_interaction(interaction_id, updates), "rules")
+
         # Use LLM to parse edit request
-        from langchain_groq import ChatGroq
-        import os
-        from dotenv import load_dotenv
-        
-        load_dotenv()
-        llm = ChatGroq(model="llama-3.1-8b-instant", groq_api_key=os.getenv("GROQ_API_KEY", ""))
-        
-        prompt = f"""Given this interaction data and an edit request, return ONLY a JSON object with fields to update:
-
-Current Interaction:
-{json.dumps(existing, default=str)}
-
-Edit Request: {edit_request}
-
-Return JSON with only fields to update:"""
-        
-        response = llm.invoke([HumanMessage(content=prompt)])
-        
-        try:
-            updates = json.loads(response.content)
-            # Update interaction
-            updated = crud.update_interaction(interaction_id, updates)
-            return {"success": True, "interaction": updated}
-        except:
+        prompt = edit_parser.edit_prompt(existing, edit_request)
+        response = agent_module.get_llm("edit_interaction").invoke([HumanMessage(content=prompt)])
+        updates = edit_parser.parse_llm_patch(response.content)
+        if updates is None:
             return {"success": False, "error": "Could not parse edit request"}
-            
+        return _edit_result(crud.update_interaction(interaction_id, updates), "llm")
+
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+async def aedit_interaction_via_agent(interaction_id: str, edit_request: str) -> dict:
+    """Async variant of edit_interaction_via_agent"""
+    try:
+        existing = await asyncio.to_thread(crud.get_interaction, interaction_id)
+        if not existing:
+            return {"success": False, "error": "Interaction not found"}
+
+        updates = _rule_edit(existing, edit_request)
+        if updates is not None:
+            updated = await asyncio.to_thread(crud.update_interaction, interaction_id, updates)
+            return _edit_result(updated, "rules")
+
+        prompt = edit_parser.edit_prompt(existing, edit_request)
+        response = await agent_module.get_llm("edit_interaction").ainvoke([HumanMessage(content=prompt)])
+        updates = edit_parser.parse_llm_patch(response.content)
+        if updates is None:
+            return {"success": False, "error": "Could not parse edit request"}
+
+        updated = await asyncio.to_thread(crud.update_interaction, interaction_id, updates)
+        return _edit_result(updated, "llm")
+
+    except Exception as e:
+        return {"success": False, "error": str(e)}
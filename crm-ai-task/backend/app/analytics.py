@@ -0,0 +1,245 @@
+"""
+Analytics rollups: sentiment, topics and engagement per HCP, per rep and overall
+
+Counts are kept per (scope, granularity, bucket, id), where scope is "all",
+"hcp" or "rep", granularity is "day" or "week" (weeks start on Monday) and
+the bucket is the interaction's datetime (created_at when it has none), in
+UTC. A crud change listener keeps them current: every write subtracts the
+old version's contribution and adds the new one's, so an edit that changes
+sentiment, topics, samples or the date moves the counts between rollups.
+A write touches six rollups plus one counter per topic, however many
+interactions exist.
+
+Queries only read the buckets in the requested range (at most MAX_BUCKETS),
+so dashboard latency does not grow with the store. Rollups live in process
+memory and are rebuilt from the store in one pass at startup.
+"""
+import heapq
+import os
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from . import crud
+from .pagination import to_naive_utc
+
+SCOPES = ("all", "hcp", "rep")
+GRANULARITIES = ("day", "week")
+SENTIMENTS = ("positive", "neutral", "negative")
+# Longest range a trend or topics query may cover
+MAX_BUCKETS = 400
+
+
+def bucket_start(day: date, granularity: str) -> date:
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def bucket_range(start: date, end: date, granularity: str) -> List[date]:
+    """Bucket starts covering start..end inclusive; raises ValueError for a reversed or too long range"""
+    first, last = bucket_start(start, granularity), bucket_start(end, granularity)
+    if last < first:
+        raise ValueError("date_to is before date_from")
+    step = timedelta(days=7 if granularity == "week" else 1)
+    count = (last - first) // step + 1
+    if count > MAX_BUCKETS:
+        raise ValueError(f"Range covers {count} {granularity} buckets; at most {MAX_BUCKETS} are allowed")
+    return [first + step * i for i in range(count)]
+
+
+class Contribution:
+    """What one version of an interaction adds to its rollups"""
+
+    __slots__ = ("day", "hcp_id", "rep_id", "sentiment", "topics", "samples", "materials", "follow_ups")
+
+    def __init__(self, inter: dict):
+        self.day = to_naive_utc(inter.get("datetime") or inter["created_at"]).date()
+        self.hcp_id = inter.get("hcp_id")
+        self.rep_id = inter.get("rep_id")
+        self.sentiment = inter.get("sentiment")
+        # Case-insensitive, and a topic listed twice counts once
+        self.topics = {t.strip().lower() for t in inter.get("topics") or () if t and t.strip()}
+        self.samples = sum(s.get("quantity") or 0 for s in inter.get("samples") or ())
+        self.materials = sum(m.get("quantity") or 0 for m in inter.get("materials") or ())
+        self.follow_ups = len(inter.get("follow_ups") or ())
+
+    def scopes(self):
+        yield "all", ""
+        if self.hcp_id:
+            yield "hcp", self.hcp_id
+        if self.rep_id:
+            yield "rep", self.rep_id
+
+
+class Rollup:
+    """Totals for one scope id in one bucket"""
+
+    __slots__ = ("interactions", "sentiment", "topics", "samples", "materials", "follow_ups")
+
+    def __init__(self):
+        self.interactions = self.samples = self.materials = self.follow_ups = 0
+        self.sentiment = dict.fromkeys(SENTIMENTS, 0)
+        self.topics = Counter()
+
+    def add(self, c: Contribution, sign: int):
+        self.interactions += sign
+        self.samples += sign * c.samples
+        self.materials += sign * c.materials
+        self.follow_ups += sign * c.follow_ups
+        if c.sentiment in self.sentiment:
+            self.sentiment[c.sentiment] += sign
+        for topic in c.topics:
+            count = self.topics[topic] + sign
+            if count:
+                self.topics[topic] = count
+            else:
+                del self.topics[topic]
+
+    def to_dict(self) -> dict:
+        return {
+            "interactions": self.interactions,
+            "sentiment": dict(self.sentiment),
+            "samples": self.samples,
+            "materials": self.materials,
+            "follow_ups": self.follow_ups,
+        }
+
+
+_EMPTY = Rollup()
+
+
+class Rollups:
+    """Every rollup, keyed (scope, granularity) -> bucket start -> scope id"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[Tuple[str, str], Dict[date, Dict[str, Rollup]]] = {
+            (scope, g): {} for scope in SCOPES for g in GRANULARITIES
+        }
+        self.updates = 0
+        self.rebuild_ms = 0.0
+
+    def _add(self, c: Contribution, sign: int):
+        for granularity in GRANULARITIES:
+            bucket = bucket_start(c.day, granularity)
+            for scope, scope_id in c.scopes():
+                by_id = self._buckets[scope, granularity].setdefault(bucket, {})
+                rollup = by_id.get(scope_id)
+                if rollup is None:
+                    rollup = by_id[scope_id] = Rollup()
+                rollup.add(c, sign)
+                # Drop emptied rollups so edits that move dates don't leave zeros behind
+                if rollup.interactions <= 0:
+                    del by_id[scope_id]
+                    if not by_id:
+                        del self._buckets[scope, granularity][bucket]
+
+    def apply(self, old: Optional[dict], new: Optional[dict]):
+        """crud listener: move an interaction's counts from its old version to its new one"""
+        if old is None and new is None:
+            self.clear()
+            return
+        removed = Contribution(old) if old is not None else None
+        added = Contribution(new) if new is not None else None
+        with self._lock:
+            if removed is not None:
+                self._add(removed, -1)
+            if added is not None:
+                self._add(added, 1)
+            self.updates += 1
+
+    def clear(self):
+        with self._lock:
+            for buckets in self._buckets.values():
+                buckets.clear()
+
+    def rebuild(self, interactions):
+        """Recount from scratch (e.g. every interaction in the store at startup)"""
+        start = time.perf_counter()
+        self.clear()
+        with self._lock:
+            for inter in interactions:
+                self._add(Contribution(inter), 1)
+        self.rebuild_ms = (time.perf_counter() - start) * 1000
+
+    def _get(self, scope: str, granularity: str, bucket: date, scope_id: str) -> Rollup:
+        return self._buckets[scope, granularity].get(bucket, {}).get(scope_id, _EMPTY)
+
+    def trend(self, scope: str, scope_id: str, granularity: str, start: date, end: date) -> List[dict]:
+        """One entry per bucket in start..end (empty buckets included), oldest first"""
+        buckets = bucket_range(start, end, granularity)
+        with self._lock:
+            return [{"bucket": b.isoformat(), **self._get(scope, granularity, b, scope_id).to_dict()} for b in buckets]
+
+    def top_topics(self, scope: str, scope_id: str, granularity: str, start: date, end: date,
+                   limit: int = 10) -> List[dict]:
+        """Most discussed topics over start..end, by number of interactions (ties by name)"""
+        totals = Counter()
+        with self._lock:
+            for b in bucket_range(start, end, granularity):
+                totals.update(self._get(scope, granularity, b, scope_id).topics)
+        top = heapq.nsmallest(limit, totals.items(), key=lambda item: (-item[1], item[0]))
+        return [{"topic": topic, "interactions": count} for topic, count in top]
+
+    def breakdown(self, scope: str, granularity: str, day: date, limit: int = 50) -> List[dict]:
+        """Per-HCP or per-rep totals for the bucket containing day, most interactions first"""
+        bucket = bucket_start(day, granularity)
+        with self._lock:
+            by_id = self._buckets[scope, granularity].get(bucket, {})
+            top = heapq.nlargest(limit, by_id.items(), key=lambda item: (item[1].interactions, item[0]))
+            return [{"id": scope_id, **rollup.to_dict()} for scope_id, rollup in top]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            rollups = sum(len(by_id) for buckets in self._buckets.values() for by_id in buckets.values())
+            total = sum(r.interactions for by_id in self._buckets["all", "day"].values() for r in by_id.values())
+        return {"interactions": total, "rollups": rollups, "updates": self.updates,
+                "rebuild_ms": round(self.rebuild_ms, 1)}
+
+
+# Process-wide rollups, set up by configure_from_env() at startup
+_rollups: Optional[Rollups] = None
+
+
+def install(rollups: Rollups = None, rebuild: bool = True):
+    """Count every stored interaction, then follow writes through a crud listener"""
+    global _rollups
+    uninstall()
+    rollups = rollups or Rollups()
+    if rebuild:
+        rollups.rebuild(crud.iter_interactions())
+    crud.add_listener(rollups.apply)
+    _rollups = rollups
+
+
+def uninstall():
+    global _rollups
+    if _rollups is not None:
+        crud.remove_listener(_rollups.apply)
+    _rollups = None
+
+
+def configure_from_env():
+    """ANALYTICS_ENABLED: maintain the rollups (default true)"""
+    if os.getenv("ANALYTICS_ENABLED", "true").lower() in ("0", "false", "no"):
+        return
+    install()
+
+
+def get_rollups() -> Optional[Rollups]:
+    return _rollups
+
+
+def default_range(granularity: str, end: Optional[date] = None) -> Tuple[date, date]:
+    """Last 30 days or last 12 weeks, ending today (UTC)"""
+    end = end or datetime.utcnow().date()
+    return end - (timedelta(weeks=11) if granularity == "week" else timedelta(days=29)), end
+
+
+def stats() -> dict:
+    if _rollups is None:
+        return {"enabled": False}
+    return {"enabled": True, **_rollups.snapshot()}
@@ -0,0 +1,137 @@
+"""
+Bulk import of structured interaction records
+
+Accepts NDJSON (one InteractionCreate object per line) or a JSON array.
+Records are validated and written in chunks: each chunk is a single
+crud.bulk_create_interactions call, i.e. one insert per table on the SQL
+backend. Bad rows are reported by position and never abort the import.
+"""
+import json
+import os
+import time
+from typing import AsyncIterator, Iterable, Iterator, List, Tuple
+
+from pydantic import ValidationError
+
+from . import crud, schemas
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))
+# Errors listed in the response; the failed count is always exact
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+
+# A parsed record, or the exception raised while decoding it
+Record = Tuple[int, object]
+
+
+def _decode_line(index: int, line: bytes) -> Record:
+    try:
+        return index, json.loads(line)
+    except ValueError as e:
+        return index, e
+
+
+async def aiter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    """
+    Decode an NDJSON byte stream line by line without buffering the whole body
+
+    Blank lines are skipped; indexes count records, starting at 0.
+    """
+    buffer, index = b"", 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _decode_line(index, line)
+                index += 1
+    if buffer.strip():
+        yield _decode_line(index, buffer)
+
+
+def iter_json_array(body: bytes) -> Iterator[Record]:
+    """Records of a JSON array body; a body that isn't an array is one bad record"""
+    try:
+        data = json.loads(body)
+    except ValueError as e:
+        yield 0, e
+        return
+    if not isinstance(data, list):
+        yield 0, ValueError("Expected a JSON array of interactions")
+        return
+    yield from enumerate(data)
+
+
+def _error(index: int, exc: Exception) -> dict:
+    if isinstance(exc, ValidationError):
+        detail = [
+            {"loc": ".".join(str(p) for p in err["loc"]), "msg": err["msg"]}
+            for err in exc.errors(include_url=False, include_input=False)
+        ]
+    else:
+        detail = str(exc)
+    return {"index": index, "error": detail}
+
+
+class ImportReport:
+    """Running totals for one import"""
+
+    def __init__(self, max_errors: int = IMPORT_MAX_ERRORS):
+        self.max_errors = max_errors
+        self.imported = 0
+        self.failed = 0
+        self.chunks = 0
+        self.errors: List[dict] = []
+        self.started = time.perf_counter()
+
+    def fail(self, index: int, exc: Exception):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append(_error(index, exc))
+
+    def to_dict(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "success": self.failed == 0,
+            "imported": self.imported,
+            "failed": self.failed,
+            "chunks": self.chunks,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+            "elapsed_s": round(elapsed, 3),
+            "rows_per_s": round(self.imported / elapsed) if elapsed > 0 else 0,
+        }
+
+
+def import_chunk(records: Iterable[Record], report: ImportReport) -> List[dict]:
+    """
+    Validate one chunk of records and write the valid ones in a single bulk call
+
+    If the bulk write is rejected (e.g. a foreign key violation on the SQL
+    backend), the chunk is retried row by row so only the offending rows fail.
+    """
+    valid, positions = [], []
+    for index, record in records:
+        if isinstance(record, Exception):
+            report.fail(index, record)
+            continue
+        try:
+            valid.append(schemas.InteractionCreate.model_validate(record))
+            positions.append(index)
+        except ValidationError as e:
+            report.fail(index, e)
+
+    report.chunks += 1
+    if not valid:
+        return []
+
+    try:
+        created = crud.bulk_create_interactions(valid)
+    except Exception:
+        created = []
+        for index, interaction_in in zip(positions, valid):
+            try:
+                created.append(crud.create_interaction(interaction_in))
+            except Exception as e:
+                report.fail(index, e)
+    report.imported += len(created)
+    return created
@@ -1,137 +1,245 @@
-from . import schemas
+"""
+CRUD entry points used by the API and the agent service
+
+Every call is forwarded to the active storage backend (see storage.py).
+Interaction writes are also reported to change listeners (see add_listener),
+which keep derived views such as analytics rollups up to date.
+"""
+import functools
+import logging
+import threading
+import time
 from datetime import datetime
-from typing import List, Optional
-import uuid
+from typing import Callable, List, Optional
+
+from . import pagination, schemas, storage
+
+_backend = None
+# Called as observer(op, seconds) after each timed operation (see metrics.py)
+_observer: Optional[Callable[[str, float], None]] = None
+# Called as listener(old, new) after each interaction write (see add_listener)
+_listeners: List[Callable[[Optional[dict], Optional[dict]], None]] = []
+# Serialize updates per interaction while listeners need the before/after pair
+_update_locks = [threading.Lock() for _ in range(64)]
+
+logger = logging.getLogger(__name__)
+
+
+def get_backend() -> storage.StorageBackend:
+    global _backend
+    if _backend is None:
+        _backend = storage.load_backend()
+    return _backend
+
+
+def set_backend(backend: storage.StorageBackend):
+    """Swap the active backend (e.g. a backend module from storage.load_backend)"""
+    global _backend
+    _backend = backend
+
+
+def close():
+    """Shut down the active backend, if one was loaded"""
+    global _backend
+    if _backend is not None:
+        storage.close_backend(_backend)
+        _backend = None
+
+
+def backend_name() -> str:
+    return getattr(get_backend(), "NAME", type(get_backend()).__name__)
+
+
+def set_observer(observer: Optional[Callable[[str, float], None]]):
+    """Report every storage operation's duration to observer(op, seconds); None turns it off"""
+    global _observer
+    _observer = observer
+
+
+def _timed(fn):
+    op = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        observer = _observer
+        if observer is None:
+            return fn(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            observer(op, time.perf_counter() - start)
+    return wrapper
+
+
+def add_listener(listener: Callable[[Optional[dict], Optional[dict]], None]):
+    """
+    Report interaction writes to listener(old, new)
+
+    old is None for a new interaction; both are None after reset_store().
+    Listeners run synchronously after the write, so they should be O(1);
+    an exception in one is logged and never fails the write.
+    """
+    if listener not in _listeners:
+        _listeners.append(listener)
 
-# In-memory storage
-_hcps = {}
-_interactions = {}
-_materials = {}
-_samples = {}
-_follow_ups = {}
+
+def remove_listener(listener):
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def _notify(old: Optional[dict], new: Optional[dict]):
+    for listener in list(_listeners):
+        try:
+            listener(old, new)
+        except Exception:
+            logger.exception("Interaction change listener %r failed", listener)
+
+
+def reset_store():
+    get_backend().reset_store()
+    _notify(None, None)
 
 # HCP CRUD
+@_timed
 def get_hcp_by_id(hcp_id: str):
-    return _hcps.get(hcp_id)
+    return get_backend().get_hcp_by_id(hcp_id)
 
-def search_hcp_by_name(name: str, limit: int = 10):
-    name_lower = name.lower()
-    results = [
-        hcp for hcp in _hcps.values()
-        if name_lower in hcp["name"].lower()
-    ]
-    return results[:limit]
+@_timed
+def search_hcp_by_name(name: str, limit: int = 10, min_score: float = 0.0):
+    """Ranked name search; each result is a copy of the HCP with a relevance "score" (0-1)"""
+    return get_backend().search_hcp_by_name(name, limit=limit, min_score=min_score)
 
+@_timed
 def create_hcp(hcp_in: schemas.HCPCreate):
-    hcp_id = str(uuid.uuid4())
-    now = datetime.utcnow()
-    hcp = {
-        "id": hcp_id,
-        "name": hcp_in.name,
-        "title": hcp_in.title,
-        "speciality": hcp_in.speciality,
-        "organisation": hcp_in.organisation,
-        "contact": hcp_in.contact,
-        "created_at": now,
-        "updated_at": now
-    }
-    _hcps[hcp_id] = hcp
-    return hcp
+    return get_backend().create_hcp(hcp_in)
+
+@_timed
+def bulk_create_hcps(hcps_in: List[schemas.HCPCreate]):
+    return get_backend().bulk_create_hcps(hcps_in)
+
+def _page(items: list, limit: int, key) -> dict:
+    # Backends are asked for limit + 1 rows; the extra one only signals another page
+    has_more = len(items) > limit
+    items = items[:limit]
+    return {"items": items, "next_cursor": pagination.encode_cursor(key(items[-1])) if has_more else None}
+
+@_timed
+def list_hcps(speciality: Optional[str] = None, organisation: Optional[str] = None,
+              cursor: Optional[str] = None, limit: int = pagination.DEFAULT_PAGE_SIZE):
+    """
+    One page of HCPs in name order
+
+    Returns {"items": [...], "next_cursor": str | None}. Raises ValueError for
+    a malformed cursor.
+    """
+    after = pagination.decode_hcp_cursor(cursor) if cursor else None
+    items = get_backend().list_hcps(speciality=speciality, organisation=organisation,
+                                    after=after, limit=limit + 1)
+    return _page(items, limit, pagination.hcp_key)
 
 # Interaction CRUD
+@_timed
 def get_interaction(interaction_id: str):
-    inter = _interactions.get(interaction_id)
-    if not inter:
-        return None
-    
-    # Attach related data
-    inter = inter.copy()
-    inter["materials"] = [m for m in _materials.values() if m["interaction_id"] == interaction_id]
-    inter["samples"] = [s for s in _samples.values() if s["interaction_id"] == interaction_id]
-    inter["follow_ups"] = [f for f in _follow_ups.values() if f["interaction_id"] == interaction_id]
-    return inter
+    return get_backend().get_interaction(interaction_id)
+
+@_timed
+def get_interactions_by_hcp(hcp_id: str):
+    return get_backend().get_interactions_by_hcp(hcp_id)
 
+@_timed
+def get_interactions_by_rep(rep_id: str):
+    return get_backend().get_interactions_by_rep(rep_id)
+
+@_timed
+def list_interactions(hcp_id: Optional[str] = None, rep_id: Optional[str] = None,
+                      sentiment: Optional[str] = None, mode: Optional[str] = None,
+                      date_from: Optional[datetime] = None, date_to: Optional[datetime] = None,
+                      cursor: Optional[str] = None, limit: int = pagination.DEFAULT_PAGE_SIZE,
+                      descending: bool = True):
+    """
+    One page of interactions ordered by datetime (falling back to created_at), newest first by default
+
+    date_from/date_to are inclusive bounds on the same timestamp. Returns
+    {"items": [...], "next_cursor": str | None}. Raises ValueError for a
+    malformed cursor.
+    """
+    after = pagination.decode_interaction_cursor(cursor) if cursor else None
+    items = get_backend().list_interactions(
+        hcp_id=hcp_id, rep_id=rep_id, sentiment=sentiment, mode=mode,
+        date_from=pagination.to_naive_utc(date_from), date_to=pagination.to_naive_utc(date_to),
+        after=after, limit=limit + 1, descending=descending,
+    )
+    return _page(items, limit, pagination.interaction_key)
+
+def iter_interactions(page_size: int = 1000):
+    """Every interaction, oldest first, one page at a time (for rebuilding derived views)"""
+    cursor = None
+    while True:
+        page = list_interactions(cursor=cursor, limit=page_size, descending=False)
+        yield from page["items"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return
+
+@_timed
 def create_interaction(interaction_in: schemas.InteractionCreate):
-    interaction_id = str(uuid.uuid4())
-    now = datetime.utcnow()
-    
-    inter = {
-        "id": interaction_id,
-        "hcp_id": interaction_in.hcp_id,
-        "rep_id": interaction_in.rep_id,
-        "mode": interaction_in.mode or "conversational",
-        "datetime": interaction_in.datetime,
-        "summary": interaction_in.summary,
-        "sentiment": interaction_in.sentiment.value if interaction_in.sentiment else None,
-        "topics": interaction_in.topics,
-        "outcome": interaction_in.outcome,
-        "source_raw": interaction_in.source_raw,
-        "created_at": now,
-        "updated_at": now,
-        "materials": [],
-        "samples": [],
-        "follow_ups": []
-    }
-    _interactions[interaction_id] = inter
-
-    # materials
-    materials = []
-    for m in interaction_in.materials or []:
-        mat_id = str(uuid.uuid4())
-        mat = {
-            "id": mat_id,
-            "interaction_id": interaction_id,
-            "material_type": m.material_type,
-            "quantity": m.quantity,
-            "notes": m.notes
-        }
-        _materials[mat_id] = mat
-        materials.append(mat)
-
-    # samples
-    samples = []
-    for s in interaction_in.samples or []:
-        samp_id = str(uuid.uuid4())
-        samp = {
-            "id": samp_id,
-            "interaction_id": interaction_id,
-            "product_code": s.product_code,
-            "quantity": s.quantity,
-            "lot": s.lot
-        }
-        _samples[samp_id] = samp
-        samples.append(samp)
-
-    # followups
-    follow_ups = []
-    for f in interaction_in.follow_ups or []:
-        fu_id = str(uuid.uuid4())
-        fu = {
-            "id": fu_id,
-            "interaction_id": interaction_id,
-            "due_date": f.due_date,
-            "action_item": f.action_item,
-            "owner": f.owner,
-            "status": f.status or "open"
-        }
-        _follow_ups[fu_id] = fu
-        follow_ups.append(fu)
-    
-    inter["materials"] = materials
-    inter["samples"] = samples
-    inter["follow_ups"] = follow_ups
-    return inter
-
-def update_interaction(interaction_id: str, patch: dict):
-    inter = _interactions.get(interaction_id)
-    if not inter:
-        return None
-    
-    for k, v in patch.items():
-        if k in inter and k not in ["id", "created_at"]:
-            inter[k] = v
-    
-    inter["updated_at"] = datetime.utcnow()
-    
-    # Return with related data
-    return get_interaction(interaction_id)
+    created = get_backend().create_interaction(interaction_in)
+    _notify(None, created)
+    return created
+
+@_timed
+def bulk_create_interactions(interactions_in: List[schemas.InteractionCreate]):
+    created = get_backend().bulk_create_interactions(interactions_in)
+    if _listeners:
+        for inter in created:
+            _notify(None, inter)
+    return created
+
+# Patch keys that change child tables, and the model each value is read into
+CHILD_PATCHES = {
+    "materials": schemas.MaterialsPatch,
+    "samples": schemas.SamplesPatch,
+    "follow_ups": schemas.FollowUpsPatch,
+}
+
+def _child_patch(name: str, value):
+    if isinstance(value, list):
+        return CHILD_PATCHES[name](replace=True, add=value)
+    return CHILD_PATCHES[name].model_validate(value)
+
+@_timed
+def update_interaction(interaction_id: str, patch: dict,
+                       precondition: Optional[Callable[[dict], None]] = None):
+    """
+    Apply a partial update to an interaction and, optionally, its children
+
+    Interaction columns are set directly. "materials", "samples" and
+    "follow_ups" take either a list (replaces the rows) or a dict with
+    "add", "update" (items with "id" plus the fields to change) and
+    "remove" (ids). Column values are checked against
+    schemas.InteractionPatch first. Raises pydantic.ValidationError for a
+    malformed patch, before either backend sees it.
+
+    precondition, if given, is called with the current interaction under
+    the per-interaction update lock, right before the write; it may raise
+    to cancel the update (e.g. a status check that must not race another
+    writer).
+    """
+    columns = schemas.InteractionPatch.model_validate(
+        {k: v for k, v in patch.items() if k not in CHILD_PATCHES}).model_dump(exclude_unset=True)
+    patch = {**patch, **columns}
+    patch = {k: _child_patch(k, v) if k in CHILD_PATCHES else v for k, v in patch.items()}
+    if not _listeners and precondition is None:
+        return get_backend().update_interaction(interaction_id, patch)
+    with _update_locks[hash(interaction_id) % len(_update_locks)]:
+        old = get_backend().get_interaction(interaction_id)
+        if old is None:
+            return None
+        if precondition is not None:
+            precondition(old)
+        updated = get_backend().update_interaction(interaction_id, patch)
+        if updated:
+            _notify(old, updated)
+    return updated
@@ -1,4 +1,9 @@
-# No database dependency needed for in-memory storage
+from .db import SessionLocal
+
 def get_db():
-    # Return None as we don't need a database session
-    return None
+    """FastAPI dependency yielding a SQLAlchemy session (used with STORAGE_BACKEND=sql)"""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
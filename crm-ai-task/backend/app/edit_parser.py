@@ -0,0 +1,332 @@
+"""
+Natural-language edits without the whole interaction in the prompt
+
+parse_edit() applies common edits directly with rules:
+    "change sentiment to negative"
+    "set outcome to agreed to trial with two patients"
+    "add 2 samples of ABC-10 and remove the brochures"
+    "mark follow-ups as done"
+Each clause of the request must match a rule; otherwise the request goes to
+the LLM with edit_prompt(), which lists only the editable field schema and
+the current values of the fields the request mentions (never source_raw).
+
+Both produce a crud.update_interaction patch, so child tables (materials,
+samples, follow_ups) are changed with {"add", "update", "remove"}.
+"""
+import json
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from . import schemas
+from .fast_extract import MATERIAL_TYPES, PRODUCT_CODE, QTY, normalize_code, parse_datetime, parse_quantity
+
+# Editable fields and the schema line the LLM sees for each
+EDITABLE_FIELDS = {
+    "summary": "string",
+    "sentiment": '"positive" | "neutral" | "negative"',
+    "outcome": "string",
+    "topics": "array of strings (the full new list)",
+    "datetime": "ISO 8601 datetime",
+    "mode": '"conversational" | "structured"',
+    "materials": '{"material_type": str, "quantity": int, "notes": str}',
+    "samples": '{"product_code": str, "quantity": int, "lot": str}',
+    "follow_ups": '{"action_item": str, "due_date": ISO datetime, "owner": str, "status": "open" | "done"}',
+}
+CHILD_FIELDS = ("materials", "samples", "follow_ups")
+
+# Word prefixes that mark a field as mentioned, for the values included in the prompt
+_MENTION_WORDS = {
+    "summary": ("summary", "summarise", "summarize", "description", "notes"),
+    "sentiment": ("sentiment", "positive", "negative", "neutral", "tone", "mood"),
+    "outcome": ("outcome", "result", "agreed", "decision"),
+    "topics": ("topic", "discuss"),
+    "datetime": ("date", "time", "when", "today", "yesterday", "morning", "afternoon"),
+    "mode": ("mode", "structured", "conversational"),
+    "materials": ("material",) + MATERIAL_TYPES,
+    "samples": ("sample", "lot", "unit", "box", "pack"),
+    "follow_ups": ("follow", "task", "action", "reminder", "due"),
+}
+_MENTIONS = {field: re.compile(rf"\b(?:{'|'.join(map(re.escape, words))})", re.I)
+             for field, words in _MENTION_WORDS.items()}
+
+_SENTIMENTS = r"(?P<value>positive|neutral|negative)"
+_VERBS = r"change|set|update|make|mark|switch|correct|add|log|record|include|remove|delete|drop|clear"
+_SET = r"(?:change|set|update|make|switch|correct)"
+# Free text runs to the end of the request, a ";" or ", and <next edit>"
+_TEXT = rf"[\"']?(?P<value>.+?)[\"']?(?=\s*(?:$|;|,?\s+and\s+(?:{_VERBS})\b))"
+_MATERIAL_TYPE = rf"(?P<type>{'|'.join(MATERIAL_TYPES)})s?"
+_STATUSES = {"done": "done", "complete": "done", "completed": "done", "closed": "done", "open": "open", "reopen": "open"}
+_STATUS = r"(?P<status>done|completed?|closed|open)"
+_LOT = r"(?:\s+\(?lot\s+(?P<lot>[\w-]+)\)?)?"
+
+_RULES = [
+    ("sentiment", re.compile(rf"{_SET}\s+(?:the\s+)?sentiment\s+(?:to|as|=|:)?\s*{_SENTIMENTS}\b", re.I)),
+    ("sentiment", re.compile(rf"(?:mark|set|make)\s+(?:it|this|the\s+interaction)?\s*(?:as\s+)?{_SENTIMENTS}\b", re.I)),
+    ("sentiment", re.compile(rf"(?:the\s+)?sentiment\s+(?:is|was|should\s+be)\s+{_SENTIMENTS}\b", re.I)),
+    ("text", re.compile(rf"{_SET}\s+(?:the\s+)?(?P<field>outcome|summary)\s+(?:to|as|=|:)\s*{_TEXT}", re.I)),
+    ("clear", re.compile(r"(?:clear|remove|delete)\s+(?:the\s+)?(?P<field>outcome|summary)\b", re.I)),
+    ("mode", re.compile(rf"{_SET}\s+(?:the\s+)?mode\s+(?:to|as)\s+(?P<value>conversational|structured)\b", re.I)),
+    ("datetime", re.compile(rf"{_SET}\s+(?:the\s+)?(?:meeting\s+|visit\s+)?(?:date\s+and\s+time|datetime|date|time)\s+(?:to|as)\s+{_TEXT}", re.I)),
+    ("set_topics", re.compile(rf"{_SET}\s+(?:the\s+)?topics\s+(?:to|as)\s+{_TEXT}", re.I)),
+    ("add_topics", re.compile(rf"add\s+(?:the\s+)?topics?\s*:?\s*{_TEXT}", re.I)),
+    ("remove_topics", re.compile(rf"(?:remove|delete|drop)\s+(?:the\s+)?topics?\s*:?\s*{_TEXT}", re.I)),
+    ("add_samples", re.compile(rf"(?:add|log|record|include)\s+{QTY}\s+(?:more\s+)?(?:x\s+)?(?:samples?|units?|boxes|packs?)\s+of\s+{PRODUCT_CODE}{_LOT}", re.I)),
+    ("add_samples", re.compile(rf"(?:add|log|record|include)\s+{QTY}\s+(?:more\s+)?{PRODUCT_CODE}\s+samples?{_LOT}", re.I)),
+    ("set_samples", re.compile(rf"{_SET}\s+(?:the\s+)?{PRODUCT_CODE}\s+samples?\s+(?:quantity\s+)?to\s+{QTY}\b", re.I)),
+    ("set_samples", re.compile(rf"{_SET}\s+(?:the\s+)?samples?\s+of\s+{PRODUCT_CODE}\s+(?:quantity\s+)?to\s+{QTY}\b", re.I)),
+    ("remove_samples", re.compile(rf"(?:remove|delete|drop)\s+(?:all\s+)?(?:the\s+)?{PRODUCT_CODE}\s+samples?", re.I)),
+    ("remove_samples", re.compile(rf"(?:remove|delete|drop)\s+(?:all\s+)?(?:the\s+)?samples?(?:\s+of\s+{PRODUCT_CODE})?", re.I)),
+    ("add_materials", re.compile(rf"(?:add|log|record|include)\s+{QTY}\s+(?:more\s+)?(?:copies\s+of\s+(?:the\s+)?)?{_MATERIAL_TYPE}\b", re.I)),
+    ("remove_materials", re.compile(rf"(?:remove|delete|drop)\s+(?:all\s+)?(?:the\s+)?{_MATERIAL_TYPE}\b", re.I)),
+    ("add_follow_up", re.compile(rf"add\s+(?:a\s+)?(?:follow[- ]?up|task|action\s+item|reminder)\s*(?::|-|to)?\s*{_TEXT}", re.I)),
+    ("follow_up_status", re.compile(rf"(?:mark|set)\s+(?:all\s+)?(?:the\s+)?(?:follow[- ]?ups?|tasks?|action\s+items?)\s+(?:as\s+|to\s+)?{_STATUS}\b", re.I)),
+]
+_POLITE = re.compile(r"^(?:please|pls|kindly|can you|could you)\s+", re.I)
+_SEPARATOR = re.compile(r"(?:\s*(?:,|;|\band\b|\bthen\b|\balso\b|\.)\s*)+", re.I)
+_DUE = re.compile(r"\s+(?:by|due|on|before)\s+(?P<when>.+)$", re.I)
+_LIST_SPLIT = re.compile(r"\s*(?:,|\band\b|&)\s*", re.I)
+
+
+class EditStats:
+    """How often rules handled an edit, and the size of the prompts sent otherwise"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = self.rule_hits = self.llm_edits = 0
+        self.rule_seconds = 0.0
+        self.prompt_chars = 0
+
+    def record_rules(self, hit: bool, seconds: float):
+        with self._lock:
+            self.requests += 1
+            self.rule_hits += hit
+            self.rule_seconds += seconds
+
+    def record_prompt(self, prompt: str):
+        with self._lock:
+            self.llm_edits += 1
+            self.prompt_chars += len(prompt)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "rule_hits": self.rule_hits,
+                "llm_edits": self.llm_edits,
+                "rule_hit_rate": round(self.rule_hits / self.requests, 4) if self.requests else 0.0,
+                "avg_rule_ms": round(self.rule_seconds / self.requests * 1000, 3) if self.requests else 0.0,
+                "avg_prompt_chars": round(self.prompt_chars / self.llm_edits) if self.llm_edits else 0,
+            }
+
+
+_stats = EditStats()
+
+
+def stats() -> dict:
+    return _stats.snapshot()
+
+
+class _Patch:
+    """Accumulates one request's changes against the existing interaction"""
+
+    def __init__(self, existing: dict):
+        self.existing = existing
+        self.fields = {}
+        self.children = {}
+
+    def child(self, name: str) -> dict:
+        return self.children.setdefault(name, {"add": [], "update": [], "remove": []})
+
+    def rows(self, name: str) -> list:
+        """Existing child rows not already removed by this request"""
+        removed = set(self.children.get(name, {}).get("remove", ()))
+        return [row for row in self.existing.get(name) or [] if row["id"] not in removed]
+
+    def topics(self) -> list:
+        return list(self.fields.get("topics", self.existing.get("topics") or []))
+
+    def result(self) -> dict:
+        patch = dict(self.fields)
+        for name, ops in self.children.items():
+            patch[name] = {op: items for op, items in ops.items() if items}
+        return patch
+
+
+def _split_list(value: str) -> list:
+    return [item.strip() for item in _LIST_SPLIT.split(value) if item.strip()]
+
+
+def _apply(patch: _Patch, kind: str, match: re.Match, now: datetime) -> bool:
+    """Add one matched clause to the patch; False if it can't be applied without the LLM"""
+    groups = match.groupdict()
+    if kind == "sentiment":
+        patch.fields["sentiment"] = groups["value"].lower()
+    elif kind == "text":
+        patch.fields[groups["field"].lower()] = groups["value"].strip()
+    elif kind == "clear":
+        patch.fields[groups["field"].lower()] = None
+    elif kind == "mode":
+        patch.fields["mode"] = groups["value"].lower()
+    elif kind == "datetime":
+        value = parse_datetime(groups["value"], now)
+        if value is None:
+            return False
+        patch.fields["datetime"] = value
+    elif kind == "set_topics":
+        patch.fields["topics"] = _split_list(groups["value"])
+    elif kind == "add_topics":
+        topics = patch.topics()
+        known = {t.lower() for t in topics}
+        patch.fields["topics"] = topics + [t for t in _split_list(groups["value"]) if t.lower() not in known]
+    elif kind == "remove_topics":
+        dropped = {t.lower() for t in _split_list(groups["value"])}
+        topics = patch.topics()
+        if not dropped & {t.lower() for t in topics}:
+            return False
+        patch.fields["topics"] = [t for t in topics if t.lower() not in dropped]
+    elif kind == "add_samples":
+        sample = {"product_code": normalize_code(groups["code"]), "quantity": parse_quantity(groups["qty"])}
+        if groups.get("lot"):
+            sample["lot"] = groups["lot"]
+        patch.child("samples")["add"].append(sample)
+    elif kind == "set_samples":
+        code = normalize_code(groups["code"])
+        rows = [row for row in patch.rows("samples") if row["product_code"] == code]
+        if len(rows) != 1:
+            return False
+        patch.child("samples")["update"].append({"id": rows[0]["id"], "quantity": parse_quantity(groups["qty"])})
+    elif kind == "remove_samples":
+        code = normalize_code(groups["code"]) if groups.get("code") else None
+        rows = [row for row in patch.rows("samples") if code is None or row["product_code"] == code]
+        if not rows:
+            return False
+        patch.child("samples")["remove"].extend(row["id"] for row in rows)
+    elif kind == "add_materials":
+        patch.child("materials")["add"].append(
+            {"material_type": groups["type"].lower(), "quantity": parse_quantity(groups["qty"])})
+    elif kind == "remove_materials":
+        material_type = groups["type"].lower()
+        rows = [row for row in patch.rows("materials") if row["material_type"].lower().rstrip("s") == material_type]
+        if not rows:
+            return False
+        patch.child("materials")["remove"].extend(row["id"] for row in rows)
+    elif kind == "add_follow_up":
+        action, due_date = groups["value"].strip(), None
+        due = _DUE.search(action)
+        if due:
+            due_date = parse_datetime(due["when"], now)
+            if due_date is not None:
+                action = action[:due.start()].strip()
+        patch.child("follow_ups")["add"].append(
+            {"action_item": action, "due_date": due_date, "owner": patch.existing.get("rep_id"), "status": "open"})
+    elif kind == "follow_up_status":
+        rows = patch.rows("follow_ups")
+        if not rows:
+            return False
+        status = _STATUSES[groups["status"].lower()]
+        patch.child("follow_ups")["update"].extend({"id": row["id"], "status": status} for row in rows)
+    return True
+
+
+def parse_edit(edit_request: str, existing: dict, now: Optional[datetime] = None) -> Optional[dict]:
+    """
+    Patch for an edit request every clause of which matches a rule, else None
+
+    Args:
+        edit_request: The rep's natural-language edit
+        existing: The interaction as returned by crud.get_interaction
+        now: Reference time for relative dates
+    """
+    start = time.perf_counter()
+    text = _POLITE.sub("", " ".join(edit_request.split()).rstrip(". "))
+    patch, pos, now = _Patch(existing), 0, now or datetime.now()
+    while pos < len(text):
+        for kind, pattern in _RULES:
+            match = pattern.match(text, pos)
+            if match and _apply(patch, kind, match, now):
+                break
+        else:
+            patch = None
+            break
+        pos = match.end()
+        separator = _SEPARATOR.match(text, pos)
+        if separator:
+            pos = separator.end()
+        elif pos < len(text) and not text[pos].isspace():
+            patch = None
+            break
+        else:
+            pos = len(text) - len(text[pos:].lstrip())
+    result = patch.result() if patch is not None else None
+    _stats.record_rules(bool(result), time.perf_counter() - start)
+    return result or None
+
+
+def mentioned_fields(edit_request: str) -> list:
+    return [field for field, pattern in _MENTIONS.items() if pattern.search(edit_request)]
+
+
+def _current_values(existing: dict, fields) -> dict:
+    values = {}
+    for field in fields:
+        value = existing.get(field)
+        if field in CHILD_FIELDS:
+            # Rows keep their ids (needed for update/remove) but not interaction_id
+            value = [{k: v for k, v in row.items() if k != "interaction_id"} for row in value or []]
+        values[field] = value
+    return values
+
+
+def edit_prompt(existing: dict, edit_request: str) -> str:
+    """
+    Compact LLM prompt: the editable schema plus only the mentioned fields' values
+
+    When no field is recognisably mentioned, the scalar fields are included
+    (still without source_raw and child rows).
+    """
+    fields = mentioned_fields(edit_request) or [f for f in EDITABLE_FIELDS if f not in CHILD_FIELDS]
+    schema = "\n".join(
+        f"- {field}: " + (f'{{"add": [{kind}], "update": [{{"id": str, <fields to change>}}], "remove": [id]}}'
+                          if field in CHILD_FIELDS else kind)
+        for field, kind in EDITABLE_FIELDS.items()
+    )
+    prompt = f"""Edit an HCP interaction. Return ONLY a JSON object containing the fields to change.
+
+Editable fields:
+{schema}
+
+Current values:
+{json.dumps(_current_values(existing, fields), default=str, separators=(",", ":"))}
+
+Edit request: {edit_request}
+
+JSON:"""
+    _stats.record_prompt(prompt)
+    return prompt
+
+
+def parse_llm_patch(content: str) -> Optional[dict]:
+    """The editable part of the LLM's JSON answer, or None if there is none or it has the wrong types"""
+    start, end = content.find("{"), content.rfind("}")
+    if start < 0 or end < start:
+        return None
+    try:
+        data = json.loads(content[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    patch = {k: v for k, v in data.items() if k in EDITABLE_FIELDS}
+    scalars = {k: v for k, v in patch.items() if k not in CHILD_FIELDS}
+    try:
+        # Same types as the create path; child tables are validated by crud
+        patch.update(schemas.InteractionBase(**scalars).model_dump(mode="json", include=set(scalars)))
+    except ValueError:
+        return None
+    return patch or None
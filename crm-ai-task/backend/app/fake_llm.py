@@ -0,0 +1,236 @@
+"""
+Local stand-in for ChatGroq, for offline load tests and benchmarks
+
+Install with agent_module.set_llm(FakeChatModel(...)), or start the server
+with LLM_PROVIDER=fake (see configure_from_env) to run every AI endpoint
+without a Groq key. Responses are chosen from the prompt text so every agent
+node gets a well-formed payload; a share of them can be made malformed or
+turned into errors to exercise the fallback paths.
+
+Latency is a fixed number of seconds or a distribution spec:
+    "0.2"                 fixed
+    "uniform:0.1,0.5"     uniform between the two bounds
+    "normal:0.3,0.05"     mean, standard deviation (clipped at 0)
+    "lognormal:0.3,0.6"   median, sigma (long right tail, like a real API)
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from typing import Optional, Union
+
+from langchain_core.messages import AIMessage
+
+from .agent_registry import agent_module
+
+EXTRACTION_RESPONSE = {
+    "hcp_name": "Dr. Meera Patel",
+    "datetime": "2026-01-15T16:00:00",
+    "summary": "Discussed efficacy data for Product X; doctor was receptive.",
+    "materials": [{"material_type": "brochure", "quantity": 3}],
+    "samples": [{"product_code": "ABC-10", "quantity": 2}],
+    "topics": ["efficacy", "dosing"],
+    "outcome": "Agreed to trial with two patients",
+}
+SENTIMENT_RESPONSE = {"sentiment": "positive", "confidence": 0.9}
+SINGLE_CALL_RESPONSE = {
+    **EXTRACTION_RESPONSE,
+    "sentiment": {"label": "positive", "confidence": 0.9},
+    "follow_ups": [
+        {"action_item": "Send phase III study summary", "priority": "high"},
+        {"action_item": "Schedule follow-up visit in two weeks", "priority": "medium"},
+    ],
+}
+EDIT_RESPONSE = {"sentiment": "negative", "outcome": "Requested more safety data"}
+FOLLOWUP_RESPONSE = [
+    {"action_item": "Send phase III study summary", "priority": "high"},
+    {"action_item": "Schedule follow-up visit in two weeks", "priority": "medium"},
+]
+# Shapes a real model occasionally returns instead of the requested JSON
+MALFORMED_RESPONSES = [
+    '{"hcp_name": "Dr. Meera Patel", "summary": "Discussed efficacy data for',
+    "Sure! Here is the information you asked for: the doctor was receptive.",
+    "",
+]
+
+
+class FakeLLMError(RuntimeError):
+    """Raised for the share of calls configured to fail (stands in for a Groq API error)"""
+
+
+class LatencyDistribution:
+    """Seconds per call: fixed, uniform, normal or lognormal"""
+
+    KINDS = ("fixed", "uniform", "normal", "lognormal")
+
+    def __init__(self, kind: str = "fixed", a: float = 0.2, b: float = 0.0):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution {kind!r}; expected one of {self.KINDS}")
+        self.kind, self.a, self.b = kind, a, b
+
+    @classmethod
+    def parse(cls, spec: Union[str, float, "LatencyDistribution"]) -> "LatencyDistribution":
+        if isinstance(spec, LatencyDistribution):
+            return spec
+        if isinstance(spec, (int, float)):
+            return cls("fixed", float(spec))
+        kind, _, params = str(spec).partition(":")
+        if not params:
+            return cls("fixed", float(kind))
+        values = [float(v) for v in params.split(",")]
+        return cls(kind, *values)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.a
+        if self.kind == "uniform":
+            return rng.uniform(self.a, self.b)
+        if self.kind == "normal":
+            return max(0.0, rng.gauss(self.a, self.b))
+        return rng.lognormvariate(0.0, self.b) * self.a
+
+    def describe(self) -> str:
+        return f"{self.a}" if self.kind == "fixed" else f"{self.kind}:{self.a},{self.b}"
+
+
+def _prompt_text(messages) -> str:
+    return "\n".join(getattr(m, "content", str(m)) for m in messages)
+
+
+def _tokens(text: str) -> int:
+    # Roughly four characters per token for English prompts
+    return max(1, len(text) // 4)
+
+
+class FakeChatModel:
+    """
+    Chat model with invoke/ainvoke/bind, configurable latency and fault injection
+
+    Args:
+        latency: Seconds per call, or a distribution spec / LatencyDistribution
+        failure_rate: Share of calls that raise FakeLLMError
+        malformed_rate: Share of calls that return one of MALFORMED_RESPONSES
+        seed: Seed for the latency and fault draws, for repeatable runs
+        responses: Overrides for the canned payloads, keyed by route
+            ("extraction", "sentiment", "follow_ups", "single_call", "edit")
+    """
+
+    model_name = "fake-llm"
+    temperature = 0.0
+
+    def __init__(self, latency=0.2, failure_rate: float = 0.0, malformed_rate: float = 0.0,
+                 seed: Optional[int] = None, responses: Optional[dict] = None):
+        self.latency = LatencyDistribution.parse(latency)
+        self.failure_rate = failure_rate
+        self.malformed_rate = malformed_rate
+        self.responses = {
+            "extraction": EXTRACTION_RESPONSE, "sentiment": SENTIMENT_RESPONSE, "follow_ups": FOLLOWUP_RESPONSE,
+            "single_call": SINGLE_CALL_RESPONSE, "edit": EDIT_RESPONSE, **(responses or {}),
+        }
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = self.failures = self.malformed = 0
+
+    @staticmethod
+    def route(prompt: str) -> str:
+        """Which canned payload a prompt gets"""
+        if prompt.startswith("Edit an HCP interaction"):
+            return "edit"
+        if "follow_ups:" in prompt:
+            return "single_call"
+        if "follow-up" in prompt:
+            return "follow_ups"
+        if "sentiment" in prompt.lower() and "Extract the following" not in prompt:
+            return "sentiment"
+        return "extraction"
+
+    def _draw(self):
+        """(seconds to wait, outcome) for the next call; outcome is "ok", "fail" or "malformed" """
+        with self._lock:
+            self.calls += 1
+            seconds = self.latency.sample(self._rng)
+            roll = self._rng.random()
+            if roll < self.failure_rate:
+                self.failures += 1
+                return seconds, "fail"
+            if roll < self.failure_rate + self.malformed_rate:
+                self.malformed += 1
+                return seconds, "malformed"
+            return seconds, "ok"
+
+    def _respond(self, messages, outcome: str) -> AIMessage:
+        if outcome == "fail":
+            raise FakeLLMError("fake LLM: simulated API error")
+        prompt = _prompt_text(messages)
+        if outcome == "malformed":
+            with self._lock:
+                content = self._rng.choice(MALFORMED_RESPONSES)
+        else:
+            content = json.dumps(self.responses[self.route(prompt)])
+        usage = {"input_tokens": _tokens(prompt), "output_tokens": _tokens(content)}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return AIMessage(content=content, usage_metadata=usage)
+
+    def bind(self, **kwargs):
+        # Response format options (JSON mode) are ignored; responses are always JSON
+        return self
+
+    def invoke(self, messages, **kwargs) -> AIMessage:
+        seconds, outcome = self._draw()
+        time.sleep(seconds)
+        return self._respond(messages, outcome)
+
+    async def ainvoke(self, messages, **kwargs) -> AIMessage:
+        seconds, outcome = self._draw()
+        await asyncio.sleep(seconds)
+        return self._respond(messages, outcome)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"latency": self.latency.describe(), "calls": self.calls,
+                    "failures": self.failures, "malformed": self.malformed}
+
+
+# Process-wide fake, set up by configure_from_env() at startup
+_installed: Optional[FakeChatModel] = None
+
+
+def install(llm: FakeChatModel):
+    global _installed
+    _installed = llm
+    agent_module.set_llm(llm)
+
+
+def uninstall():
+    """Drop the fake; the next get_llm() creates the real client again"""
+    global _installed
+    if _installed is not None:
+        agent_module.set_llm(None)
+    _installed = None
+
+
+def configure_from_env():
+    """
+    Use the fake instead of ChatGroq when LLM_PROVIDER=fake
+
+    FAKE_LLM_LATENCY: seconds or distribution spec (default 0.2)
+    FAKE_LLM_FAILURE_RATE / FAKE_LLM_MALFORMED_RATE: shares of calls (default 0)
+    FAKE_LLM_SEED: seed for repeatable runs
+    """
+    if os.getenv("LLM_PROVIDER", "groq").lower() != "fake":
+        return
+    seed = os.getenv("FAKE_LLM_SEED")
+    install(FakeChatModel(
+        latency=os.getenv("FAKE_LLM_LATENCY", "0.2"),
+        failure_rate=float(os.getenv("FAKE_LLM_FAILURE_RATE", "0")),
+        malformed_rate=float(os.getenv("FAKE_LLM_MALFORMED_RATE", "0")),
+        seed=int(seed) if seed else None,
+    ))
+
+
+def stats() -> dict:
+    if _installed is None:
+        return {"provider": "groq"}
+    return {"provider": "fake", **_installed.snapshot()}
@@ -0,0 +1,392 @@
+"""
+Rule-based fast path for entity extraction
+
+Templated notes ("Met Dr. Meera Patel on 12 March 2026, gave 2 samples of
+ABC-10, shared 3 brochures, agreed to trial") can be extracted without an
+LLM round trip. extract() runs regexes for dates, times and quantities,
+a gazetteer lookup of the HCP name against the store, and a product code
+pattern (or list), and gives every field a confidence. The agent's
+pre_extract node stores the result; extract_entities then asks the LLM only
+for the fields below FAST_EXTRACT_MIN_CONFIDENCE, or skips the call when
+there are none.
+
+Absent fields (no outcome, no materials) are only trusted when every clause
+of the note was matched by some rule. Free-form notes keep the values the
+rules found but send the rest to the LLM.
+"""
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from .agent_registry import agent_module
+
+EXTRACTION_FIELDS = agent_module.EXTRACTION_FIELDS
+
+# Notes longer than this are never fully handled by the rules
+MAX_NOTE_CHARS = 600
+
+_MONTHS = {m: i for i, m in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], 1)}
+_MONTH = r"(?P<month>jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?"
+_NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+                 "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "twelve": 12}
+# Pattern fragments and helpers shared with edit_parser
+QTY = r"(?P<qty>\d{1,4}|a|an|one|two|three|four|five|six|seven|eight|nine|ten|twelve)"
+# e.g. ABC-10, XYZ 5, CZ100 (upper case even inside case-insensitive patterns)
+PRODUCT_CODE = r"(?P<code>(?-i:[A-Z][A-Z0-9]{1,9}(?:[- ]?\d{1,4}[A-Z]?)?))"
+MATERIAL_TYPES = ("study reprint", "patient guide", "detail aid", "brochure", "leaflet", "pamphlet",
+                  "flyer", "reprint", "poster", "booklet", "handout")
+
+_HCP = re.compile(r"\b(?:Dr|Doctor|Prof|Professor)\.?\s+(?P<name>[A-Z][\w'-]+(?:\s+(?!(?:on|at|in|and|to)\b)[A-Z][\w'-]+){0,2})")
+_ISO_DATE = re.compile(r"\b(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})(?:[T ](?P<hour>\d{1,2}):(?P<minute>\d{2}))?")
+_DAY_MONTH = re.compile(rf"\b(?P<day>\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?{_MONTH}(?:,?\s+(?P<year>\d{{4}}))?\b", re.I)
+_MONTH_DAY = re.compile(rf"\b{_MONTH}\s+(?P<day>\d{{1,2}})(?:st|nd|rd|th)?(?:,?\s+(?P<year>\d{{4}}))?\b", re.I)
+_SLASH_DATE = re.compile(r"\b(?P<day>\d{1,2})/(?P<month>\d{1,2})/(?P<year>\d{4})\b")
+_RELATIVE_DATE = re.compile(r"\b(?P<word>today|yesterday)\b", re.I)
+_TIME = re.compile(r"\b(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<ampm>am|pm)\b|\b(?P<hour24>\d{1,2}):(?P<minute24>\d{2})\b", re.I)
+_SAMPLES = [
+    re.compile(rf"\b{QTY}\s+(?:x\s+)?(?:samples?|units?|boxes|packs?)\s+of\s+{PRODUCT_CODE}", re.I),
+    re.compile(rf"\b{QTY}\s+{PRODUCT_CODE}\s+samples?\b", re.I),
+]
+_MATERIAL = re.compile(rf"\b{QTY}\s+(?:copies\s+of\s+(?:the\s+)?)?(?P<type>{'|'.join(MATERIAL_TYPES)})s?\b", re.I)
+_TOPICS = re.compile(r"\bdiscuss(?:ed|ing)?\s+(?:the\s+)?(?P<topics>.+?)(?=[.;]|,\s*(?:gave|shared|left|provided|handed|agreed|will|committed|plans?|requested|asked)\b|$)", re.I)
+_OUTCOME = re.compile(r"\b(?:agreed to|will|committed to|plans? to|requested|asked for)\b[^.;,]*", re.I)
+_TOPIC_SPLIT = re.compile(r"\s*(?:,|\band\b|&)\s*", re.I)
+# Words that only connect the matched clauses ("Met ... on ..., gave ...")
+_CONNECTORS = {
+    "met", "meeting", "with", "on", "at", "in", "the", "and", "of", "to", "visited", "visit", "saw",
+    "called", "call", "spoke", "gave", "shared", "left", "provided", "handed", "over", "also", "then",
+    "today", "yesterday", "her", "him", "them", "clinic", "office", "hospital",
+}
+_WORD = re.compile(r"[A-Za-z0-9][\w'-]*")
+
+
+def parse_quantity(value: str) -> int:
+    return int(value) if value.isdigit() else _NUMBER_WORDS[value.lower()]
+
+
+def normalize_code(code: str) -> str:
+    return re.sub(r"\s+", "-", code.upper())
+
+
+class _Rules:
+    """Field values, confidences and the character spans the rules consumed"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.values = {}
+        self.confidence = {}
+        self.spans = []
+
+    def found(self, field: str, value, confidence: float, *spans):
+        self.values[field] = value
+        self.confidence[field] = confidence
+        self.spans.extend(spans)
+
+    def leftover_words(self) -> List[str]:
+        chars = list(self.text)
+        for start, end in self.spans:
+            chars[start:end] = " " * (end - start)
+        return [w for w in _WORD.findall("".join(chars)) if w.lower() not in _CONNECTORS]
+
+
+def _match_hcp(rules: _Rules, resolve_hcp: Optional[Callable]):
+    match = _HCP.search(rules.text)
+    if not match:
+        return
+    name = match.group("name")
+    hcp = resolve_hcp(name) if resolve_hcp is not None else None
+    if hcp:
+        # Known HCP (gazetteer hit): reuse its stored name and id
+        rules.found("hcp_name", hcp["name"], hcp.get("score", 1.0), match.span())
+        rules.values["hcp_id"] = hcp["id"]
+    else:
+        rules.found("hcp_name", f"Dr. {name}", 0.75, match.span())
+
+
+def _match_datetime(rules: _Rules, now: datetime):
+    text, date, confidence, spans = rules.text, None, 0.0, []
+    match = _ISO_DATE.search(text)
+    if match:
+        date = datetime(int(match["year"]), int(match["month"]), int(match["day"]),
+                        int(match["hour"] or 0), int(match["minute"] or 0))
+        confidence = 0.95
+        spans.append(match.span())
+    else:
+        for pattern in (_DAY_MONTH, _MONTH_DAY):
+            match = pattern.search(text)
+            if match:
+                year = int(match["year"]) if match["year"] else now.year
+                date = datetime(year, _MONTHS[match["month"][:3].lower()], int(match["day"]))
+                confidence = 0.9 if match["year"] else 0.85
+                spans.append(match.span())
+                break
+        else:
+            match = _SLASH_DATE.search(text) or _RELATIVE_DATE.search(text)
+            if match is not None and match.re is _SLASH_DATE:
+                # dd/mm vs mm/dd is ambiguous; let the LLM confirm
+                date = datetime(int(match["year"]), int(match["month"]), int(match["day"]))
+                confidence = 0.6
+                spans.append(match.span())
+            elif match is not None:
+                day = now if match["word"].lower() == "today" else now - timedelta(days=1)
+                date = day.replace(hour=0, minute=0, second=0, microsecond=0)
+                confidence = 0.85
+                spans.append(match.span())
+    if date is None:
+        return
+    match = _TIME.search(text)
+    if match and not (match["hour24"] and _ISO_DATE.search(text)):
+        if match["ampm"]:
+            hour = int(match["hour"]) % 12 + (12 if match["ampm"].lower() == "pm" else 0)
+            minute = int(match["minute"] or 0)
+        else:
+            hour, minute = int(match["hour24"]), int(match["minute24"])
+        if hour < 24 and minute < 60:
+            date = date.replace(hour=hour, minute=minute)
+            spans.append(match.span())
+    rules.found("datetime", date.isoformat(), confidence, *spans)
+
+
+def _match_samples(rules: _Rules, product_codes: frozenset):
+    samples, spans, confidence = [], [], 1.0
+    for pattern in _SAMPLES:
+        for match in pattern.finditer(rules.text):
+            if any(s <= match.start() < e for s, e in spans):
+                continue
+            code = normalize_code(match["code"])
+            if product_codes:
+                confidence = min(confidence, 0.95 if code in product_codes else 0.6)
+            else:
+                confidence = min(confidence, 0.85)
+            samples.append({"product_code": code, "quantity": parse_quantity(match["qty"])})
+            spans.append(match.span())
+    if samples:
+        rules.found("samples", samples, confidence, *spans)
+
+
+def _match_materials(rules: _Rules):
+    matches = list(_MATERIAL.finditer(rules.text))
+    if matches:
+        materials = [{"material_type": m["type"].lower(), "quantity": parse_quantity(m["qty"])} for m in matches]
+        rules.found("materials", materials, 0.9, *(m.span() for m in matches))
+
+
+def _match_topics(rules: _Rules):
+    match = _TOPICS.search(rules.text)
+    if match:
+        topics = [t.strip() for t in _TOPIC_SPLIT.split(match["topics"]) if t.strip()]
+        if topics:
+            rules.found("topics", topics, 0.85, match.span())
+
+
+def _match_outcome(rules: _Rules):
+    match = _OUTCOME.search(rules.text)
+    if match:
+        rules.found("outcome", match.group(0).strip(), 0.85, match.span())
+
+
+def parse_datetime(text: str, now: Optional[datetime] = None) -> Optional[str]:
+    """ISO datetime for the first date (and time) in text, or None"""
+    rules = _Rules(" ".join(text.split()))
+    try:
+        _match_datetime(rules, now or datetime.now())
+    except ValueError:
+        return None
+    return rules.values.get("datetime")
+
+
+def extract(text: str, resolve_hcp: Optional[Callable] = None, product_codes=(),
+            now: Optional[datetime] = None) -> dict:
+    """
+    Rule-based extraction of one note
+
+    Args:
+        text: The rep's note
+        resolve_hcp: name -> stored HCP dict (with "score") or None; the gazetteer
+        product_codes: Known product codes; when given, other codes are low confidence
+        now: Reference time for "today"/"yesterday" and dates without a year
+
+    Returns:
+        extracted_data dict: every EXTRACTION_FIELDS key, "hcp_id" for a known
+        HCP, and "field_confidence" (field -> 0-1)
+    """
+    text = " ".join(text.split())
+    rules = _Rules(text)
+    _match_hcp(rules, resolve_hcp)
+    try:
+        _match_datetime(rules, now or datetime.now())
+    except ValueError:
+        # Digits that aren't a real date (e.g. 31 Feb); left to the LLM even
+        # when the rest of the note is structured
+        rules.confidence["datetime"] = 0.0
+    _match_samples(rules, frozenset(normalize_code(c) for c in product_codes))
+    _match_materials(rules)
+    _match_topics(rules)
+    _match_outcome(rules)
+
+    # Any unmatched word other than a connector may carry meaning ("not
+    # interested", "declined samples"), so absent fields are only trusted
+    # when there are none
+    structured = len(text) <= MAX_NOTE_CHARS and not rules.leftover_words()
+    extracted = {"hcp_name": "", "datetime": None, "summary": None, "materials": [], "samples": [],
+                 "topics": [], "outcome": None, **rules.values}
+    confidence = dict(rules.confidence)
+    if structured:
+        # Every clause was understood: the note is its own summary and
+        # anything not found is genuinely absent
+        extracted["summary"] = text
+        confidence["summary"] = 0.85
+        for field in EXTRACTION_FIELDS:
+            confidence.setdefault(field, 0.9)
+    else:
+        # Lists may be missing items written in prose
+        for field in ("materials", "samples", "topics"):
+            if field in confidence:
+                confidence[field] = min(confidence[field], 0.5)
+        for field in EXTRACTION_FIELDS:
+            confidence.setdefault(field, 0.0)
+    extracted["field_confidence"] = {f: round(confidence[f], 2) for f in EXTRACTION_FIELDS}
+    return extracted
+
+
+class FastPathStats:
+    """Hit counters plus rule and LLM timings, for the latency-saved estimate"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.notes = self.full_hits = self.partial_hits = 0
+        self.fields_skipped = 0
+        self.rule_seconds = 0.0
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+
+    def record_note(self, llm_fields: List[str], seconds: float):
+        with self._lock:
+            self.notes += 1
+            self.rule_seconds += seconds
+            self.fields_skipped += len(EXTRACTION_FIELDS) - len(llm_fields)
+            if not llm_fields:
+                self.full_hits += 1
+            elif len(llm_fields) < len(EXTRACTION_FIELDS):
+                self.partial_hits += 1
+
+    def record_llm(self, seconds: float):
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_seconds += seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            notes = self.notes
+            llm_ms = self.llm_seconds / self.llm_calls * 1000 if self.llm_calls else None
+            rule_ms = self.rule_seconds / notes * 1000 if notes else 0.0
+            # Only skipped calls count; shorter partial prompts are not credited
+            saved_ms = (self.full_hits * llm_ms - self.rule_seconds * 1000) if llm_ms is not None else None
+            return {
+                "notes": notes,
+                "full_hits": self.full_hits,
+                "partial_hits": self.partial_hits,
+                "misses": notes - self.full_hits - self.partial_hits,
+                "hit_rate": round(self.full_hits / notes, 4) if notes else 0.0,
+                "fields_from_rules": round(self.fields_skipped / (notes * len(EXTRACTION_FIELDS)), 4) if notes else 0.0,
+                "avg_rule_ms": round(rule_ms, 3),
+                "avg_extraction_llm_ms": round(llm_ms, 1) if llm_ms is not None else None,
+                "saved_ms_per_note": round(saved_ms / notes, 1) if notes and saved_ms is not None else None,
+            }
+
+
+class TimedChatModel:
+    """Chat model wrapper that records each call's latency in FastPathStats"""
+
+    def __init__(self, llm, stats: FastPathStats):
+        self.llm = llm
+        self.stats = stats
+
+    def bind(self, **kwargs):
+        return TimedChatModel(self.llm.bind(**kwargs), self.stats)
+
+    def invoke(self, messages, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.llm.invoke(messages, **kwargs)
+        finally:
+            self.stats.record_llm(time.perf_counter() - start)
+
+    async def ainvoke(self, messages, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await self.llm.ainvoke(messages, **kwargs)
+        finally:
+            self.stats.record_llm(time.perf_counter() - start)
+
+
+class FastExtractor:
+    """The pre_extract hook installed into the agent"""
+
+    def __init__(self, min_confidence: float = 0.8, product_codes=(), stats: FastPathStats = None):
+        self.min_confidence = min_confidence
+        self.product_codes = tuple(product_codes)
+        self.stats = stats or FastPathStats()
+
+    def __call__(self, text: str, crud_functions: dict) -> dict:
+        start = time.perf_counter()
+        extracted = extract(text, crud_functions.get("resolve_hcp"), self.product_codes)
+        llm_fields = [f for f in EXTRACTION_FIELDS if extracted["field_confidence"][f] < self.min_confidence]
+        if "hcp_name" in llm_fields:
+            # The LLM may name someone else; let the usual lookup run on its answer
+            extracted.pop("hcp_id", None)
+        extracted["llm_fields"] = llm_fields
+        self.stats.record_note(llm_fields, time.perf_counter() - start)
+        return extracted
+
+
+# Process-wide extractor, set up by configure_from_env() at startup
+_extractor: Optional[FastExtractor] = None
+_wrapper = None
+
+
+def install(extractor: FastExtractor):
+    """Run `extractor` as the agent's pre_extract step and time extract_entities LLM calls"""
+    global _extractor, _wrapper
+    uninstall()
+    _extractor = extractor
+    _wrapper = lambda llm, node: TimedChatModel(llm, extractor.stats)
+    agent_module.set_pre_extractor(extractor)
+    agent_module.add_llm_wrapper(_wrapper, nodes=["extract_entities"])
+
+
+def uninstall():
+    global _extractor, _wrapper
+    if _wrapper is not None:
+        agent_module.remove_llm_wrapper(_wrapper)
+    agent_module.set_pre_extractor(None)
+    _extractor, _wrapper = None, None
+
+
+def configure_from_env():
+    """
+    Install the fast path unless FAST_EXTRACT_ENABLED=false
+
+    FAST_EXTRACT_MIN_CONFIDENCE: fields below this go to the LLM (default 0.8)
+    PRODUCT_CODES: comma-separated known product codes (optional; without it
+        any code-shaped token is accepted with slightly lower confidence)
+    """
+    if os.getenv("FAST_EXTRACT_ENABLED", "true").lower() in ("0", "false", "no"):
+        return
+    install(FastExtractor(
+        min_confidence=float(os.getenv("FAST_EXTRACT_MIN_CONFIDENCE", "0.8")),
+        product_codes=[c.strip() for c in os.getenv("PRODUCT_CODES", "").split(",") if c.strip()],
+    ))
+
+
+def stats() -> dict:
+    if _extractor is None:
+        return {"enabled": False}
+    return {"enabled": True, "min_confidence": _extractor.min_confidence, **_extractor.stats.snapshot()}
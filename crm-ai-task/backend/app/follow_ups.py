@@ -0,0 +1,439 @@
+"""
+Due-date index and reminder scheduler for follow-ups
+
+Every follow-up is tracked by id, and the pending ones (any status but
+"done" or "cancelled") that have a due_date are kept in SortedIndex keys
+(due_date, id): one per owner plus one across all owners. A follow-up
+without an owner belongs to its interaction's rep. "What is due for rep R
+in the next 7 days" or "what is overdue" is then two bisects and a walk
+over the page returned, whatever the number of follow-ups.
+
+A crud change listener diffs an interaction's follow-ups against its
+previous version, so adding, rescheduling, reassigning, completing or
+removing one moves or drops just that key. Status changes made through
+transition() go through crud.update_interaction like any other edit and
+reach the index the same way.
+
+ReminderScheduler keeps a min-heap of (remind_at, due_date, id), where
+remind_at is the due date minus a lead time, fed by the index as keys are
+added or moved. Its thread sleeps until the earliest remind_at (or until an
+earlier one is pushed), then pops everything that has come due and hands it
+to the reminder sinks in batches. Entries for follow-ups that were
+completed or rescheduled in the meantime are dropped when popped.
+"""
+import heapq
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import crud
+from .pagination import decode_interaction_cursor, encode_cursor, to_naive_utc
+from .sorted_index import SortedIndex
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ("open", "done", "cancelled")
+CLOSED = frozenset({"done", "cancelled"})
+# Status -> statuses it may move to; stored statuses outside STATUSES count as open
+TRANSITIONS = {"open": {"done", "cancelled"}, "done": {"open"}, "cancelled": {"open"}}
+# Days until a suggested follow-up is due, by the suggestion's priority
+SUGGESTED_DUE_DAYS = {"high": 2, "medium": 7, "low": 14}
+
+Key = Tuple[datetime, str]
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def suggested_due_date(priority: Optional[str], now: Optional[datetime] = None) -> datetime:
+    """Due date for an agent-suggested follow-up (unknown priorities count as medium)"""
+    days = SUGGESTED_DUE_DAYS.get(str(priority or "").strip().lower(), SUGGESTED_DUE_DAYS["medium"])
+    return (now or datetime.utcnow()) + timedelta(days=days)
+
+
+class Entry:
+    """What the index knows about one follow-up"""
+
+    __slots__ = ("id", "interaction_id", "hcp_id", "owner", "due_date", "action_item", "status")
+
+    def __init__(self, f: dict, inter: dict):
+        self.id = f["id"]
+        self.interaction_id = inter["id"]
+        self.hcp_id = inter.get("hcp_id")
+        self.owner = f.get("owner") or inter.get("rep_id") or ""
+        self.due_date = to_naive_utc(f.get("due_date"))
+        self.action_item = f.get("action_item")
+        self.status = f.get("status") or "open"
+
+    @property
+    def pending(self) -> bool:
+        return self.status not in CLOSED
+
+    @property
+    def key(self) -> Optional[Key]:
+        """Sort key while pending with a due date, else None"""
+        if self.due_date is None or not self.pending:
+            return None
+        return self.due_date, self.id
+
+    def same(self, other: "Entry") -> bool:
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def _entries(inter: Optional[dict]) -> Dict[str, Entry]:
+    if inter is None:
+        return {}
+    return {f["id"]: Entry(f, inter) for f in inter.get("follow_ups") or ()}
+
+
+class FollowUpIndex:
+    """Follow-ups by id, and pending ones by (due_date, id) per owner and overall"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Entry] = {}
+        self._due = SortedIndex()
+        self._by_owner: Dict[str, SortedIndex] = {}
+        # Called with (due_date, id) whenever a key is added, e.g. ReminderScheduler.push
+        self._watchers: List[Callable[[datetime, str], None]] = []
+        self.updates = 0
+        self.rebuild_ms = 0.0
+
+    def watch(self, fn: Callable[[datetime, str], None]):
+        self._watchers.append(fn)
+
+    def unwatch(self, fn: Callable[[datetime, str], None]):
+        if fn in self._watchers:
+            self._watchers.remove(fn)
+
+    def _add_key(self, entry: Entry):
+        key = entry.key
+        if key is None:
+            return
+        self._due.add(key)
+        self._by_owner.setdefault(entry.owner, SortedIndex()).add(key)
+        for fn in self._watchers:
+            fn(*key)
+
+    def _remove_key(self, entry: Entry):
+        key = entry.key
+        if key is None:
+            return
+        self._due.remove(key)
+        keys = self._by_owner.get(entry.owner)
+        if keys is not None:
+            keys.remove(key)
+            if not len(keys):
+                del self._by_owner[entry.owner]
+
+    def apply(self, old: Optional[dict], new: Optional[dict]):
+        """crud listener: add, move or drop the keys of follow-ups that changed"""
+        if old is None and new is None:
+            self.clear()
+            return
+        before, after = _entries(old), _entries(new)
+        if not before and not after:
+            return
+        with self._lock:
+            for fid, entry in before.items():
+                if fid not in after:
+                    self._remove_key(self._entries.pop(fid, entry))
+            for fid, entry in after.items():
+                current = self._entries.get(fid)
+                if current is not None and current.same(entry):
+                    continue
+                if current is not None:
+                    self._remove_key(current)
+                self._entries[fid] = entry
+                self._add_key(entry)
+            self.updates += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._due.clear()
+            self._by_owner.clear()
+
+    def rebuild(self, interactions):
+        """Index from scratch (e.g. every interaction in the store at startup)"""
+        start = time.perf_counter()
+        entries, by_owner = {}, {}
+        for inter in interactions:
+            for fid, entry in _entries(inter).items():
+                entries[fid] = entry
+                if entry.key is not None:
+                    by_owner.setdefault(entry.owner, []).append(entry.key)
+        due = SortedIndex()
+        due.update(key for keys in by_owner.values() for key in keys)
+        owners = {}
+        for owner, keys in by_owner.items():
+            owners[owner] = SortedIndex()
+            owners[owner].update(keys)
+        with self._lock:
+            self._entries, self._due, self._by_owner = entries, due, owners
+        self.rebuild_ms = (time.perf_counter() - start) * 1000
+
+    def get(self, follow_up_id: str) -> Optional[dict]:
+        entry = self._entries.get(follow_up_id)
+        return entry.to_dict() if entry is not None else None
+
+    def current(self, due_date: datetime, follow_up_id: str) -> Optional[Entry]:
+        """The entry if it is still pending and due at due_date"""
+        entry = self._entries.get(follow_up_id)
+        if entry is None or entry.key != (due_date, follow_up_id):
+            return None
+        return entry
+
+    def page(self, owner: Optional[str], start: Optional[datetime], end: Optional[datetime],
+             cursor: Optional[str] = None, limit: int = 50) -> dict:
+        """
+        Pending follow-ups due in [start, end) (None = unbounded), soonest first
+
+        owner None means every owner. Keyset-paginated like the interaction
+        listing: pass next_cursor back as cursor with the same bounds.
+        Raises ValueError for a cursor we did not issue.
+        """
+        keys = self._due if owner is None else self._by_owner.get(owner)
+        if keys is None:
+            return {"items": [], "next_cursor": None}
+        lo, inclusive = ((start,) if start is not None else None), True
+        if cursor:
+            lo, inclusive = decode_interaction_cursor(cursor), False
+        hi = (end,) if end is not None else None
+        found = list(islice(keys.irange(lo, hi, inclusive=(inclusive, False)), limit + 1))
+        items = [e for e in (self._entries.get(fid) for _, fid in found[:limit]) if e is not None]
+        next_cursor = encode_cursor(found[limit - 1]) if len(found) > limit else None
+        return {"items": [e.to_dict() for e in items], "next_cursor": next_cursor}
+
+    def due_soon(self, owner: Optional[str], within: timedelta, now: Optional[datetime] = None,
+                 cursor: Optional[str] = None, limit: int = 50) -> dict:
+        now = now or datetime.utcnow()
+        return self.page(owner, now, now + within, cursor, limit)
+
+    def overdue(self, owner: Optional[str], now: Optional[datetime] = None,
+                cursor: Optional[str] = None, limit: int = 50) -> dict:
+        """Pending follow-ups whose due date has passed, longest overdue first"""
+        return self.page(owner, None, now or datetime.utcnow(), cursor, limit)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"follow_ups": len(self._entries), "pending_with_due_date": len(self._due),
+                    "owners": len(self._by_owner), "updates": self.updates, "rebuild_ms": round(self.rebuild_ms, 1)}
+
+
+class ReminderScheduler:
+    """
+    Emits reminders for pending follow-ups `lead` before they are due
+
+    start() schedules the pending follow-ups whose reminder is still ahead;
+    ones already inside the lead time or overdue are skipped, so a restart
+    does not re-send reminders (the overdue query covers those). A
+    follow-up created, rescheduled or reopened inside the lead time is
+    reminded right away. Each follow-up has at most one reminder scheduled,
+    for its current due date.
+    """
+
+    def __init__(self, index: FollowUpIndex, lead: timedelta = timedelta(hours=24), batch_size: int = 100,
+                 keep: int = 1000):
+        self.index = index
+        self.lead = lead
+        self.batch_size = batch_size
+        self._cond = threading.Condition()
+        self._heap: List[Tuple[datetime, datetime, str]] = []
+        # follow-up id -> due date of its scheduled reminder
+        self._scheduled: Dict[str, datetime] = {}
+        self._sinks: List[Callable[[List[dict]], None]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self.recent = deque(maxlen=keep)
+        self.sent = 0
+        self.batches = 0
+        self.stale = 0
+
+    def add_sink(self, fn: Callable[[List[dict]], None]):
+        """fn(reminders) is called from the scheduler thread with each batch"""
+        self._sinks.append(fn)
+
+    def remove_sink(self, fn: Callable[[List[dict]], None]):
+        if fn in self._sinks:
+            self._sinks.remove(fn)
+
+    def push(self, due_date: datetime, follow_up_id: str):
+        """Index watcher: schedule a reminder, waking the thread if it is now the earliest"""
+        with self._cond:
+            if self._scheduled.get(follow_up_id) == due_date:
+                return
+            self._scheduled[follow_up_id] = due_date
+            item = (due_date - self.lead, due_date, follow_up_id)
+            heapq.heappush(self._heap, item)
+            if self._heap[0] is item:
+                self._cond.notify()
+
+    def start(self):
+        self.index.watch(self.push)
+        for due_date, fid in list(self.index._due.irange((datetime.utcnow() + self.lead,))):
+            self.push(due_date, fid)
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="follow-up-reminders", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.index.unwatch(self.push)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self._thread = None
+
+    def _take(self, now: datetime) -> List[dict]:
+        """Pop up to batch_size reminders that are due by now; caller holds _cond"""
+        batch = []
+        while self._heap and self._heap[0][0] <= now and len(batch) < self.batch_size:
+            _, due_date, fid = heapq.heappop(self._heap)
+            if self._scheduled.get(fid) != due_date:
+                self.stale += 1
+                continue
+            del self._scheduled[fid]
+            entry = self.index.current(due_date, fid)
+            if entry is None:
+                self.stale += 1
+                continue
+            batch.append({**entry.to_dict(), "remind_at": due_date - self.lead, "reminded_at": now})
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    now = datetime.utcnow()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    timeout = (self._heap[0][0] - now).total_seconds() if self._heap else None
+                    self._cond.wait(timeout)
+                if self._stopping:
+                    return
+                batch = self._take(datetime.utcnow())
+            if batch:
+                self._emit(batch)
+
+    def _emit(self, batch: List[dict]):
+        self.sent += len(batch)
+        self.batches += 1
+        self.recent.extend(batch)
+        logger.info("Sending %d follow-up reminders", len(batch))
+        for fn in list(self._sinks):
+            try:
+                fn(batch)
+            except Exception:
+                logger.exception("Follow-up reminder sink failed")
+
+    def reminders(self, owner: Optional[str] = None, limit: int = 100) -> List[dict]:
+        """Most recently sent reminders, newest first"""
+        found = (r for r in reversed(self.recent) if owner is None or r["owner"] == owner)
+        return list(islice(found, limit))
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            scheduled = len(self._scheduled)
+            next_at = self._heap[0][0] if self._heap else None
+        return {"lead_seconds": self.lead.total_seconds(), "batch_size": self.batch_size, "scheduled": scheduled,
+                "next_remind_at": next_at, "sent": self.sent, "batches": self.batches, "stale_skipped": self.stale}
+
+
+# Process-wide index and scheduler, set up by configure_from_env() at startup
+_index: Optional[FollowUpIndex] = None
+_scheduler: Optional[ReminderScheduler] = None
+
+
+def install(index: FollowUpIndex = None, rebuild: bool = True, scheduler: ReminderScheduler = None):
+    """Index every stored follow-up, then follow writes through a crud listener"""
+    global _index, _scheduler
+    uninstall()
+    index = index or FollowUpIndex()
+    if rebuild:
+        index.rebuild(crud.iter_interactions())
+    crud.add_listener(index.apply)
+    _index = index
+    if scheduler is not None:
+        scheduler.start()
+        _scheduler = scheduler
+
+
+def uninstall():
+    global _index, _scheduler
+    if _scheduler is not None:
+        _scheduler.stop()
+    if _index is not None:
+        crud.remove_listener(_index.apply)
+    _index, _scheduler = None, None
+
+
+def configure_from_env():
+    """
+    FOLLOW_UP_INDEX_ENABLED: maintain the due-date index (default true)
+    FOLLOW_UP_REMINDERS_ENABLED: run the reminder scheduler (default true)
+    FOLLOW_UP_REMINDER_LEAD: seconds before the due date a reminder is sent (default 86400)
+    FOLLOW_UP_REMINDER_BATCH: most reminders handed to the sinks at once (default 100)
+    """
+    if os.getenv("FOLLOW_UP_INDEX_ENABLED", "true").lower() in ("0", "false", "no"):
+        return
+    index = FollowUpIndex()
+    scheduler = None
+    if os.getenv("FOLLOW_UP_REMINDERS_ENABLED", "true").lower() not in ("0", "false", "no"):
+        scheduler = ReminderScheduler(index, lead=timedelta(seconds=float(os.getenv("FOLLOW_UP_REMINDER_LEAD", "86400"))),
+                                      batch_size=int(os.getenv("FOLLOW_UP_REMINDER_BATCH", "100")))
+    install(index, scheduler=scheduler)
+
+
+def get_index() -> Optional[FollowUpIndex]:
+    return _index
+
+
+def get_scheduler() -> Optional[ReminderScheduler]:
+    return _scheduler
+
+
+def transition(follow_up_id: str, status: str) -> Optional[dict]:
+    """
+    Move a follow-up to another status through crud.update_interaction
+
+    Returns the updated follow-up, or None when the index does not know the
+    id. Raises InvalidTransition when TRANSITIONS does not allow the move.
+    The status is checked under crud's per-interaction update lock, so of
+    two racing moves from the same status only the first is applied.
+    """
+    entry = _index.get(follow_up_id) if _index is not None else None
+    if entry is None:
+        return None
+
+    def check(inter: dict):
+        row = next((f for f in inter["follow_ups"] if f["id"] == follow_up_id), None)
+        if row is None:
+            return
+        current = row["status"] if row["status"] in TRANSITIONS else "open"
+        if status not in TRANSITIONS.get(current, ()):
+            raise InvalidTransition(f"Cannot move a follow-up from {row['status']} to {status}")
+
+    updated = crud.update_interaction(entry["interaction_id"],
+                                      {"follow_ups": {"update": [{"id": follow_up_id, "status": status}]}},
+                                      precondition=check)
+    if not updated:
+        return None
+    return next((f for f in updated["follow_ups"] if f["id"] == follow_up_id), None)
+
+
+def stats() -> dict:
+    if _index is None:
+        return {"enabled": False}
+    return {"enabled": True, **_index.snapshot(),
+            "reminders": _scheduler.snapshot() if _scheduler is not None else {"enabled": False}}
@@ -1,18 +1,16 @@
-from .db import SessionLocal, engine
-from .models import Base
-from .crud import create_hcp
+import os
+from . import crud, storage
 from .schemas import HCPCreate
 
 def seed():
-    db = SessionLocal()
-    try:
-        for name in ["Dr. Meera Patel", "Dr. Rohan Sharma", "Dr. Anita Rao"]:
-            h = HCPCreate(name=name, organisation="City Hospital", speciality="Cardiology")
-            create_hcp(db, h)
-    finally:
-        db.close()
+    for name in ["Dr. Meera Patel", "Dr. Rohan Sharma", "Dr. Anita Rao"]:
+        if any(h["name"] == name for h in crud.search_hcp_by_name(name)):
+            continue
+        h = HCPCreate(name=name, organisation="City Hospital", speciality="Cardiology")
+        crud.create_hcp(h)
 
 if __name__ == "__main__":
-    Base.metadata.create_all(bind=engine)
+    # Seeding only makes sense for a persistent store; defaults to the SQL backend
+    crud.set_backend(storage.load_backend(os.getenv("STORAGE_BACKEND", "sql")))
     seed()
     print("Seeded HCPs")
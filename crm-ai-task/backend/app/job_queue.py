@@ -0,0 +1,396 @@
+"""
+Background job queue for agent processing
+
+POST /api/agent/conversational/jobs queues a note and returns 202 with a
+job id straight away; a pool of worker tasks on the server's event loop runs
+the note through the agent and GET /api/agent/jobs/{job_id} serves the
+status and, once finished, the result. Clients on flaky connections poll
+instead of holding a request open for the whole LLM pipeline.
+
+- Priorities: "high" jobs are picked before "normal" before "low"; equal
+  priorities run in submission order.
+- Retries: a failed run is retried after an exponential backoff (with a
+  little jitter) until max_attempts runs have failed.
+- Bounded depth: submit() raises QueueFull once max_depth jobs are waiting,
+  so a burst is pushed back to clients instead of piling up in memory.
+- Persistence (optional, JOB_QUEUE_PATH): a writer thread saves jobs to SQLite on every
+  state change and unfinished ones are queued again on startup, including
+  jobs that were running when the process stopped. The runner reports its
+  result through on_saved as soon as the interaction is written, so a job
+  interrupted after that point is marked succeeded with that result rather
+  than run (and saved) a second time. Without a store, queued jobs are lost
+  on restart.
+
+Enabled by configure_from_env() in the app's lifespan (JOB_WORKERS > 0).
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+# queued -> running -> succeeded | failed, or back to queued for a retry
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+
+class QueueFull(Exception):
+    """Raised by submit() when max_depth jobs are already waiting"""
+
+
+class SQLiteJobStore:
+    """
+    Durable copy of every job; finished jobs are dropped after result_ttl seconds
+
+    save() only serializes the job and queues it. A writer thread applies
+    saves in call order, committing everything queued since its last
+    commit at once, so the event loop never waits on disk.
+    """
+
+    def __init__(self, path: str, result_ttl: float = 86400):
+        self.path = path
+        self.result_ttl = result_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, "
+            "priority INTEGER NOT NULL, seq INTEGER NOT NULL, updated_at REAL NOT NULL, body TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, priority, seq)")
+        self._conn.commit()
+        self._writes = 0
+        self._pending = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="job-store-writer", daemon=True)
+        self._writer.start()
+
+    def save(self, job: dict, seq: int):
+        """Queue the job's current state for writing (serialized now, so later changes don't leak in)"""
+        self._pending.put((job["id"], job["status"], PRIORITIES[job["priority"]], seq, time.time(), json.dumps(job)))
+
+    def flush(self):
+        """Block until every queued save is written"""
+        self._pending.join()
+
+    def _write_loop(self):
+        while True:
+            rows = [self._pending.get()]
+            while rows[-1] is not None:
+                try:
+                    rows.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            stop = rows[-1] is None
+            try:
+                self._write([row for row in rows if row is not None])
+            except Exception:
+                logger.exception("Writing %d jobs to %s failed", len(rows), self.path)
+            finally:
+                for _ in rows:
+                    self._pending.task_done()
+            if stop:
+                return
+
+    def _write(self, rows: list):
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO jobs (id, status, priority, seq, updated_at, body) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            before, self._writes = self._writes, self._writes + len(rows)
+            # Trimming scans the table, so only do it every 100 writes
+            if self._writes // 100 != before // 100 and self.result_ttl:
+                self._conn.execute(
+                    "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                    (SUCCEEDED, FAILED, time.time() - self.result_ttl),
+                )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT body FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def unfinished(self) -> list:
+        """(seq, job) for queued and interrupted jobs, in pick-up order"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, body FROM jobs WHERE status IN (?, ?) ORDER BY priority, seq", (QUEUED, RUNNING)
+            ).fetchall()
+        return [(seq, json.loads(body)) for seq, body in rows]
+
+    def max_seq(self) -> int:
+        with self._lock:
+            (seq,) = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM jobs").fetchone()
+        return seq
+
+    def close(self):
+        """Write whatever is still queued, then close the database"""
+        self._pending.put(None)
+        self._writer.join()
+        with self._lock:
+            self._conn.close()
+
+
+class JobQueue:
+    """
+    Priority queue of agent jobs drained by worker tasks on the event loop
+
+    Args:
+        runner: Coroutine function taking a job payload and an on_saved
+            callback, returning the agent result dict; a result with
+            "success": False (or an exception) counts as a failed attempt.
+            It must pass the result to on_saved (from any thread) right
+            after its write lands, which makes the job final.
+        workers: Jobs run at once
+        max_depth: Jobs allowed to wait (queued or waiting for a retry)
+        max_attempts: Runs before a job is marked failed
+        retry_backoff: Seconds before the first retry; doubles per attempt
+        max_backoff: Cap on the retry delay
+        retention: Finished jobs kept in memory for status lookups (older
+            ones are still served from the SQLite store, if any)
+        store: Optional SQLiteJobStore
+    """
+
+    def __init__(self, runner: Callable[[dict], Awaitable[dict]], workers: int = 4, max_depth: int = 1000,
+                 max_attempts: int = 3, retry_backoff: float = 1.0, max_backoff: float = 60.0,
+                 retention: int = 10000, store: Optional[SQLiteJobStore] = None):
+        self.runner = runner
+        self.workers = workers
+        self.max_depth = max_depth
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.retention = retention
+        self.store = store
+        self._jobs: "OrderedDict[str, dict]" = OrderedDict()
+        self._seqs = {}
+        # Finished job ids, oldest first, for eviction
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+        self._seq = store.max_seq() if store else 0
+        self._ready: Optional[asyncio.PriorityQueue] = None
+        self._tasks = []
+        self._retry_handles = {}
+        self.waiting = self.running = 0
+        self.counts = {"submitted": 0, "succeeded": 0, "failed": 0, "retried": 0, "rejected": 0, "recovered": 0}
+
+    def start(self):
+        """Start the workers (needs a running event loop) and queue any unfinished persisted jobs"""
+        self._ready = asyncio.PriorityQueue()
+        if self.store is not None:
+            for seq, job in self.store.unfinished():
+                self._track(job, seq)
+                self.counts["recovered"] += 1
+                if job["status"] == RUNNING:
+                    # Interrupted mid-run by a restart; the attempt it was on still counts
+                    if job["result"] is not None:
+                        # It had already saved its interaction, so running it again would duplicate it
+                        self._finish(job, SUCCEEDED)
+                        continue
+                    if job["attempts"] >= job["max_attempts"]:
+                        job["error"] = "Interrupted by a restart on its last attempt"
+                        self._finish(job, FAILED)
+                        continue
+                    job["status"] = QUEUED
+                job["next_attempt_at"] = None
+                self._save(job)
+                self._enqueue(job)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Cancel the workers; with a store, jobs they were running are retried after restart"""
+        for handle in self._retry_handles.values():
+            handle.cancel()
+        self._retry_handles.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.store is not None:
+            await asyncio.to_thread(self.store.close)
+
+    def submit(self, payload: dict, priority: str = "normal") -> dict:
+        """
+        Queue a job and return a copy of it; raises QueueFull or ValueError for an unknown priority
+
+        Call from the event loop the workers run on: asyncio queues are not
+        thread-safe.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r}; expected one of {list(PRIORITIES)}")
+        if self.waiting >= self.max_depth:
+            self.counts["rejected"] += 1
+            raise QueueFull(f"Job queue is full ({self.max_depth} waiting)")
+        self._seq += 1
+        job = {
+            "id": str(uuid.uuid4()), "status": QUEUED, "priority": priority, "payload": payload,
+            "attempts": 0, "max_attempts": self.max_attempts, "error": None, "result": None,
+            "created_at": datetime.utcnow().isoformat(), "started_at": None, "finished_at": None,
+            "next_attempt_at": None,
+        }
+        self._track(job, self._seq)
+        self._save(job)
+        self._enqueue(job)
+        self.counts["submitted"] += 1
+        return dict(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return dict(job)
+        return self.store.get(job_id) if self.store is not None else None
+
+    def _track(self, job: dict, seq: int):
+        self._jobs[job["id"]] = job
+        self._seqs[job["id"]] = seq
+
+    def _save(self, job: dict):
+        if self.store is not None:
+            self.store.save(job, self._seqs[job["id"]])
+
+    def _enqueue(self, job: dict):
+        self.waiting += 1
+        self._ready.put_nowait((PRIORITIES[job["priority"]], self._seqs[job["id"]], job["id"]))
+
+    def _requeue(self, job_id: str):
+        self._retry_handles.pop(job_id, None)
+        job = self._jobs[job_id]
+        job["next_attempt_at"] = None
+        self.waiting -= 1
+        self._enqueue(job)
+
+    def _finish(self, job: dict, status: str):
+        job["status"] = status
+        job["finished_at"] = datetime.utcnow().isoformat()
+        self.counts[status] += 1
+        self._save(job)
+        # Oldest finished jobs go first; waiting and running ones are never evicted
+        self._finished[job["id"]] = None
+        while len(self._finished) > self.retention:
+            job_id, _ = self._finished.popitem(last=False)
+            del self._jobs[job_id]
+            del self._seqs[job_id]
+
+    async def _work(self):
+        while True:
+            _, _, job_id = await self._ready.get()
+            job = self._jobs[job_id]
+            self.waiting -= 1
+            self.running += 1
+            job["status"] = RUNNING
+            job["attempts"] += 1
+            job["started_at"] = datetime.utcnow().isoformat()
+            self._save(job)
+            try:
+                try:
+                    result = await self.runner(job["payload"], functools.partial(self._saved, job))
+                    error = None if result.get("success") else result.get("error") or "Processing failed"
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.exception("Job %s raised", job_id)
+                    result, error = None, str(e)
+            finally:
+                self.running -= 1
+
+            if job["result"] is not None:
+                # Saved before anything went wrong; a retry would save the note again
+                result, error = job["result"], None
+            if error is None:
+                job["result"], job["error"] = jsonable_encoder(result), None
+                self._finish(job, SUCCEEDED)
+            elif job["attempts"] >= job["max_attempts"]:
+                job["result"], job["error"] = None, error
+                self._finish(job, FAILED)
+            else:
+                delay = min(self.max_backoff, self.retry_backoff * 2 ** (job["attempts"] - 1))
+                delay *= 1 + random.random() * 0.1
+                job["status"], job["error"] = QUEUED, error
+                job["next_attempt_at"] = datetime.utcfromtimestamp(time.time() + delay).isoformat()
+                self.counts["retried"] += 1
+                # Counted as waiting from now on so retries can't be squeezed out by new submissions
+                self.waiting += 1
+                self._save(job)
+                self._retry_handles[job_id] = asyncio.get_running_loop().call_later(delay, self._requeue, job_id)
+
+    def _saved(self, job: dict, result: dict):
+        # The runner's write has landed: persist the result while the job is
+        # still running, so a restart finishes it instead of running it again
+        job["result"] = jsonable_encoder(result)
+        self._save(job)
+
+    def snapshot(self) -> dict:
+        return {
+            "workers": self.workers, "waiting": self.waiting, "running": self.running,
+            "max_depth": self.max_depth, "persistent": self.store is not None, **self.counts,
+        }
+
+
+# Process-wide queue, set up by configure_from_env() at startup
+_queue: Optional[JobQueue] = None
+
+
+def install(queue: JobQueue):
+    """Start queue's workers on the running event loop; call from the app's lifespan"""
+    global _queue
+    _queue = queue
+    queue.start()
+
+
+async def uninstall():
+    global _queue
+    if _queue is not None:
+        await _queue.stop()
+    _queue = None
+
+
+def configure_from_env(runner: Callable[[dict], Awaitable[dict]]):
+    """
+    JOB_WORKERS: agent jobs run at once (default 4; 0 disables the queue)
+    JOB_QUEUE_MAX_DEPTH: waiting jobs before submissions are rejected (default 1000)
+    JOB_MAX_ATTEMPTS: runs before a job fails (default 3)
+    JOB_RETRY_BACKOFF / JOB_MAX_BACKOFF: first retry delay and cap, seconds (defaults 1 / 60)
+    JOB_RETENTION: finished jobs kept in memory (default 10000)
+    JOB_QUEUE_PATH: SQLite file that keeps jobs across restarts (optional)
+    JOB_RESULT_TTL: seconds finished jobs stay in that file (default 86400)
+    """
+    workers = int(os.getenv("JOB_WORKERS", "4"))
+    if workers <= 0:
+        return
+    path = os.getenv("JOB_QUEUE_PATH")
+    install(JobQueue(
+        runner,
+        workers=workers,
+        max_depth=int(os.getenv("JOB_QUEUE_MAX_DEPTH", "1000")),
+        max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+        retry_backoff=float(os.getenv("JOB_RETRY_BACKOFF", "1")),
+        max_backoff=float(os.getenv("JOB_MAX_BACKOFF", "60")),
+        retention=int(os.getenv("JOB_RETENTION", "10000")),
+        store=SQLiteJobStore(path, result_ttl=float(os.getenv("JOB_RESULT_TTL", "86400"))) if path else None,
+    ))
+
+
+def get_queue() -> Optional[JobQueue]:
+    return _queue
+
+
+def stats() -> dict:
+    if _queue is None:
+        return {"enabled": False}
+    return {"enabled": True, **_queue.snapshot()}
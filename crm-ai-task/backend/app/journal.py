@@ -0,0 +1,191 @@
+"""
+Append-only journal and snapshots for the in-memory store
+
+The journal is a directory of numbered segments (journal.<seq>.log). Each
+record is a pickled tuple framed by its length and CRC32, written straight
+to the file descriptor (so it survives a process crash) and fsync'd in
+groups by a background thread (so per-write cost stays a single write()).
+A snapshot (snapshot.pkl, pickle protocol 5) records the segment that was
+current when it was taken; recovery loads it and replays that segment and
+any later ones. Segments older than the snapshot are deleted.
+"""
+import gc
+import logging
+import os
+import pickle
+import re
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = "snapshot.pkl"
+_SEGMENT = re.compile(r"^journal\.(\d+)\.log$")
+_HEADER = struct.Struct("<II")  # payload length, crc32
+
+
+def segment_path(directory: str, seq: int) -> str:
+    return os.path.join(directory, f"journal.{seq:08d}.log")
+
+
+def list_segments(directory: str) -> List[Tuple[int, str]]:
+    """(seq, path) of every journal segment, oldest first"""
+    segments = []
+    for name in os.listdir(directory):
+        match = _SEGMENT.match(name)
+        if match:
+            segments.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(segments)
+
+
+def read_records(path: str) -> Iterator[tuple]:
+    """
+    Records of one segment, in write order
+
+    A torn or corrupt tail (a crash mid-write) ends the segment; the file is
+    truncated back to the last complete record.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    offset, end = 0, len(data)
+    while offset + _HEADER.size <= end:
+        length, crc = _HEADER.unpack_from(data, offset)
+        start = offset + _HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        yield pickle.loads(payload)
+        offset = start + length
+    if offset < end:
+        logger.warning("Journal %s: dropping %d bytes of incomplete tail", path, end - offset)
+        os.truncate(path, offset)
+
+
+def _fsync_dir(directory: str):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_snapshot(directory: str, state: dict):
+    """Atomically replace the snapshot (write to a temp file, fsync, rename)"""
+    path = os.path.join(directory, SNAPSHOT_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(state, f, protocol=5)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(directory)
+
+
+@contextmanager
+def gc_paused():
+    """
+    Suspend the cyclic GC while building millions of small containers
+
+    Otherwise every few thousand allocations trigger a collection that
+    rescans everything loaded so far.
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def read_snapshot(directory: str) -> Optional[dict]:
+    path = os.path.join(directory, SNAPSHOT_FILE)
+    if not os.path.exists(path):
+        return None
+    with gc_paused(), open(path, "rb") as f:
+        return pickle.load(f)
+
+
+class Journal:
+    """
+    Writer for the current journal segment
+
+    fsync_interval > 0: a background thread fsyncs at most that often (group
+    commit; an OS crash can lose that window, a process crash loses nothing).
+    fsync_interval == 0: every append is fsync'd before returning.
+    """
+
+    def __init__(self, directory: str, fsync_interval: float = 0.05):
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        segments = list_segments(directory)
+        self.seq = segments[-1][0] + 1 if segments else 1
+        self.records = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._fd = self._open(self.seq)
+        self._closed = threading.Event()
+        self._flusher = None
+        if fsync_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name="journal-fsync", daemon=True)
+            self._flusher.start()
+
+    def _open(self, seq: int) -> int:
+        fd = os.open(segment_path(self.directory, seq), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        _fsync_dir(self.directory)
+        return fd
+
+    def append(self, record: tuple):
+        payload = pickle.dumps(record, protocol=5)
+        frame = _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            os.write(self._fd, frame)
+            self.records += 1
+            if self.fsync_interval > 0:
+                self._dirty = True
+            else:
+                os.fsync(self._fd)
+
+    def sync(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            fd = self._fd
+        os.fsync(fd)
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.fsync_interval):
+            try:
+                self.sync()
+            except OSError:
+                # Segment closed by rotate() between the swap and the fsync; it was synced there
+                pass
+
+    def rotate(self) -> int:
+        """Start a new segment; returns its seq (snapshots taken now cover everything before it)"""
+        with self._lock:
+            os.fsync(self._fd)
+            os.close(self._fd)
+            self.seq += 1
+            self._fd = self._open(self.seq)
+            self._dirty = False
+            self.records = 0
+            return self.seq
+
+    def prune(self, before_seq: int):
+        """Delete segments older than before_seq (already covered by a snapshot)"""
+        for seq, path in list_segments(self.directory):
+            if seq < before_seq:
+                os.remove(path)
+
+    def close(self):
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        with self._lock:
+            os.fsync(self._fd)
+            os.close(self._fd)
@@ -0,0 +1,301 @@
+"""
+LLM response cache
+
+Responses are keyed by a content hash of (model, temperature, bound options,
+normalized messages). An in-memory LRU tier answers repeated prompts within a
+process; an optional SQLite tier keeps them across restarts. Caching is opt-in
+per node via LLM_CACHE_NODES.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from langchain_core.messages import AIMessage
+
+from .agent_registry import agent_module
+
+
+def _normalize(text: str) -> str:
+    # Collapse runs of whitespace so re-pasted notes hash identically
+    return " ".join(str(text).split())
+
+
+def make_key(model: str, temperature, messages, options: dict = None) -> str:
+    """Content hash identifying an LLM request"""
+    payload = {
+        "model": model,
+        "temperature": temperature,
+        "options": options or {},
+        "messages": [(getattr(m, "type", "human"), _normalize(getattr(m, "content", m))) for m in messages],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU with per-entry TTL"""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if self.ttl and time.time() - stored_at > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, stored_at: float = None):
+        with self._lock:
+            self._data[key] = (value, stored_at or time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """On-disk tier; the oldest rows are evicted once max_entries is exceeded"""
+
+    def __init__(self, path: str, max_entries: int = 100000, ttl: float = 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_stored_at ON llm_cache (stored_at)")
+        self._conn.commit()
+        self._writes = 0
+
+    def get(self, key: str):
+        """(value, stored_at) or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT value, stored_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if self.ttl and time.time() - row[1] > self.ttl:
+            return None
+        return row
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, stored_at) VALUES (?, ?, ?)",
+                (key, value, time.time()),
+            )
+            self._writes += 1
+            # Trimming needs a COUNT, so only do it every 100 writes
+            if self._writes % 100 == 0:
+                self._trim()
+            self._conn.commit()
+
+    def _trim(self):
+        if self.ttl:
+            self._conn.execute("DELETE FROM llm_cache WHERE stored_at < ?", (time.time() - self.ttl,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY stored_at LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LLMCache:
+    """Two-tier cache (memory LRU, then optional SQLite) with hit/miss counters"""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600,
+                 sqlite_path: str = None, disk_max_entries: int = 100000):
+        self.memory = LRUCache(max_entries, ttl)
+        self.disk = SQLiteCache(sqlite_path, disk_max_entries, ttl) if sqlite_path else None
+        self._stats_lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def record_miss(self):
+        self._count("misses")
+
+    def get_memory(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+        return value
+
+    def get_disk(self, key: str) -> Optional[str]:
+        if self.disk is None:
+            return None
+        row = self.disk.get(key)
+        if row is None:
+            return None
+        # Promote to the memory tier, keeping the original timestamp for TTL
+        self.memory.set(key, row[0], stored_at=row[1])
+        self._count("disk_hits")
+        return row[0]
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.get_memory(key)
+        if value is None:
+            value = self.get_disk(key)
+        if value is None:
+            self._count("misses")
+        return value
+
+    def set(self, key: str, value: str):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+        self._count("writes")
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def snapshot(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        stats["memory_entries"] = len(self.memory)
+        stats["disk_enabled"] = self.disk is not None
+        return stats
+
+
+class CachedChatModel:
+    """
+    Chat model wrapper that serves repeated requests from an LLMCache
+
+    Only the response text is cached; hits come back as a plain AIMessage.
+    """
+
+    def __init__(self, llm, cache: LLMCache, node: str = None, options: dict = None,
+                 model: str = None, temperature=None):
+        self.llm = llm
+        self.cache = cache
+        self.node = node
+        self.options = options or {}
+        self.model_name = model or getattr(llm, "model_name", None) or type(llm).__name__
+        self.temperature = temperature if temperature is not None else getattr(llm, "temperature", None)
+
+    def bind(self, **kwargs):
+        return CachedChatModel(self.llm.bind(**kwargs), self.cache, self.node,
+                               {**self.options, **kwargs}, self.model_name, self.temperature)
+
+    def _key(self, messages) -> str:
+        return make_key(self.model_name, self.temperature, messages, self.options)
+
+    def invoke(self, messages, **kwargs) -> AIMessage:
+        key = self._key(messages)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return AIMessage(content=cached, response_metadata={"cache_hit": True})
+        response = self.llm.invoke(messages, **kwargs)
+        if response.content:
+            self.cache.set(key, response.content)
+        return response
+
+    async def ainvoke(self, messages, **kwargs) -> AIMessage:
+        key = self._key(messages)
+        cached = self.cache.get_memory(key)
+        if cached is None and self.cache.disk is not None:
+            cached = await asyncio.to_thread(self.cache.get_disk, key)
+        if cached is not None:
+            return AIMessage(content=cached, response_metadata={"cache_hit": True})
+        self.cache.record_miss()
+        response = await self.llm.ainvoke(messages, **kwargs)
+        if response.content:
+            if self.cache.disk is not None:
+                await asyncio.to_thread(self.cache.set, key, response.content)
+            else:
+                self.cache.set(key, response.content)
+        return response
+
+
+# Process-wide cache, set up by configure_from_env() at startup
+_cache: Optional[LLMCache] = None
+_wrapper = None
+
+
+def install(cache: LLMCache, nodes):
+    """Cache LLM calls made by the given nodes (see agent_module.get_llm node names)"""
+    global _cache, _wrapper
+    uninstall()
+    _cache = cache
+    _wrapper = lambda llm, node: CachedChatModel(llm, cache, node)
+    agent_module.add_llm_wrapper(_wrapper, nodes=nodes)
+
+
+def uninstall():
+    global _cache, _wrapper
+    if _wrapper is not None:
+        agent_module.remove_llm_wrapper(_wrapper)
+    if _cache is not None and _cache.disk is not None:
+        _cache.disk.close()
+    _cache, _wrapper = None, None
+
+
+def configure_from_env():
+    """
+    Install the cache if LLM_CACHE_NODES is set
+
+    LLM_CACHE_NODES: comma-separated node names, e.g.
+        "extract_entities,sentiment_analyzer,extract_all". followup_suggestor
+        is left out by default because its suggestions are meant to vary;
+        listing it pins the first response.
+    LLM_CACHE_SIZE: in-memory entries (default 1000)
+    LLM_CACHE_TTL: seconds (default 3600, 0 disables expiry)
+    LLM_CACHE_PATH: SQLite file for the persistent tier (optional)
+    LLM_CACHE_DISK_MAX_ENTRIES: rows kept on disk (default 100000)
+    """
+    nodes = [n.strip() for n in os.getenv("LLM_CACHE_NODES", "").split(",") if n.strip()]
+    if not nodes:
+        return
+    install(
+        LLMCache(
+            max_entries=int(os.getenv("LLM_CACHE_SIZE", "1000")),
+            ttl=float(os.getenv("LLM_CACHE_TTL", "3600")),
+            sqlite_path=os.getenv("LLM_CACHE_PATH") or None,
+            disk_max_entries=int(os.getenv("LLM_CACHE_DISK_MAX_ENTRIES", "100000")),
+        ),
+        nodes,
+    )
+
+
+def stats() -> dict:
+    if _cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **_cache.snapshot()}
@@ -1,11 +1,60 @@
-from fastapi import FastAPI, HTTPException
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional
-from . import schemas, crud
-from .agent_service import process_conversational_input, edit_interaction_via_agent
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+import json
+from pydantic import BaseModel, Field
+from typing import Optional, Literal
+from datetime import date, datetime, timedelta
+from . import schemas, crud, agent_registry, llm_cache, rate_limiter, bulk_import, pagination, fast_extract, sentiment, edit_parser, fake_llm, metrics, job_queue, analytics, sample_ledger, follow_ups, text_search
+from .agent_service import (
+    process_conversational_input, edit_interaction_via_agent,
+    aprocess_conversational_input, aedit_interaction_via_agent,
+    aprocess_conversational_batch, astream_conversational_input,
+)
+
+# Async mode (default): agent endpoints await the LLM with ainvoke instead of
+# holding a threadpool worker per in-flight note. Set AGENT_ASYNC_MODE=false
+# to run the synchronous pipeline on the threadpool instead.
+AGENT_ASYNC_MODE = os.getenv("AGENT_ASYNC_MODE", "true").lower() not in ("0", "false", "no")
 
-app = FastAPI(title="AI-CRM Backend (Task1)")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Compile the agent graphs and create the LLM client before serving traffic
+    # Metrics wrapper innermost so it times real LLM calls only;
+    # rate limiter next so cache hits don't consume rate-limit tokens
+    fake_llm.configure_from_env()
+    metrics.configure_from_env()
+    rate_limiter.configure_from_env()
+    llm_cache.configure_from_env()
+    fast_extract.configure_from_env()
+    sentiment.configure_from_env()
+    crud.get_backend()
+    analytics.configure_from_env()
+    sample_ledger.configure_from_env()
+    follow_ups.configure_from_env()
+    text_search.configure_from_env()
+    agent_registry.warm_up()
+    # Workers start once the agents are warm and stop before the store closes
+    job_queue.configure_from_env(_run_note_job)
+    yield
+    await job_queue.uninstall()
+    text_search.uninstall()
+    follow_ups.uninstall()
+    sample_ledger.uninstall()
+    analytics.uninstall()
+    crud.close()
+    fast_extract.uninstall()
+    sentiment.uninstall()
+    llm_cache.uninstall()
+    rate_limiter.uninstall()
+    metrics.uninstall()
+    fake_llm.uninstall()
+
+app = FastAPI(title="AI-CRM Backend (Task1)", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -15,17 +64,70 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
 @app.get("/")
 def read_root():
-    return {"message": "Backend is running!", "storage": "in-memory"}
+    return {"message": "Backend is running!", "storage": crud.backend_name()}
+
+@app.get("/api/health/ready")
+def readiness():
+    """Readiness probe: 503 until the agent graphs have been warmed up"""
+    status = agent_registry.readiness()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Request, agent node, LLM, fallback, cache and store metrics in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/llm/cache")
+def llm_cache_stats():
+    """Hit/miss counters of the LLM response cache"""
+    return llm_cache.stats()
+
+@app.get("/api/agent/fast-path")
+def fast_path_stats():
+    """Hit rate and estimated latency saved by the rule-based pre-extractor"""
+    return fast_extract.stats()
+
+@app.get("/api/agent/edits")
+def edit_stats():
+    """How many natural-language edits the rules applied, and the LLM prompt size for the rest"""
+    return edit_parser.stats()
+
+@app.get("/api/agent/sentiment")
+def sentiment_stats():
+    """Active sentiment backend and how many summaries it labelled without the LLM"""
+    return sentiment.stats()
+
+class SentimentBatch(BaseModel):
+    texts: list[str] = Field(max_length=10000)
+
+@app.post("/api/sentiment/score")
+def score_sentiment(batch: SentimentBatch):
+    """Label many texts with the local classifier in one vectorized pass (no LLM)"""
+    return {"results": sentiment.score_batch(batch.texts)}
 
 # HCP endpoints
 @app.post("/api/hcps", response_model=schemas.HCP)
 def create_hcp(hcp_in: schemas.HCPCreate):
     return crud.create_hcp(hcp_in)
 
-@app.get("/api/hcps/search", response_model=list[schemas.HCP])
+@app.get("/api/hcps", response_model=schemas.HCPPage)
+def list_hcps(
+    speciality: Optional[str] = None,
+    organisation: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+):
+    """HCPs in name order; pass next_cursor back as cursor for the following page"""
+    try:
+        return crud.list_hcps(speciality=speciality, organisation=organisation, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/hcps/search", response_model=list[schemas.HCPSearchResult])
 def search_hcp(q: str):
     results = crud.search_hcp_by_name(q)
     return results
@@ -43,6 +145,108 @@ def create_interaction(inter_in: schemas.InteractionCreate):
     inter = crud.create_interaction(inter_in)
     return inter
 
+@app.get("/api/interactions", response_model=schemas.InteractionPage)
+def list_interactions(
+    hcp_id: Optional[str] = None,
+    rep_id: Optional[str] = None,
+    sentiment: Optional[schemas.Sentiment] = None,
+    mode: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    order: Literal["desc", "asc"] = "desc",
+    cursor: Optional[str] = None,
+    limit: int = Query(default=pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+):
+    """
+    Interactions ordered by datetime (or created_at when unset), newest first by default
+
+    Keyset-paginated: pass next_cursor back as cursor, keeping the same filters
+    and order.
+    """
+    try:
+        return crud.list_interactions(
+            hcp_id=hcp_id, rep_id=rep_id, sentiment=sentiment.value if sentiment else None, mode=mode,
+            date_from=date_from, date_to=date_to, cursor=cursor, limit=limit, descending=order == "desc",
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/interactions/import")
+async def import_interactions(request: Request, chunk_size: Optional[int] = Query(default=None, ge=1, le=100000)):
+    """
+    Bulk import InteractionCreate records sent as NDJSON or a JSON array
+
+    NDJSON bodies (Content-Type application/x-ndjson) are streamed, so the
+    whole file never has to fit in memory. Each chunk is validated and then
+    written with one insert per table; invalid rows are listed in "errors"
+    by record index.
+    """
+    chunk_size = chunk_size or bulk_import.IMPORT_CHUNK_SIZE
+    report = bulk_import.ImportReport()
+    content_type = request.headers.get("content-type", "")
+
+    if "ndjson" in content_type or "jsonl" in content_type:
+        records = bulk_import.aiter_ndjson(request.stream())
+    else:
+        body = await request.body()
+        if body.lstrip()[:1] == b"[":
+            records = _aiter(bulk_import.iter_json_array(body))
+        else:
+            records = bulk_import.aiter_ndjson(_aiter([body]))
+
+    chunk = []
+    async for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            await run_in_threadpool(bulk_import.import_chunk, chunk, report)
+            chunk = []
+    if chunk or not report.chunks:
+        await run_in_threadpool(bulk_import.import_chunk, chunk, report)
+    return report.to_dict()
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+def _search_index():
+    index = text_search.get_index()
+    if index is None:
+        raise HTTPException(status_code=503, detail="Search is disabled (SEARCH_INDEX_ENABLED=false)")
+    return index
+
+@app.get("/api/interactions/search")
+def search_interactions(
+    q: str = Query(min_length=1),
+    hcp_id: Optional[str] = None,
+    rep_id: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=20, ge=1, le=100),
+):
+    """
+    Interactions whose summary, outcome or raw note match q, best match first (BM25)
+
+    e.g. ?q=dosing concerns&rep_id=... Keyset-paginated: pass next_cursor
+    back as cursor with the same query and filters.
+    """
+    try:
+        page = _search_index().search(q, hcp_id=hcp_id, rep_id=rep_id, date_from=date_from, date_to=date_to,
+                                      cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    items = []
+    for hit in page["items"]:
+        inter = crud.get_interaction(hit["id"])
+        if inter:
+            items.append({"score": hit["score"], "interaction": inter})
+    return {"items": items, "total": page["total"], "next_cursor": page["next_cursor"]}
+
+@app.get("/api/interactions/search/stats")
+def search_index_stats():
+    """Indexed documents, terms, postings, array memory and the last save and catch-up"""
+    return text_search.stats()
+
 @app.get("/api/interactions/{interaction_id}", response_model=schemas.Interaction)
 def get_interaction(interaction_id: str):
     inter = crud.get_interaction(interaction_id)
@@ -52,32 +256,270 @@ def get_interaction(interaction_id: str):
 
 @app.patch("/api/interactions/{interaction_id}", response_model=schemas.Interaction)
 def patch_interaction(interaction_id: str, patch: dict):
-    updated = crud.update_interaction(interaction_id, patch)
+    try:
+        updated = crud.update_interaction(interaction_id, patch)
+    except ValueError as e:
+        # Malformed column value or child-table patch (pydantic's ValidationError is a ValueError)
+        raise HTTPException(status_code=400, detail=str(e))
     if not updated:
         raise HTTPException(status_code=404, detail="Interaction not found")
     return updated
 
+# Analytics endpoints (answered from rollups, see analytics.py)
+AnalyticsScope = Literal["all", "hcp", "rep"]
+Granularity = Literal["day", "week"]
+
+def _rollups():
+    rollups = analytics.get_rollups()
+    if rollups is None:
+        raise HTTPException(status_code=503, detail="Analytics are disabled (ANALYTICS_ENABLED=false)")
+    return rollups
+
+def _analytics_range(scope: str, scope_id: Optional[str], granularity: str,
+                     date_from: Optional[date], date_to: Optional[date]):
+    if scope != "all" and not scope_id:
+        raise HTTPException(status_code=400, detail=f"scope_id is required for scope={scope}")
+    start, end = analytics.default_range(granularity, date_to)
+    return scope_id if scope != "all" else "", date_from or start, end
+
+@app.get("/api/analytics/trend")
+def analytics_trend(scope: AnalyticsScope = "all", scope_id: Optional[str] = None, granularity: Granularity = "day",
+                    date_from: Optional[date] = None, date_to: Optional[date] = None):
+    """
+    Interactions, sentiment counts, sample and material units and follow-ups per bucket
+
+    e.g. ?scope=hcp&scope_id=...&granularity=week for an HCP's weekly
+    sentiment trend. Defaults to the last 30 days (12 weeks).
+    """
+    rollups = _rollups()
+    scope_id, start, end = _analytics_range(scope, scope_id, granularity, date_from, date_to)
+    try:
+        buckets = rollups.trend(scope, scope_id, granularity, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"scope": scope, "scope_id": scope_id or None, "granularity": granularity, "buckets": buckets}
+
+@app.get("/api/analytics/topics")
+def analytics_topics(scope: AnalyticsScope = "all", scope_id: Optional[str] = None, granularity: Granularity = "week",
+                     date_from: Optional[date] = None, date_to: Optional[date] = None,
+                     limit: int = Query(10, ge=1, le=100)):
+    """Most discussed topics over a range, e.g. ?date_from=<Monday> for this week's top topics"""
+    rollups = _rollups()
+    scope_id, start, end = _analytics_range(scope, scope_id, granularity, date_from, date_to)
+    try:
+        topics = rollups.top_topics(scope, scope_id, granularity, start, end, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"scope": scope, "scope_id": scope_id or None, "date_from": start, "date_to": end, "topics": topics}
+
+@app.get("/api/analytics/breakdown")
+def analytics_breakdown(scope: Literal["hcp", "rep"] = "rep", granularity: Granularity = "day",
+                        day: Optional[date] = None, limit: int = Query(50, ge=1, le=1000)):
+    """Per-rep (or per-HCP) totals for the day or week containing `day` (default today), busiest first"""
+    day = day or datetime.utcnow().date()
+    return {"scope": scope, "granularity": granularity, "bucket": analytics.bucket_start(day, granularity),
+            "items": _rollups().breakdown(scope, granularity, day, limit)}
+
+# Sample ledger endpoints (see sample_ledger.py)
+def _sample_ledger():
+    ledger = sample_ledger.get_ledger()
+    if ledger is None:
+        raise HTTPException(status_code=503, detail="Sample ledger is disabled (SAMPLE_LEDGER_ENABLED=false)")
+    return ledger
+
+@app.get("/api/samples/ledger")
+def sample_ledger_totals(date_from: date, date_to: date, rep_id: Optional[str] = None,
+                         product_code: Optional[str] = None, lot: Optional[str] = None,
+                         group_by: Literal["none", "day", "month", "quarter"] = "none"):
+    """
+    Sample units and rows distributed over a date range (inclusive)
+
+    Omitted rep_id, product_code or lot match any value; lot (which needs a
+    product_code) "" matches samples recorded without a lot. group_by splits
+    the totals into periods.
+    """
+    try:
+        return _sample_ledger().query(rep_id, product_code, lot, date_from, date_to, group_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/samples/ledger/reconcile")
+def reconcile_sample_ledger(repair: bool = False):
+    """Recount every sample row and compare with the ledger; repair=true corrects any differences"""
+    return _sample_ledger().reconcile(crud.iter_interactions, repair=repair)
+
+@app.get("/api/samples/ledger/stats")
+def sample_ledger_stats():
+    """Ledger keys, updates applied and the last reconciliation result"""
+    return sample_ledger.stats()
+
+# Follow-up endpoints (answered from the due-date index, see follow_ups.py)
+class FollowUpStatusInput(BaseModel):
+    status: Literal["open", "done", "cancelled"]
+
+def _follow_up_index():
+    index = follow_ups.get_index()
+    if index is None:
+        raise HTTPException(status_code=503, detail="Follow-up index is disabled (FOLLOW_UP_INDEX_ENABLED=false)")
+    return index
+
+@app.get("/api/follow-ups/due")
+def follow_ups_due(owner: Optional[str] = None, days: float = Query(7, gt=0, le=366), cursor: Optional[str] = None,
+                   limit: int = Query(default=pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE)):
+    """
+    Pending follow-ups due within the next `days` days, soonest first
+
+    owner is a rep id (follow-ups without an owner belong to their
+    interaction's rep); omit it for everyone. Keyset-paginated: pass
+    next_cursor back as cursor with the same filters.
+    """
+    try:
+        return _follow_up_index().due_soon(owner, timedelta(days=days), cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/follow-ups/overdue")
+def follow_ups_overdue(owner: Optional[str] = None, cursor: Optional[str] = None,
+                       limit: int = Query(default=pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE)):
+    """Pending follow-ups past their due date, longest overdue first"""
+    try:
+        return _follow_up_index().overdue(owner, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/follow-ups/{follow_up_id}/status", response_model=schemas.FollowUp)
+def set_follow_up_status(follow_up_id: str, body: FollowUpStatusInput):
+    """Complete, cancel or reopen a follow-up (open -> done|cancelled, done|cancelled -> open)"""
+    _follow_up_index()
+    try:
+        updated = follow_ups.transition(follow_up_id, body.status)
+    except follow_ups.InvalidTransition as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not updated:
+        raise HTTPException(status_code=404, detail="Follow-up not found")
+    return updated
+
+@app.get("/api/follow-ups/reminders")
+def follow_up_reminders(owner: Optional[str] = None, limit: int = Query(100, ge=1, le=1000)):
+    """Most recently sent reminders, newest first"""
+    scheduler = follow_ups.get_scheduler()
+    if scheduler is None:
+        raise HTTPException(status_code=503, detail="Follow-up reminders are disabled (FOLLOW_UP_REMINDERS_ENABLED=false)")
+    return {"items": scheduler.reminders(owner, limit)}
+
+@app.get("/api/follow-ups/stats")
+def follow_up_stats():
+    """Indexed follow-ups, owners, updates applied and reminder scheduler counters"""
+    return follow_ups.stats()
+
 # AI Agent endpoints
 class ConversationalInput(BaseModel):
     text: str
     rep_id: Optional[str] = "default_rep"
+    # "sequential" (three LLM calls), "single_call" or "parallel"; defaults to AGENT_MODE
+    mode: Optional[Literal["sequential", "single_call", "parallel"]] = None
+
+class ConversationalBatchInput(BaseModel):
+    notes: list[ConversationalInput]
+    # Notes run through the agent at once; defaults to BATCH_MAX_CONCURRENCY
+    max_concurrency: Optional[int] = Field(default=None, ge=1, le=256)
+    # Graph mode for notes that don't set their own
+    mode: Optional[Literal["sequential", "single_call", "parallel"]] = None
 
 class EditRequest(BaseModel):
     edit_request: str
     rep_id: Optional[str] = "default_rep"
 
+class ConversationalJobInput(ConversationalInput):
+    # Queued jobs are picked high first, then normal, then low
+    priority: Literal["high", "normal", "low"] = "normal"
+
+async def _process_note(text: str, rep_id: str, mode: Optional[str], on_saved=None) -> dict:
+    if AGENT_ASYNC_MODE:
+        return await aprocess_conversational_input(text, rep_id, mode, on_saved)
+    return await run_in_threadpool(process_conversational_input, text, rep_id, mode, on_saved)
+
+async def _run_note_job(payload: dict, on_saved) -> dict:
+    return await _process_note(payload["text"], payload["rep_id"], payload["mode"], on_saved)
+
 @app.post("/api/agent/conversational")
-def process_conversation(input_data: ConversationalInput):
+async def process_conversation(input_data: ConversationalInput):
     """Process conversational input through LangGraph agent"""
-    result = process_conversational_input(input_data.text, input_data.rep_id)
+    result = await _process_note(input_data.text, input_data.rep_id, input_data.mode)
+    if not result.get("success"):
+        raise HTTPException(status_code=400, detail=result.get("error", "Processing failed"))
+    return result
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+@app.post("/api/agent/conversational/stream")
+async def stream_conversation(input_data: ConversationalInput):
+    """
+    Server-sent events variant of /api/agent/conversational
+
+    Emits "node" as each graph node finishes, "token" for the response text,
+    and "done" with the persisted interaction (or "error").
+    """
+    async def events():
+        async for event, data in astream_conversational_input(input_data.text, input_data.rep_id, input_data.mode):
+            yield _sse(event, data)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/api/agent/conversational/jobs", status_code=202)
+async def submit_conversation_job(input_data: ConversationalJobInput):
+    """
+    Queue a note for background processing and return its job id at once
+
+    Poll GET /api/agent/jobs/{job_id} for the status and result. 503 when
+    the queue is full (retry after the Retry-After seconds) or disabled.
+    Async so submit() runs on the event loop that owns the queue.
+    """
+    queue = job_queue.get_queue()
+    if queue is None:
+        raise HTTPException(status_code=503, detail="Job queue is disabled (JOB_WORKERS=0)")
+    payload = {"text": input_data.text, "rep_id": input_data.rep_id, "mode": input_data.mode}
+    try:
+        job = queue.submit(payload, input_data.priority)
+    except job_queue.QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    status_url = f"/api/agent/jobs/{job['id']}"
+    return JSONResponse(
+        status_code=202, headers={"Location": status_url},
+        content={"job_id": job["id"], "status": job["status"], "priority": job["priority"], "status_url": status_url},
+    )
+
+@app.get("/api/agent/jobs/{job_id}")
+def get_conversation_job(job_id: str):
+    """Status of a queued note; "result" holds the agent response once the note's interaction is saved"""
+    queue = job_queue.get_queue()
+    job = queue.get(job_id) if queue is not None else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/api/agent/queue")
+def job_queue_stats():
+    """Waiting and running jobs, and totals submitted, retried, rejected and finished"""
+    return job_queue.stats()
+
+@app.post("/api/agent/conversational/batch")
+async def process_conversation_batch(batch: ConversationalBatchInput):
+    """Process many notes concurrently; per-note failures are reported, not raised"""
+    result = await aprocess_conversational_batch(batch.notes, batch.max_concurrency, batch.mode)
     if not result.get("success"):
         raise HTTPException(status_code=400, detail=result.get("error", "Processing failed"))
     return result
 
 @app.post("/api/agent/edit/{interaction_id}")
-def edit_interaction_agent(interaction_id: str, request: EditRequest):
+async def edit_interaction_agent(interaction_id: str, request: EditRequest):
     """Edit interaction using natural language"""
-    result = edit_interaction_via_agent(interaction_id, request.edit_request)
+    if AGENT_ASYNC_MODE:
+        result = await aedit_interaction_via_agent(interaction_id, request.edit_request)
+    else:
+        result = await run_in_threadpool(edit_interaction_via_agent, interaction_id, request.edit_request)
     if not result.get("success"):
         raise HTTPException(status_code=400, detail=result.get("error", "Edit failed"))
     return result
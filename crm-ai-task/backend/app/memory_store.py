@@ -0,0 +1,597 @@
+"""
+In-memory storage backend (module-level dicts); the default for crud
+
+Safe to call from many threads (the sync routes run on Starlette's
+threadpool):
+- Stored rows are never mutated once published. update_interaction builds
+  a new record and swaps it in, and an interaction carries its children, so
+  it is published whole. Readers therefore take no locks and never see a
+  half-built or half-updated interaction.
+- Writers to the same interaction are serialized by a lock stripe chosen by
+  id. Shared secondary indexes are updated under a short index lock. The
+  HCP name index also takes a lock for searches, since it mutates sets in
+  place.
+
+Rows are compact slotted records (see records.py) and are converted to
+dicts only on the way out.
+
+With JOURNAL_DIR set, every write is also appended to a journal (see
+journal.py) and the store is rebuilt from the latest snapshot plus the
+journal tail on startup.
+"""
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+from . import journal, schemas
+from .name_index import NameIndex
+from .pagination import to_naive_utc
+from .records import FollowUpRecord, HCPRecord, InteractionRecord, MaterialRecord, SampleRecord, intern
+from .sorted_index import SortedIndex
+from dataclasses import replace
+from datetime import datetime
+from typing import List, Optional
+import uuid
+
+NAME = "memory"
+
+logger = logging.getLogger(__name__)
+
+# In-memory storage: id -> HCPRecord / InteractionRecord (children included)
+_hcps = {}
+_interactions = {}
+
+# Columns update_interaction may set directly. Children change through
+# MaterialsPatch/SamplesPatch/FollowUpsPatch (add, update, remove or replace),
+# applied by _patch_children.
+_UPDATABLE = frozenset(InteractionRecord.__slots__) - {"id", "created_at", "updated_at", "materials", "samples", "follow_ups"}
+
+# Secondary indexes, kept in sync by create_interaction/update_interaction
+# hcp_id / rep_id -> {interaction_id: None} (dict used as an ordered set)
+_interactions_by_hcp = {}
+_interactions_by_rep = {}
+# HCP name search (prefix + trigram), kept in sync by create_hcp
+_hcp_name_index = NameIndex()
+# Keyset pagination: sorted (timestamp, id) keys overall and per hcp/rep,
+# and (name, id) keys for HCPs
+_interaction_keys = SortedIndex()
+_interaction_keys_by_hcp = {}
+_interaction_keys_by_rep = {}
+_hcp_keys = SortedIndex()
+
+# Writes hold their id's stripe across journal append + apply, so per-row
+# journal order is the order changes were applied in. Snapshots and resets
+# hold every stripe.
+LOCK_STRIPES = int(os.getenv("STORE_LOCK_STRIPES", "64"))
+_stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+# Guards the shared indexes above (by hcp/rep, sorted keys, HCP keys)
+_index_lock = threading.Lock()
+_hcp_name_lock = threading.Lock()
+
+_journal = None
+_snapshot_every = 0
+_snapshot_thread = None
+
+def _stripe(key: str) -> threading.Lock:
+    return _stripes[hash(key) % len(_stripes)]
+
+@contextmanager
+def _all_stripes():
+    # Always acquired in the same order, and writers hold at most one stripe
+    for lock in _stripes:
+        lock.acquire()
+    try:
+        yield
+    finally:
+        for lock in reversed(_stripes):
+            lock.release()
+
+def reset_store():
+    """Clear all in-memory data and indexes"""
+    with _all_stripes():
+        _log(("reset",))
+        _clear()
+    _maybe_snapshot()
+
+def _clear():
+    with _index_lock, _hcp_name_lock:
+        for table in (_hcps, _interactions, _interactions_by_hcp, _interactions_by_rep,
+                      _interaction_keys_by_hcp, _interaction_keys_by_rep):
+            table.clear()
+        _hcp_name_index.clear()
+        _interaction_keys.clear()
+        _hcp_keys.clear()
+
+def _index_add(index: dict, key, interaction_id: str):
+    if key is not None:
+        index.setdefault(key, {})[interaction_id] = None
+
+def _index_remove(index: dict, key, interaction_id: str):
+    ids = index.get(key)
+    if ids is not None:
+        ids.pop(interaction_id, None)
+        if not ids:
+            del index[key]
+
+def _interaction_key(inter: InteractionRecord):
+    # Same key as pagination.interaction_key, read from a record
+    return to_naive_utc(inter.datetime or inter.created_at), inter.id
+
+def _hcp_key(hcp: HCPRecord):
+    return hcp.name, hcp.id
+
+def _add_sort_keys(inter: InteractionRecord):
+    key = _interaction_key(inter)
+    _interaction_keys.add(key)
+    for index, partition in ((_interaction_keys_by_hcp, inter.hcp_id), (_interaction_keys_by_rep, inter.rep_id)):
+        if partition is not None:
+            index.setdefault(partition, SortedIndex()).add(key)
+
+def _remove_sort_keys(key, hcp_id, rep_id):
+    _interaction_keys.remove(key)
+    for index, partition in ((_interaction_keys_by_hcp, hcp_id), (_interaction_keys_by_rep, rep_id)):
+        keys = index.get(partition)
+        if keys is not None:
+            keys.remove(key)
+            if not keys:
+                del index[partition]
+
+def _key_range(after, lo, hi, descending: bool):
+    """Combine the cursor (exclusive) with the inclusive range bounds"""
+    inclusive = [True, True]
+    if after is not None:
+        if descending and (hi is None or after <= hi):
+            hi, inclusive[1] = after, False
+        elif not descending and (lo is None or after >= lo):
+            lo, inclusive[0] = after, False
+    return lo, hi, tuple(inclusive)
+
+# HCP CRUD
+def get_hcp_by_id(hcp_id: str):
+    hcp = _hcps.get(hcp_id)
+    return hcp.to_dict() if hcp else None
+
+def search_hcp_by_name(name: str, limit: int = 10, min_score: float = 0.0):
+    """Ranked name search; each result is a copy of the HCP with a relevance "score" (0-1)"""
+    with _hcp_name_lock:
+        matches = _hcp_name_index.search(name, limit=limit, min_score=min_score)
+    return [{**_hcps[hcp_id].to_dict(), "score": score} for hcp_id, score in matches if hcp_id in _hcps]
+
+def _build_hcp(hcp_in: schemas.HCPCreate, now: datetime) -> HCPRecord:
+    return HCPRecord(
+        id=str(uuid.uuid4()),
+        name=hcp_in.name,
+        title=hcp_in.title,
+        speciality=hcp_in.speciality,
+        organisation=hcp_in.organisation,
+        contact=hcp_in.contact,
+        created_at=now,
+        updated_at=now
+    ).intern_fields()
+
+def _store_hcps(hcps: List[HCPRecord]):
+    for hcp in hcps:
+        _hcps[hcp.id] = hcp
+    with _hcp_name_lock:
+        for hcp in hcps:
+            _hcp_name_index.add(hcp.id, hcp.name)
+    with _index_lock:
+        for hcp in hcps:
+            _hcp_keys.add(_hcp_key(hcp))
+
+def create_hcp(hcp_in: schemas.HCPCreate):
+    return bulk_create_hcps([hcp_in])[0]
+
+def bulk_create_hcps(hcps_in: List[schemas.HCPCreate]):
+    now = datetime.utcnow()
+    hcps = [_build_hcp(h, now) for h in hcps_in]
+    if not hcps:
+        return []
+    with _stripe(hcps[0].id):
+        _log(("hcps", hcps))
+        _store_hcps(hcps)
+    _maybe_snapshot()
+    return [hcp.to_dict() for hcp in hcps]
+
+def list_hcps(speciality: Optional[str] = None, organisation: Optional[str] = None,
+              after: Optional[tuple] = None, limit: int = 50):
+    """HCPs in name order, starting after the `after` key"""
+    speciality = speciality.casefold() if speciality else None
+    organisation = organisation.casefold() if organisation else None
+    results = []
+    for _, hcp_id in _hcp_keys.irange(lo=after, inclusive=(False, True)):
+        hcp = _hcps.get(hcp_id)
+        if hcp is None:
+            continue
+        if speciality and (hcp.speciality or "").casefold() != speciality:
+            continue
+        if organisation and (hcp.organisation or "").casefold() != organisation:
+            continue
+        results.append(hcp.to_dict())
+        if len(results) >= limit:
+            break
+    return results
+
+# Interaction CRUD
+def get_interaction(interaction_id: str):
+    # Lock-free: the stored record is replaced, never mutated, by updates
+    inter = _interactions.get(interaction_id)
+    if not inter:
+        return None
+    return inter.to_dict()
+
+def _get_many(ids) -> List[dict]:
+    # list() copies the id set in one step, so concurrent inserts can't break the iteration
+    return [inter for inter in map(get_interaction, list(ids)) if inter is not None]
+
+def get_interactions_by_hcp(hcp_id: str):
+    return _get_many(_interactions_by_hcp.get(hcp_id, ()))
+
+def get_interactions_by_rep(rep_id: str):
+    return _get_many(_interactions_by_rep.get(rep_id, ()))
+
+def list_interactions(hcp_id: Optional[str] = None, rep_id: Optional[str] = None,
+                      sentiment: Optional[str] = None, mode: Optional[str] = None,
+                      date_from: Optional[datetime] = None, date_to: Optional[datetime] = None,
+                      after: Optional[tuple] = None, limit: int = 50, descending: bool = True):
+    """
+    One page of interactions in (timestamp, id) order, starting after the `after` key
+
+    Scans the most selective sorted index (hcp, then rep, then all), seeking
+    straight to the cursor; sentiment and mode are checked per row.
+    """
+    if hcp_id is not None:
+        keys = _interaction_keys_by_hcp.get(hcp_id)
+    elif rep_id is not None:
+        keys = _interaction_keys_by_rep.get(rep_id)
+    else:
+        keys = _interaction_keys
+    if keys is None:
+        return []
+
+    lo = (date_from, "") if date_from else None
+    hi = (date_to, "\uffff") if date_to else None
+    lo, hi, inclusive = _key_range(after, lo, hi, descending)
+
+    results = []
+    for _, interaction_id in keys.irange(lo, hi, inclusive, reverse=descending):
+        inter = _interactions.get(interaction_id)
+        if inter is None:
+            continue
+        if rep_id is not None and inter.rep_id != rep_id:
+            continue
+        if sentiment is not None and inter.sentiment != sentiment:
+            continue
+        if mode is not None and inter.mode != mode:
+            continue
+        results.append(inter.to_dict())
+        if len(results) >= limit:
+            break
+    return results
+
+def _material_record(interaction_id: str, m: schemas.MaterialSharedCreate) -> MaterialRecord:
+    return MaterialRecord(
+        id=str(uuid.uuid4()),
+        interaction_id=interaction_id,
+        material_type=m.material_type,
+        quantity=m.quantity,
+        notes=m.notes
+    )
+
+def _sample_record(interaction_id: str, s: schemas.SampleCreate) -> SampleRecord:
+    return SampleRecord(
+        id=str(uuid.uuid4()),
+        interaction_id=interaction_id,
+        product_code=s.product_code,
+        quantity=s.quantity,
+        lot=s.lot
+    )
+
+def _follow_up_record(interaction_id: str, f: schemas.FollowUpCreate) -> FollowUpRecord:
+    return FollowUpRecord(
+        id=str(uuid.uuid4()),
+        interaction_id=interaction_id,
+        due_date=f.due_date,
+        action_item=f.action_item,
+        owner=f.owner,
+        status=f.status or "open"
+    )
+
+# Child table -> record builder
+_CHILD_BUILDERS = {
+    "materials": _material_record,
+    "samples": _sample_record,
+    "follow_ups": _follow_up_record,
+}
+
+def _build_interaction(interaction_in: schemas.InteractionCreate, now: datetime) -> InteractionRecord:
+    """Record for one interaction and its children (nothing is stored yet)"""
+    interaction_id = str(uuid.uuid4())
+    materials = tuple(_material_record(interaction_id, m) for m in interaction_in.materials or [])
+    samples = tuple(_sample_record(interaction_id, s) for s in interaction_in.samples or [])
+    follow_ups = tuple(_follow_up_record(interaction_id, f) for f in interaction_in.follow_ups or [])
+    return InteractionRecord(
+        id=interaction_id,
+        hcp_id=interaction_in.hcp_id,
+        rep_id=interaction_in.rep_id,
+        mode=interaction_in.mode or "conversational",
+        datetime=interaction_in.datetime,
+        summary=interaction_in.summary,
+        sentiment=interaction_in.sentiment.value if interaction_in.sentiment else None,
+        topics=interaction_in.topics,
+        outcome=interaction_in.outcome,
+        source_raw=interaction_in.source_raw,
+        created_at=now,
+        updated_at=now,
+        materials=materials,
+        samples=samples,
+        follow_ups=follow_ups
+    ).intern_fields()
+
+def create_interaction(interaction_in: schemas.InteractionCreate):
+    return bulk_create_interactions([interaction_in])[0]
+
+def bulk_create_interactions(interactions_in: List[schemas.InteractionCreate]):
+    """Build every record first, then write the table with a single update"""
+    now = datetime.utcnow()
+    created = [_build_interaction(i, now) for i in interactions_in]
+    if not created:
+        return []
+    # The ids are new, so any stripe will do; holding one keeps snapshots consistent
+    with _stripe(created[0].id):
+        _log(("interactions", created))
+        _store_interactions(created)
+    _maybe_snapshot()
+    return [inter.to_dict() for inter in created]
+
+def _store_interactions(created: List[InteractionRecord]):
+    _interactions.update((inter.id, inter) for inter in created)
+    with _index_lock:
+        for inter in created:
+            _index_add(_interactions_by_hcp, inter.hcp_id, inter.id)
+            _index_add(_interactions_by_rep, inter.rep_id, inter.id)
+            _add_sort_keys(inter)
+
+def update_interaction(interaction_id: str, patch: dict):
+    with _stripe(interaction_id):
+        inter = _interactions.get(interaction_id)
+        if not inter:
+            return None
+        changes = {k: v for k, v in patch.items() if k in _UPDATABLE}
+        for name, build in _CHILD_BUILDERS.items():
+            if patch.get(name) is not None:
+                changes[name] = _patch_children(inter, name, patch[name], build)
+        if "datetime" in changes:
+            changes["datetime"] = to_naive_utc(changes["datetime"])
+        now = datetime.utcnow()
+        # Build and key the new record before journaling, so a patch that
+        # fails here is rejected without ever reaching replay
+        patched = _patch_record(inter, changes, now)
+        _log(("update", interaction_id, changes, now))
+        _publish_update(inter, *patched)
+    _maybe_snapshot()
+
+    # Return with related data
+    return get_interaction(interaction_id)
+
+def _patch_children(inter: InteractionRecord, name: str, child_patch, build) -> tuple:
+    """
+    The child rows `name` holds after applying a MaterialsPatch/SamplesPatch/FollowUpsPatch
+
+    New ids are assigned here, before the change is journaled, so replay
+    reproduces the same rows.
+    """
+    removed = set(child_patch.remove)
+    updates = {u.id: u.model_dump(exclude_unset=True, exclude={"id"}) for u in child_patch.update}
+    rows = []
+    for row in () if child_patch.replace else getattr(inter, name):
+        if row.id in removed:
+            continue
+        if updates.get(row.id):
+            row = replace(row, **updates[row.id])
+        rows.append(row)
+    rows.extend(build(inter.id, item) for item in child_patch.add)
+    return tuple(rows)
+
+def _patch_record(old: InteractionRecord, changes: dict, now: datetime):
+    """
+    A patched copy of `old` (copy-on-write) plus its old and new sort keys
+
+    Nothing is published, so a patch that raises here (e.g. a datetime that
+    cannot be read) leaves the row and the indexes untouched.
+    """
+    inter = replace(old, **changes, updated_at=now)
+    for name in InteractionRecord.INTERNED:
+        if name in changes:
+            setattr(inter, name, intern(changes[name]))
+    if "topics" in changes and inter.topics is not None:
+        inter.topics = tuple(map(intern, inter.topics))
+    for name in _CHILD_BUILDERS:
+        if name in changes:
+            for child in changes[name]:
+                child.intern_fields()
+    return inter, _interaction_key(old), _interaction_key(inter)
+
+def _publish_update(old: InteractionRecord, inter: InteractionRecord, old_key, new_key):
+    """Swap in the record from _patch_record and move its index entries"""
+    interaction_id = old.id
+    with _index_lock:
+        _interactions[interaction_id] = inter
+        if inter.hcp_id != old.hcp_id:
+            _index_remove(_interactions_by_hcp, old.hcp_id, interaction_id)
+            _index_add(_interactions_by_hcp, inter.hcp_id, interaction_id)
+        if inter.rep_id != old.rep_id:
+            _index_remove(_interactions_by_rep, old.rep_id, interaction_id)
+            _index_add(_interactions_by_rep, inter.rep_id, interaction_id)
+        if (old.hcp_id, old.rep_id, old_key) != (inter.hcp_id, inter.rep_id, new_key):
+            _remove_sort_keys(old_key, old.hcp_id, old.rep_id)
+            _add_sort_keys(inter)
+
+# Journal and snapshots
+
+def _log(record: tuple):
+    if _journal is not None:
+        _journal.append(record)
+
+def _maybe_snapshot():
+    # Called after the write is applied, so the snapshot copy includes it
+    if _journal is not None and _snapshot_every and _journal.records >= _snapshot_every:
+        snapshot(wait=False)
+
+def _replay(record: tuple):
+    """
+    Apply a journal record; creates already present in the snapshot are skipped
+
+    Unpickled strings are fresh copies, so records are interned again.
+    """
+    kind = record[0]
+    if kind == "hcps":
+        _store_hcps([h.intern_fields() for h in record[1] if h.id not in _hcps])
+    elif kind == "interactions":
+        _store_interactions([i.intern_fields() for i in record[1] if i.id not in _interactions])
+    elif kind == "update":
+        _, interaction_id, changes, now = record
+        inter = _interactions.get(interaction_id)
+        if inter is not None:
+            _publish_update(inter, *_patch_record(inter, changes, now))
+    elif kind == "reset":
+        _clear()
+
+def _load_tables(tables: dict):
+    """Install snapshot tables and rebuild every index from them"""
+    _clear()
+    _hcps.update(tables["hcps"])
+    _interactions.update(tables["interactions"])
+
+    for hcp_id, hcp in _hcps.items():
+        _hcp_name_index.add(hcp_id, hcp.name)
+    _hcp_keys.update(_hcp_key(h) for h in _hcps.values())
+
+    keys_by_hcp, keys_by_rep = {}, {}
+    all_keys = []
+    for interaction_id, inter in _interactions.items():
+        key = _interaction_key(inter)
+        all_keys.append(key)
+        for index, keys, partition in ((_interactions_by_hcp, keys_by_hcp, inter.hcp_id),
+                                       (_interactions_by_rep, keys_by_rep, inter.rep_id)):
+            if partition is not None:
+                index.setdefault(partition, {})[interaction_id] = None
+                keys.setdefault(partition, []).append(key)
+    _interaction_keys.update(all_keys)
+    for index, keys in ((_interaction_keys_by_hcp, keys_by_hcp), (_interaction_keys_by_rep, keys_by_rep)):
+        for partition, partition_keys in keys.items():
+            index[partition] = SortedIndex()
+            index[partition].update(partition_keys)
+
+def open_journal(directory: str, fsync_interval: float = 0.05, snapshot_every: int = 100000):
+    """
+    Make the store durable: recover from `directory`, then journal every write
+
+    Args:
+        directory: Holds snapshot.pkl and the journal segments (created if missing)
+        fsync_interval: Seconds between group fsyncs; 0 fsyncs every write
+        snapshot_every: Journal records between automatic snapshots (0 = only on close)
+    """
+    global _journal, _snapshot_every
+    os.makedirs(directory, exist_ok=True)
+    close_journal(snapshot_first=False)
+    with _all_stripes(), journal.gc_paused():
+        _clear()
+        state = journal.read_snapshot(directory)
+        first_seq = 0
+        if state is not None:
+            _load_tables(state["tables"])
+            first_seq = state["segment"]
+        replayed = skipped = 0
+        for seq, path in journal.list_segments(directory):
+            if seq >= first_seq:
+                for record in journal.read_records(path):
+                    try:
+                        _replay(record)
+                        replayed += 1
+                    except Exception:
+                        # One bad record must not keep the store from opening
+                        logger.exception("Skipping journal record %r in %s", record[:2], path)
+                        skipped += 1
+        logger.info("Recovered %d interactions (%d journal records replayed, %d skipped)",
+                    len(_interactions), replayed, skipped)
+        _journal = journal.Journal(directory, fsync_interval)
+        _snapshot_every = snapshot_every
+
+def snapshot(wait: bool = True):
+    """
+    Write a snapshot and drop the journal segments it covers
+
+    Tables are shallow-copied while holding every stripe (a short pause) and
+    pickled in a background thread; records are never mutated once published,
+    so the copies stay consistent. Pickle's memo keeps interned strings shared
+    within the snapshot, so a restore needs no re-interning. Writes landing
+    while it is pickled go to the new segment; replaying them over the
+    snapshot is safe because creates are skipped when present and updates
+    set absolute values. With wait=True a snapshot already in flight is
+    waited for and a fresh one is taken after it.
+    """
+    global _snapshot_thread
+    while True:
+        with _all_stripes():
+            if _journal is None:
+                return
+            running = _snapshot_thread if _snapshot_thread is not None and _snapshot_thread.is_alive() else None
+            if running is None:
+                tables = {
+                    "hcps": dict(_hcps),
+                    "interactions": dict(_interactions),
+                }
+                seq = _journal.rotate()
+                target = _journal
+                _snapshot_thread = threading.Thread(target=_write_snapshot, args=(target, tables, seq),
+                                                    name="journal-snapshot", daemon=True)
+                _snapshot_thread.start()
+                break
+        if not wait:
+            return
+        # One is already being written; it may predate the caller's writes,
+        # so let it finish and then take a fresh one
+        running.join()
+    if wait:
+        _snapshot_thread.join()
+
+def _write_snapshot(target: journal.Journal, tables: dict, seq: int):
+    try:
+        journal.write_snapshot(target.directory, {"segment": seq, "tables": tables})
+        target.prune(seq)
+    except Exception:
+        # Older segments stay in place, so nothing is lost; the next snapshot retries
+        logger.exception("Snapshot failed")
+
+def close_journal(snapshot_first: bool = True):
+    """Optionally snapshot, then flush and close the journal"""
+    global _journal
+    if _journal is None:
+        return
+    if snapshot_first:
+        snapshot(wait=True)
+    # Never close under a snapshot that is still being written
+    if _snapshot_thread is not None:
+        _snapshot_thread.join()
+    with _all_stripes():
+        _journal.close()
+        _journal = None
+
+def init():
+    """
+    JOURNAL_DIR: enable the journal in this directory (unset = memory only)
+    JOURNAL_FSYNC_INTERVAL: seconds between group fsyncs (default 0.05; 0 = every write)
+    JOURNAL_SNAPSHOT_EVERY: journal records between snapshots (default 100000)
+    """
+    directory = os.getenv("JOURNAL_DIR")
+    if directory:
+        open_journal(
+            directory,
+            fsync_interval=float(os.getenv("JOURNAL_FSYNC_INTERVAL", "0.05")),
+            snapshot_every=int(os.getenv("JOURNAL_SNAPSHOT_EVERY", "100000")),
+        )
+
+def close():
+    close_journal()
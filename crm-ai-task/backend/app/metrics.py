@@ -0,0 +1,371 @@
+"""
+Request, agent, LLM and store instrumentation with a Prometheus text endpoint
+
+install() hooks into the existing extension points:
+- an agent node observer: crm_agent_node_seconds / crm_agent_node_errors_total
+- the innermost LLM wrapper (so only real calls are timed, not cache hits or
+  rate-limit waits): crm_llm_request_seconds, crm_llm_errors_total and
+  crm_llm_tokens_total from the response's token usage
+- a crud observer: crm_store_op_seconds per storage operation
+- MetricsMiddleware: crm_http_request_seconds / crm_http_requests_total by
+  route template
+
+agent_service counts fallback-path activations (crm_agent_fallbacks_total),
+and the LLM cache, fast path, sentiment backend, job queue and edit parser
+counters are read at scrape time. render() produces the text served on GET /metrics.
+
+With METRICS_TRACE_LOG=true every request also logs one JSON line (logger
+"crm.trace") listing its node runs, LLM calls with tokens, store operations
+and fallbacks.
+"""
+import bisect
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import crud, edit_parser, fast_extract, job_queue, llm_cache, sentiment
+from .agent_registry import agent_module
+
+trace_logger = logging.getLogger("crm.trace")
+
+# Seconds; covers sub-millisecond store calls up to slow LLM round trips
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(n, "") for n in self.label_names), 0.0)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}" for key, value in items]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(labels.get(n, "") for n in self.label_names))
+        return series[2] if series else 0
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(round(total, 6))}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+HTTP_REQUESTS = Counter("crm_http_requests_total", "HTTP requests by route template and status", ("method", "route", "status"))
+HTTP_SECONDS = Histogram("crm_http_request_seconds", "HTTP request latency", ("method", "route"))
+NODE_SECONDS = Histogram("crm_agent_node_seconds", "Agent graph node run time", ("node",))
+NODE_ERRORS = Counter("crm_agent_node_errors_total", "Agent graph node runs that raised", ("node",))
+LLM_SECONDS = Histogram("crm_llm_request_seconds", "LLM call latency (cache hits excluded)", ("node",))
+LLM_ERRORS = Counter("crm_llm_errors_total", "LLM calls that raised", ("node",))
+LLM_TOKENS = Counter("crm_llm_tokens_total", "LLM tokens from response usage metadata", ("node", "type"))
+FALLBACKS = Counter("crm_agent_fallbacks_total", "Agent runs that failed and fell back to direct LLM extraction", ("mode",))
+STORE_SECONDS = Histogram("crm_store_op_seconds", "Storage operation latency", ("backend", "op"))
+
+METRICS = [HTTP_REQUESTS, HTTP_SECONDS, NODE_SECONDS, NODE_ERRORS, LLM_SECONDS, LLM_ERRORS, LLM_TOKENS,
+           FALLBACKS, STORE_SECONDS]
+
+
+def _collected() -> List[Tuple[str, str, str, List[Tuple[dict, float]]]]:
+    """(name, type, help, [(labels, value)]) read from the feature modules' own counters"""
+    families = []
+    cache = llm_cache.stats()
+    if cache.get("enabled"):
+        families.append(("crm_llm_cache_lookups_total", "counter", "LLM response cache lookups by result", [
+            ({"result": "memory_hit"}, cache["memory_hits"]),
+            ({"result": "disk_hit"}, cache["disk_hits"]),
+            ({"result": "miss"}, cache["misses"]),
+        ]))
+    fast = fast_extract.stats()
+    if fast.get("enabled"):
+        families.append(("crm_fast_path_notes_total", "counter", "Notes through the rule-based pre-extractor by result", [
+            ({"result": "full_hit"}, fast["full_hits"]),
+            ({"result": "partial_hit"}, fast["partial_hits"]),
+            ({"result": "miss"}, fast["misses"]),
+        ]))
+    labels = sentiment.stats()
+    if labels.get("backend") != "llm":
+        families.append(("crm_sentiment_local_total", "counter", "Summaries seen by the local sentiment backend by result", [
+            ({"result": "local"}, labels["local"]),
+            ({"result": "deferred_to_llm"}, labels["deferred_to_llm"]),
+        ]))
+    jobs = job_queue.stats()
+    if jobs.get("enabled"):
+        families.append(("crm_job_queue_jobs", "gauge", "Background agent jobs waiting or running", [
+            ({"state": "waiting"}, jobs["waiting"]),
+            ({"state": "running"}, jobs["running"]),
+        ]))
+        families.append(("crm_jobs_total", "counter", "Background agent jobs by event", [
+            ({"event": event}, jobs[event]) for event in ("submitted", "succeeded", "failed", "retried", "rejected")
+        ]))
+    edits = edit_parser.stats()
+    families.append(("crm_edit_requests_total", "counter", "Natural-language edits by how they were applied", [
+        ({"applied_by": "rules"}, edits["rule_hits"]),
+        ({"applied_by": "llm"}, edits["llm_edits"]),
+    ]))
+    return families
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    for name, kind, help, samples in _collected():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    for metric in METRICS:
+        metric.reset()
+
+
+# Per-request trace, set by MetricsMiddleware when trace logging is on
+_trace: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("crm_trace", default=None)
+
+
+def _traced(kind: str, entry):
+    trace = _trace.get()
+    if trace is not None:
+        trace[kind].append(entry)
+
+
+def _on_node(node: str, seconds: float, error):
+    NODE_SECONDS.observe(seconds, node=node)
+    if error is not None:
+        NODE_ERRORS.inc(node=node)
+    _traced("nodes", {"node": node, "ms": round(seconds * 1000, 2), **({"error": repr(error)} if error else {})})
+
+
+def _on_store(op: str, seconds: float):
+    STORE_SECONDS.observe(seconds, backend=crud.backend_name(), op=op)
+    _traced("store", {"op": op, "ms": round(seconds * 1000, 3)})
+
+
+def record_fallback(mode: str, error: Exception):
+    """Called by agent_service when a graph run fails and direct extraction takes over"""
+    FALLBACKS.inc(mode=mode)
+    _traced("fallbacks", {"mode": mode, "error": repr(error)})
+
+
+def token_usage(response) -> Tuple[int, int]:
+    """(prompt, completion) tokens from LangChain usage_metadata or Groq's token_usage"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+class MeteredChatModel:
+    """Chat model wrapper recording latency, errors and token counts per node"""
+
+    def __init__(self, llm, node: str = None):
+        self.llm = llm
+        self.node = node or "unknown"
+
+    def bind(self, **kwargs):
+        return MeteredChatModel(self.llm.bind(**kwargs), self.node)
+
+    def _record(self, seconds: float, response, error):
+        LLM_SECONDS.observe(seconds, node=self.node)
+        entry = {"node": self.node, "ms": round(seconds * 1000, 2)}
+        if error is not None:
+            LLM_ERRORS.inc(node=self.node)
+            entry["error"] = repr(error)
+        else:
+            prompt, completion = token_usage(response)
+            if prompt:
+                LLM_TOKENS.inc(prompt, node=self.node, type="prompt")
+            if completion:
+                LLM_TOKENS.inc(completion, node=self.node, type="completion")
+            entry.update(prompt_tokens=prompt, completion_tokens=completion)
+        _traced("llm", entry)
+
+    def invoke(self, messages, **kwargs):
+        start, response, error = time.perf_counter(), None, None
+        try:
+            response = self.llm.invoke(messages, **kwargs)
+            return response
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._record(time.perf_counter() - start, response, error)
+
+    async def ainvoke(self, messages, **kwargs):
+        start, response, error = time.perf_counter(), None, None
+        try:
+            response = await self.llm.ainvoke(messages, **kwargs)
+            return response
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._record(time.perf_counter() - start, response, error)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each HTTP request by route template, and running its trace"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _installed:
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        trace_token = None
+        if _trace_log:
+            headers = dict(scope.get("headers") or ())
+            request_id = headers.get(b"x-request-id", b"").decode() or uuid.uuid4().hex
+            trace_token = _trace.set({"request_id": request_id, "nodes": [], "llm": [], "store": [], "fallbacks": []})
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            seconds = time.perf_counter() - start
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_SECONDS.observe(seconds, method=scope["method"], route=route)
+            HTTP_REQUESTS.inc(method=scope["method"], route=route, status=str(status))
+            if trace_token is not None:
+                trace = _trace.get()
+                _trace.reset(trace_token)
+                trace_logger.info(json.dumps({
+                    "request_id": trace["request_id"], "method": scope["method"], "route": route,
+                    "status": status, "ms": round(seconds * 1000, 2), "nodes": trace["nodes"],
+                    "llm": trace["llm"], "store": trace["store"], "fallbacks": trace["fallbacks"],
+                }))
+
+
+_installed = False
+_trace_log = False
+_wrapper: Optional[Callable] = None
+
+
+def install(trace_log: bool = False):
+    """
+    Start recording. Call before other LLM wrappers are installed so the
+    timing wrapper sits closest to the real client.
+    """
+    global _installed, _trace_log, _wrapper
+    uninstall()
+    _wrapper = lambda llm, node: MeteredChatModel(llm, node)
+    agent_module.add_llm_wrapper(_wrapper)
+    agent_module.add_node_observer(_on_node)
+    crud.set_observer(_on_store)
+    _trace_log = trace_log
+    _installed = True
+
+
+def uninstall():
+    global _installed, _trace_log, _wrapper
+    if _wrapper is not None:
+        agent_module.remove_llm_wrapper(_wrapper)
+    agent_module.remove_node_observer(_on_node)
+    crud.set_observer(None)
+    _installed, _trace_log, _wrapper = False, False, None
+
+
+def configure_from_env():
+    """
+    METRICS_ENABLED: record metrics (default true)
+    METRICS_TRACE_LOG: log one JSON trace line per request (default false)
+    """
+    if os.getenv("METRICS_ENABLED", "true").lower() in ("0", "false", "no"):
+        return
+    install(trace_log=os.getenv("METRICS_TRACE_LOG", "false").lower() in ("1", "true", "yes"))
+
+
+def enabled() -> bool:
+    return _installed
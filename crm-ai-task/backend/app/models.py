@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, Text, Enum, ForeignKey, JSON
+from sqlalchemy import Column, String, Integer, DateTime, Text, Enum, ForeignKey, JSON, Index, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import uuid
@@ -34,7 +34,7 @@ class Interaction(Base):
 
     id = Column(UUID(as_uuid=False), primary_key=True, default=gen_uuid)
     hcp_id = Column(UUID(as_uuid=False), ForeignKey("hcps.id"), nullable=True, index=True)
-    rep_id = Column(String, nullable=True)  # link to user id (string/uuid)
+    rep_id = Column(String, nullable=True, index=True)  # link to user id (string/uuid)
     mode = Column(String, nullable=False, default="conversational")  # structured|conversational
     datetime = Column(DateTime, nullable=True)
     summary = Column(Text, nullable=True)
@@ -51,11 +51,19 @@ class Interaction(Base):
     follow_ups = relationship("FollowUp", back_populates="interaction", cascade="all, delete-orphan")
 
 
+# Keyset pagination order: COALESCE(datetime, created_at), id
+interaction_sort_at = func.coalesce(Interaction.datetime, Interaction.created_at)
+Index("ix_interactions_sort", interaction_sort_at, Interaction.id)
+Index("ix_interactions_hcp_sort", Interaction.hcp_id, interaction_sort_at, Interaction.id)
+Index("ix_interactions_rep_sort", Interaction.rep_id, interaction_sort_at, Interaction.id)
+Index("ix_hcps_name_sort", HCP.name, HCP.id)
+
+
 class MaterialShared(Base):
     __tablename__ = "materials_shared"
 
     id = Column(UUID(as_uuid=False), primary_key=True, default=gen_uuid)
-    interaction_id = Column(UUID(as_uuid=False), ForeignKey("interactions.id"), nullable=False)
+    interaction_id = Column(UUID(as_uuid=False), ForeignKey("interactions.id"), nullable=False, index=True)
     material_type = Column(String, nullable=False)
     quantity = Column(Integer, default=0)
     notes = Column(Text, nullable=True)
@@ -67,7 +75,7 @@ class Sample(Base):
     __tablename__ = "samples"
 
     id = Column(UUID(as_uuid=False), primary_key=True, default=gen_uuid)
-    interaction_id = Column(UUID(as_uuid=False), ForeignKey("interactions.id"), nullable=False)
+    interaction_id = Column(UUID(as_uuid=False), ForeignKey("interactions.id"), nullable=False, index=True)
     product_code = Column(String, nullable=False)
     quantity = Column(Integer, default=0)
     lot = Column(String, nullable=True)
@@ -79,7 +87,7 @@ class FollowUp(Base):
     __tablename__ = "follow_ups"
 
     id = Column(UUID(as_uuid=False), primary_key=True, default=gen_uuid)
-    interaction_id = Column(UUID(as_uuid=False), ForeignKey("interactions.id"), nullable=False)
+    interaction_id = Column(UUID(as_uuid=False), ForeignKey("interactions.id"), nullable=False, index=True)
     due_date = Column(DateTime, nullable=True)
     action_item = Column(Text, nullable=False)
     owner = Column(String, nullable=True)
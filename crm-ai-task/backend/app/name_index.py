@@ -0,0 +1,162 @@
+"""
+In-memory HCP name index with prefix and trigram matching
+"""
+import bisect
+import re
+from typing import Dict, List, Set, Tuple
+
+# Honorifics and credentials that carry no identifying information
+_STOPWORDS = {"dr", "doctor", "prof", "professor", "mr", "mrs", "ms", "miss", "md", "mbbs", "phd"}
+_NON_ALNUM = re.compile(r"[^0-9a-z\s]+")
+
+# Per-token scores: exact > prefix > fuzzy
+EXACT_SCORE = 1.0
+PREFIX_BASE_SCORE = 0.5
+FUZZY_MAX_SCORE = 0.85
+MIN_TRIGRAM_SIMILARITY = 0.3
+
+
+def normalize_name(name: str) -> List[str]:
+    """
+    Split a name into normalized tokens
+
+    "Dr. Meera Patel, MD" -> ["meera", "patel"]
+    """
+    cleaned = _NON_ALNUM.sub(" ", (name or "").lower())
+    return [t for t in cleaned.split() if t not in _STOPWORDS]
+
+
+def trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """
+    Token index over HCP names
+
+    - token -> set of HCP ids, for exact token matches
+    - sorted token list, for prefix (typeahead) matches via bisect
+    - trigram -> set of tokens, for fuzzy matches on misspelled names
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Set[str]] = {}
+        self._sorted_tokens: List[str] = []
+        self._trigram_tokens: Dict[str, Set[str]] = {}
+        self._trigram_counts: Dict[str, int] = {}
+        self._token_counts: Dict[str, int] = {}
+
+    def clear(self):
+        self.__init__()
+
+    def add(self, hcp_id: str, name: str):
+        tokens = normalize_name(name)
+        self._token_counts[hcp_id] = len(tokens)
+        for token in tokens:
+            ids = self._postings.get(token)
+            if ids is None:
+                ids = self._postings[token] = set()
+                bisect.insort(self._sorted_tokens, token)
+                tris = trigrams(token)
+                self._trigram_counts[token] = len(tris)
+                for tri in tris:
+                    self._trigram_tokens.setdefault(tri, set()).add(token)
+            ids.add(hcp_id)
+
+    def remove(self, hcp_id: str, name: str):
+        for token in normalize_name(name):
+            ids = self._postings.get(token)
+            if not ids:
+                continue
+            ids.discard(hcp_id)
+            if not ids:
+                del self._postings[token]
+                pos = bisect.bisect_left(self._sorted_tokens, token)
+                del self._sorted_tokens[pos]
+                del self._trigram_counts[token]
+                for tri in trigrams(token):
+                    tokens = self._trigram_tokens.get(tri)
+                    if tokens is not None:
+                        tokens.discard(token)
+                        if not tokens:
+                            del self._trigram_tokens[tri]
+        self._token_counts.pop(hcp_id, None)
+
+    def _prefix_tokens(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self._sorted_tokens, prefix)
+        end = bisect.bisect_left(self._sorted_tokens, prefix + "\uffff", start)
+        return self._sorted_tokens[start:end]
+
+    def _fuzzy_tokens(self, token: str) -> List[Tuple[str, float]]:
+        query_tris = trigrams(token)
+        shared: Dict[str, int] = {}
+        for tri in query_tris:
+            for candidate in self._trigram_tokens.get(tri, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+
+        # A candidate needs at least this many shared trigrams to reach the threshold
+        min_shared = MIN_TRIGRAM_SIMILARITY * len(query_tris)
+        matches = []
+        for candidate, count in shared.items():
+            if count < min_shared:
+                continue
+            # Jaccard similarity of the two trigram sets
+            similarity = count / (len(query_tris) + self._trigram_counts[candidate] - count)
+            if similarity >= MIN_TRIGRAM_SIMILARITY:
+                matches.append((candidate, similarity))
+        return matches
+
+    def _token_matches(self, token: str) -> Dict[str, float]:
+        """Best score per HCP id for a single query token"""
+        scores: Dict[str, float] = {}
+
+        def credit(candidate: str, score: float):
+            for hcp_id in self._postings[candidate]:
+                if score > scores.get(hcp_id, 0.0):
+                    scores[hcp_id] = score
+
+        for candidate in self._prefix_tokens(token):
+            if candidate == token:
+                credit(candidate, EXACT_SCORE)
+            else:
+                credit(candidate, PREFIX_BASE_SCORE + (1 - PREFIX_BASE_SCORE) * len(token) / len(candidate))
+
+        # Only fall back to fuzzy matching when nothing matched literally
+        if not scores:
+            for candidate, similarity in self._fuzzy_tokens(token):
+                credit(candidate, FUZZY_MAX_SCORE * similarity)
+        return scores
+
+    def search(self, query: str, limit: int = 10, min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """
+        Rank HCP ids against a query
+
+        Args:
+            query: Free-text name or partial name
+            limit: Maximum number of results
+            min_score: Drop results scoring below this (0-1)
+
+        Returns:
+            List of (hcp_id, score) sorted by descending score
+        """
+        tokens = normalize_name(query)
+        if not tokens:
+            return []
+
+        totals: Dict[str, float] = {}
+        for token in tokens:
+            for hcp_id, score in self._token_matches(token).items():
+                totals[hcp_id] = totals.get(hcp_id, 0.0) + score
+
+        results = []
+        for hcp_id, total in totals.items():
+            score = total / len(tokens)
+            # Slightly prefer names with no unmatched tokens ("Meera Patel" over "Meera Patel Rao")
+            extra = max(self._token_counts.get(hcp_id, 0) - len(tokens), 0)
+            score = round(score / (1 + 0.05 * extra), 4)
+            if score >= min_score:
+                results.append((hcp_id, score))
+
+        results.sort(key=lambda r: (-r[1], r[0]))
+        return results[:limit]
@@ -0,0 +1,72 @@
+"""
+Keyset pagination helpers shared by the storage backends
+
+Interactions are ordered by (timestamp, id), where timestamp is the
+interaction's `datetime`, or `created_at` when no datetime was recorded.
+HCPs are ordered by (name, id); names compare as stored, so each backend's
+own collation decides the order and cursors stay consistent with it. Search
+results are ordered by (score, id), best first. A cursor is the opaque,
+URL-safe encoding of the last key on the previous page.
+"""
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def to_naive_utc(value) -> Optional[datetime]:
+    """Normalize ISO strings and aware datetimes so every timestamp compares"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def interaction_key(inter: dict) -> Tuple[datetime, str]:
+    return to_naive_utc(inter.get("datetime") or inter["created_at"]), inter["id"]
+
+
+def hcp_key(hcp: dict) -> Tuple[str, str]:
+    return hcp["name"], hcp["id"]
+
+
+def encode_cursor(key: tuple) -> str:
+    parts = [v.isoformat() if isinstance(v, datetime) else v for v in key]
+    return base64.urlsafe_b64encode(json.dumps(parts).encode()).decode().rstrip("=")
+
+
+def decode_interaction_cursor(cursor: str) -> Tuple[datetime, str]:
+    ts, interaction_id = _decode(cursor)
+    try:
+        return to_naive_utc(ts), str(interaction_id)
+    except (TypeError, AttributeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def decode_hcp_cursor(cursor: str) -> Tuple[str, str]:
+    name, hcp_id = _decode(cursor)
+    return str(name), str(hcp_id)
+
+
+def decode_score_cursor(cursor: str) -> Tuple[float, str]:
+    score, doc_id = _decode(cursor)
+    if isinstance(score, bool) or not isinstance(score, (int, float)):
+        raise ValueError("Invalid cursor")
+    return float(score), str(doc_id)
+
+
+def _decode(cursor: str) -> list:
+    """Raises ValueError for anything that isn't a cursor we issued"""
+    try:
+        parts = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(parts, list) or len(parts) != 2:
+        raise ValueError("Invalid cursor")
+    return parts
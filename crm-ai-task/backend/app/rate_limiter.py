@@ -0,0 +1,101 @@
+"""
+Process-wide rate limiter for outgoing LLM calls
+
+A token bucket shared by every request (single notes and batches alike), so
+concurrent batches can't push the combined request rate past the provider's
+limit. Enabled with LLM_RATE_LIMIT_RPS.
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Optional
+
+from .agent_registry import agent_module
+
+
+class TokenBucket:
+    """
+    Token bucket usable from both threads and the event loop
+
+    Callers reserve a token up front and then wait out any deficit, so waiting
+    never holds the lock.
+    """
+
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take a token and return how long to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        delay = self._reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def aacquire(self):
+        delay = self._reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class RateLimitedChatModel:
+    """Chat model wrapper that takes a bucket token before each call"""
+
+    def __init__(self, llm, bucket: TokenBucket):
+        self.llm = llm
+        self.bucket = bucket
+        self.model_name = getattr(llm, "model_name", None)
+        self.temperature = getattr(llm, "temperature", None)
+
+    def bind(self, **kwargs):
+        return RateLimitedChatModel(self.llm.bind(**kwargs), self.bucket)
+
+    def invoke(self, messages, **kwargs):
+        self.bucket.acquire()
+        return self.llm.invoke(messages, **kwargs)
+
+    async def ainvoke(self, messages, **kwargs):
+        await self.bucket.aacquire()
+        return await self.llm.ainvoke(messages, **kwargs)
+
+
+_bucket: Optional[TokenBucket] = None
+_wrapper = None
+
+
+def install(rate: float, burst: int = None):
+    """Throttle every get_llm() caller to `rate` calls per second"""
+    global _bucket, _wrapper
+    uninstall()
+    _bucket = TokenBucket(rate, burst)
+    _wrapper = lambda llm, node: RateLimitedChatModel(llm, _bucket)
+    agent_module.add_llm_wrapper(_wrapper)
+
+
+def uninstall():
+    global _bucket, _wrapper
+    if _wrapper is not None:
+        agent_module.remove_llm_wrapper(_wrapper)
+    _bucket, _wrapper = None, None
+
+
+def configure_from_env():
+    """
+    LLM_RATE_LIMIT_RPS: sustained LLM calls per second (unset = unlimited)
+    LLM_RATE_LIMIT_BURST: calls allowed back-to-back before throttling
+    """
+    rate = os.getenv("LLM_RATE_LIMIT_RPS")
+    if rate:
+        burst = os.getenv("LLM_RATE_LIMIT_BURST")
+        install(float(rate), int(burst) if burst else None)
@@ -0,0 +1,126 @@
+"""
+Compact row records for the in-memory store
+
+Rows are slotted dataclasses rather than dicts: no per-row hash table and
+no per-row copy of the field names. Children live in tuples on their
+interaction rather than in tables of their own. Low-cardinality strings
+(rep and HCP ids, mode, sentiment, material type, product code, status...)
+are interned, so a million interactions share one "rep_12" object instead
+of holding a million copies.
+
+Unique values (ids, summaries) are not interned; children reference their
+interaction's id string rather than a copy of it.
+
+Records are internal to the store; to_dict() converts them at the API
+boundary. Once published they are treated as immutable (updates build a
+new record with dataclasses.replace).
+"""
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+
+def intern(value):
+    """sys.intern for str values; None and everything else pass through"""
+    return sys.intern(value) if type(value) is str else value
+
+
+class _Record:
+    __slots__ = ()
+    # Fields interned by intern_fields()
+    INTERNED: Tuple[str, ...] = ()
+
+    def intern_fields(self):
+        """Intern repeated strings in place (only before the record is published)"""
+        for name in self.INTERNED:
+            object.__setattr__(self, name, intern(getattr(self, name)))
+        return self
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+@dataclass(slots=True, eq=False)
+class HCPRecord(_Record):
+    INTERNED = ("title", "speciality", "organisation")
+
+    id: str
+    name: str
+    title: Optional[str]
+    speciality: Optional[str]
+    organisation: Optional[str]
+    contact: Any
+    created_at: datetime
+    updated_at: datetime
+
+
+@dataclass(slots=True, eq=False)
+class MaterialRecord(_Record):
+    INTERNED = ("material_type",)
+
+    id: str
+    interaction_id: str
+    material_type: str
+    quantity: int
+    notes: Optional[str]
+
+
+@dataclass(slots=True, eq=False)
+class SampleRecord(_Record):
+    INTERNED = ("product_code",)
+
+    id: str
+    interaction_id: str
+    product_code: str
+    quantity: int
+    lot: Optional[str]
+
+
+@dataclass(slots=True, eq=False)
+class FollowUpRecord(_Record):
+    INTERNED = ("owner", "status")
+
+    id: str
+    interaction_id: str
+    due_date: Optional[datetime]
+    action_item: str
+    owner: Optional[str]
+    status: str
+
+
+@dataclass(slots=True, eq=False)
+class InteractionRecord(_Record):
+    INTERNED = ("hcp_id", "rep_id", "mode", "sentiment")
+
+    id: str
+    hcp_id: Optional[str]
+    rep_id: Optional[str]
+    mode: str
+    datetime: Optional[datetime]  # patches arrive validated by schemas.InteractionPatch and are stored as naive UTC
+    summary: Optional[str]
+    sentiment: Optional[str]
+    topics: Optional[Tuple[str, ...]]
+    outcome: Optional[str]
+    source_raw: Optional[str]
+    created_at: datetime
+    updated_at: datetime
+    materials: Tuple[MaterialRecord, ...] = ()
+    samples: Tuple[SampleRecord, ...] = ()
+    follow_ups: Tuple[FollowUpRecord, ...] = ()
+
+    def intern_fields(self):
+        _Record.intern_fields(self)
+        if self.topics is not None:
+            self.topics = tuple(map(intern, self.topics))
+        for child in (*self.materials, *self.samples, *self.follow_ups):
+            child.intern_fields()
+        return self
+
+    def to_dict(self) -> dict:
+        row = _Record.to_dict(self)
+        if self.topics is not None:
+            row["topics"] = list(self.topics)
+        for name in ("materials", "samples", "follow_ups"):
+            row[name] = [child.to_dict() for child in row[name]]
+        return row
@@ -0,0 +1,363 @@
+"""
+Sample distribution ledger for compliance reporting
+
+Running totals of sample units (and of the sample rows behind them) are
+kept per (rep_id, product_code, lot) by day and by month, where the date is
+the interaction's datetime (created_at when it has none), in UTC. Each key
+is also kept with the rep, the lot or the product and lot wildcarded, so
+"product P, lot L across all reps" or "everything rep R handed out" is a
+single lookup.
+
+A crud change listener updates the totals as interactions are created and
+edited (the old version's samples are subtracted and the new version's
+added), so a question like "units of P, lot L distributed by R this
+quarter" reads at most two partial months of daily totals plus whole
+months, whatever the number of interactions.
+
+reconcile() recounts every sample row in the store and compares the result
+with the ledger, optionally repairing differences. It catches anything the
+listener missed, e.g. writes by another process sharing the SQL database.
+SAMPLE_LEDGER_RECONCILE_INTERVAL runs it periodically in a background
+thread.
+"""
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from . import crud
+from .pagination import to_naive_utc
+
+logger = logging.getLogger(__name__)
+
+# Stands for "any value" in a ledger key
+ANY = "*"
+GROUP_BYS = ("none", "day", "month", "quarter")
+# Longest range a day-by-day query may return
+MAX_DAYS = 366
+# Longest range any query may cover (ten years)
+MAX_RANGE_DAYS = 3653
+
+Key = Tuple[str, str, str]
+
+
+def normalize(value: Optional[str]) -> str:
+    """Key form of a product code or lot (trimmed, upper case; "" when missing)"""
+    return (value or "").strip().upper()
+
+
+def _keys(rep_id: str, product: str, lot: str) -> List[Key]:
+    # A lot only means something within its product, so there is no (product any, lot L) form
+    return [(rep_id, product, lot), (rep_id, product, ANY), (rep_id, ANY, ANY),
+            (ANY, product, lot), (ANY, product, ANY), (ANY, ANY, ANY)]
+
+
+def _entries(inter: Optional[dict]):
+    """(key, day, units) for each sample row of an interaction"""
+    if inter is None or not inter.get("samples"):
+        return []
+    day = to_naive_utc(inter.get("datetime") or inter["created_at"]).date()
+    rep_id = inter.get("rep_id") or ""
+    return [((rep_id, normalize(s.get("product_code")), normalize(s.get("lot"))), day, s.get("quantity") or 0)
+            for s in inter["samples"]]
+
+
+def _month_end(month: date) -> date:
+    # December is special-cased so December of date.max's year does not overflow
+    if month.month == 12:
+        return month.replace(day=31)
+    return month.replace(month=month.month + 1, day=1) - timedelta(days=1)
+
+
+def _period(day: date, group_by: str) -> str:
+    if group_by == "day":
+        return day.isoformat()
+    if group_by == "month":
+        return f"{day.year}-{day.month:02d}"
+    if group_by == "quarter":
+        return f"{day.year}-Q{(day.month - 1) // 3 + 1}"
+    return "total"
+
+
+class SampleLedger:
+    """[units, rows] totals per ledger key, by day and by first-of-month"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # One reconcile at a time; while its recount runs, (key, month)
+        # pairs written by the listener are collected in _touched
+        self._reconcile_lock = threading.Lock()
+        self._touched: Optional[set] = None
+        self._days: Dict[Key, Dict[date, list]] = defaultdict(dict)
+        self._months: Dict[Key, Dict[date, list]] = defaultdict(dict)
+        self.updates = 0
+        self.rebuild_ms = 0.0
+        self.last_reconcile: Optional[dict] = None
+
+    def _post(self, key: Key, day: date, units: int, rows: int):
+        """Add units and rows to a (wildcard-free) key's day and month, and to its wildcard forms"""
+        keys = _keys(*key)
+        for totals, bucket in ((self._days, day), (self._months, day.replace(day=1))):
+            for k in keys:
+                by_bucket = totals[k]
+                entry = by_bucket.get(bucket)
+                if entry is None:
+                    entry = by_bucket[bucket] = [0, 0]
+                entry[0] += units
+                entry[1] += rows
+                if entry[1] <= 0:
+                    del by_bucket[bucket]
+                    if not by_bucket:
+                        del totals[k]
+
+    def apply(self, old: Optional[dict], new: Optional[dict]):
+        """crud listener: move an interaction's samples from its old version to its new one"""
+        if old is None and new is None:
+            self.clear()
+            return
+        removed, added = _entries(old), _entries(new)
+        if not removed and not added:
+            return
+        with self._lock:
+            for key, day, units in removed:
+                self._post(key, day, -units, -1)
+            for key, day, units in added:
+                self._post(key, day, units, 1)
+            self.updates += 1
+            if self._touched is not None:
+                self._touched.update((key, day.replace(day=1)) for key, day, _ in (*removed, *added))
+
+    def clear(self):
+        with self._lock:
+            self._days.clear()
+            self._months.clear()
+
+    def rebuild(self, interactions):
+        """Recount from scratch (e.g. every interaction in the store at startup)"""
+        start = time.perf_counter()
+        days, months = self._count(interactions)
+        with self._lock:
+            self._days, self._months = days, months
+        self.rebuild_ms = (time.perf_counter() - start) * 1000
+
+    @staticmethod
+    def _count(interactions):
+        scratch = SampleLedger()
+        for inter in interactions:
+            for key, day, units in _entries(inter):
+                scratch._post(key, day, units, 1)
+        return scratch._days, scratch._months
+
+    def _range_total(self, key: Key, start: date, end: date) -> list:
+        """[units, rows] over start..end: whole months from the monthly totals, the ends from the daily ones"""
+        days, months = self._days.get(key, {}), self._months.get(key, {})
+        total = [0, 0]
+        month = start.replace(day=1)
+        while month <= end:
+            last = _month_end(month)
+            if month >= start and last <= end:
+                entry = months.get(month)
+                if entry:
+                    total[0] += entry[0]
+                    total[1] += entry[1]
+            elif months.get(month):
+                first = max(month, start)
+                for offset in range((min(last, end) - first).days + 1):
+                    entry = days.get(first + timedelta(days=offset))
+                    if entry:
+                        total[0] += entry[0]
+                        total[1] += entry[1]
+            if last >= end:
+                break
+            month = last + timedelta(days=1)
+        return total
+
+    def query(self, rep_id: Optional[str], product_code: Optional[str], lot: Optional[str],
+              start: date, end: date, group_by: str = "none") -> dict:
+        """
+        Units and sample rows over start..end (inclusive) for one key
+
+        None for rep_id, product_code or lot means any value. group_by splits
+        the range into days, calendar months or quarters. Raises ValueError
+        for a lot without a product_code, a reversed range, a range longer
+        than MAX_RANGE_DAYS, an unknown group_by or more than MAX_DAYS days
+        grouped by day.
+        """
+        if lot is not None and product_code is None:
+            raise ValueError("lot needs a product_code")
+        if end < start:
+            raise ValueError("date_to is before date_from")
+        if (end - start).days >= MAX_RANGE_DAYS:
+            raise ValueError(f"A range can cover at most {MAX_RANGE_DAYS} days")
+        if group_by not in GROUP_BYS:
+            raise ValueError(f"group_by must be one of {GROUP_BYS}")
+        if group_by == "day" and (end - start).days >= MAX_DAYS:
+            raise ValueError(f"At most {MAX_DAYS} days can be grouped by day")
+        key = (ANY if rep_id is None else rep_id,
+               ANY if product_code is None else normalize(product_code),
+               ANY if lot is None else normalize(lot))
+        # Periods in order, each clipped to the range
+        spans, day = [], start
+        while day <= end:
+            label = _period(day, group_by)
+            if group_by == "day":
+                last = day
+            elif group_by == "month":
+                last = _month_end(day)
+            elif group_by == "quarter":
+                last = _month_end(date(day.year, (day.month - 1) // 3 * 3 + 3, 1))
+            else:
+                last = end
+            spans.append((label, day, min(last, end)))
+            if last >= end:
+                break
+            day = last + timedelta(days=1)
+        with self._lock:
+            totals = [(label, self._range_total(key, a, b)) for label, a, b in spans]
+        return {
+            "rep_id": rep_id, "product_code": product_code, "lot": lot,
+            "date_from": start, "date_to": end,
+            "units": sum(t[0] for _, t in totals), "rows": sum(t[1] for _, t in totals),
+            "periods": [{"period": label, "units": t[0], "rows": t[1]} for label, t in totals] if group_by != "none" else [],
+        }
+
+    def _mismatches(self, months: dict) -> dict:
+        """(key, month) -> (ledger entry, recount entry) wherever the monthly totals differ"""
+        found = {}
+        with self._lock:
+            for key in set(self._months) | set(months):
+                if ANY in key:
+                    continue
+                ledger, recount = self._months.get(key, {}), months.get(key, {})
+                for month in set(ledger) | set(recount):
+                    if ledger.get(month) != recount.get(month):
+                        found[key, month] = (list(ledger.get(month, [0, 0])), list(recount.get(month, [0, 0])))
+        return found
+
+    def _repair(self, key: Key, month: date, days: dict):
+        """Post the per-day differences between a recount and the ledger for one key and month"""
+        recount = {d: e for d, e in days.get(key, {}).items() if d.replace(day=1) == month}
+        ledger = {d: list(e) for d, e in self._days.get(key, {}).items() if d.replace(day=1) == month}
+        for day in set(recount) | set(ledger):
+            want, have = recount.get(day, [0, 0]), ledger.get(day, [0, 0])
+            if want != have:
+                self._post(key, day, want[0] - have[0], want[1] - have[1])
+
+    def reconcile(self, source, repair: bool = False) -> dict:
+        """
+        Compare the monthly totals with a recount of the raw sample rows
+
+        source is a callable returning every interaction (e.g.
+        crud.iter_interactions). Writes that land while the store is read can
+        look like a mismatch, so when one is found the store is counted a
+        second time and only differences seen in both passes are reported
+        (and, with repair, corrected in place). A key and month the listener
+        wrote to during the second pass is not repaired, since the recount may
+        predate that write; it is counted as "deferred" and checked again by
+        the next reconcile. Mismatches are listed as {"key", "month",
+        "ledger", "recount"} in units.
+        """
+        with self._reconcile_lock:
+            start = time.perf_counter()
+            _, months = self._count(source())
+            mismatches = self._mismatches(months)
+            deferred = 0
+            if mismatches:
+                with self._lock:
+                    self._touched = set()
+                try:
+                    days, months = self._count(source())
+                    again = self._mismatches(months)
+                    mismatches = {k: v for k, v in again.items() if mismatches.get(k) == v}
+                    if repair and mismatches:
+                        with self._lock:
+                            for key, month in mismatches:
+                                if (key, month) in self._touched:
+                                    deferred += 1
+                                else:
+                                    self._repair(key, month, days)
+                finally:
+                    with self._lock:
+                        self._touched = None
+            self.last_reconcile = {
+                "checked_keys": sum(1 for k in months if ANY not in k), "mismatches": len(mismatches),
+                "repaired": bool(repair and len(mismatches) > deferred), "deferred": deferred,
+                "ms": round((time.perf_counter() - start) * 1000, 1), "at": time.time(),
+            }
+        if mismatches:
+            logger.warning("Sample ledger reconciliation found %d mismatches%s", len(mismatches),
+                           " (repaired)" if self.last_reconcile["repaired"] else "")
+        details = [{"key": {"rep_id": key[0], "product_code": key[1], "lot": key[2]}, "month": f"{month:%Y-%m}",
+                    "ledger": ledger[0], "recount": recount[0]}
+                   for (key, month), (ledger, recount) in sorted(mismatches.items())[:100]]
+        return {**self.last_reconcile, "details": details}
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            keys = sum(1 for k in self._days if ANY not in k)
+        return {"keys": keys, "updates": self.updates, "rebuild_ms": round(self.rebuild_ms, 1),
+                "last_reconcile": self.last_reconcile}
+
+
+# Process-wide ledger, set up by configure_from_env() at startup
+_ledger: Optional[SampleLedger] = None
+_reconciler: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+def _reconcile_every(ledger: SampleLedger, interval: float):
+    while not _stop.wait(interval):
+        try:
+            ledger.reconcile(crud.iter_interactions, repair=True)
+        except Exception:
+            logger.exception("Sample ledger reconciliation failed")
+
+
+def install(ledger: SampleLedger = None, rebuild: bool = True, reconcile_interval: float = 0):
+    """Count every stored sample row, then follow writes through a crud listener"""
+    global _ledger, _reconciler
+    uninstall()
+    ledger = ledger or SampleLedger()
+    if rebuild:
+        ledger.rebuild(crud.iter_interactions())
+    crud.add_listener(ledger.apply)
+    _ledger = ledger
+    if reconcile_interval > 0:
+        _stop.clear()
+        _reconciler = threading.Thread(target=_reconcile_every, args=(ledger, reconcile_interval),
+                                       name="sample-ledger-reconcile", daemon=True)
+        _reconciler.start()
+
+
+def uninstall():
+    global _ledger, _reconciler
+    if _reconciler is not None:
+        _stop.set()
+        _reconciler.join()
+    if _ledger is not None:
+        crud.remove_listener(_ledger.apply)
+    _ledger, _reconciler = None, None
+
+
+def configure_from_env():
+    """
+    SAMPLE_LEDGER_ENABLED: maintain the ledger (default true)
+    SAMPLE_LEDGER_RECONCILE_INTERVAL: seconds between background reconcile
+        and repair runs (default 0 = only on request)
+    """
+    if os.getenv("SAMPLE_LEDGER_ENABLED", "true").lower() in ("0", "false", "no"):
+        return
+    install(reconcile_interval=float(os.getenv("SAMPLE_LEDGER_RECONCILE_INTERVAL", "0")))
+
+
+def get_ledger() -> Optional[SampleLedger]:
+    return _ledger
+
+
+def stats() -> dict:
+    if _ledger is None:
+        return {"enabled": False}
+    return {"enabled": True, **_ledger.snapshot()}
@@ -63,6 +63,13 @@ class HCP(HCPBase):
     class Config:
         from_attributes = True
 
+class HCPSearchResult(HCP):
+    score: float = 0.0
+
+class HCPPage(BaseModel):
+    items: List[HCP]
+    next_cursor: Optional[str] = None
+
 class InteractionBase(BaseModel):
     hcp_id: Optional[str] = None
     rep_id: Optional[str] = None
@@ -89,3 +96,56 @@ class Interaction(InteractionBase):
 
     class Config:
         from_attributes = True
+
+# Column values accepted by an interaction patch; only the keys a patch
+# sets are applied (see crud.update_interaction)
+class InteractionPatch(InteractionBase):
+    mode: Optional[str] = None
+
+    class Config:
+        use_enum_values = True
+
+class MaterialSharedUpdate(BaseModel):
+    id: str
+    material_type: Optional[str] = None
+    quantity: Optional[int] = None
+    notes: Optional[str] = None
+
+class SampleUpdate(BaseModel):
+    id: str
+    product_code: Optional[str] = None
+    quantity: Optional[int] = None
+    lot: Optional[str] = None
+
+class FollowUpUpdate(BaseModel):
+    id: str
+    due_date: Optional[dt] = None
+    action_item: Optional[str] = None
+    owner: Optional[str] = None
+    status: Optional[str] = None
+
+# Child-table changes carried by an interaction patch under "materials",
+# "samples" or "follow_ups". replace=True drops the existing rows first (a
+# plain list in a patch means exactly that); update items change only the
+# fields they set.
+class MaterialsPatch(BaseModel):
+    replace: bool = False
+    add: List[MaterialSharedCreate] = []
+    update: List[MaterialSharedUpdate] = []
+    remove: List[str] = []
+
+class SamplesPatch(BaseModel):
+    replace: bool = False
+    add: List[SampleCreate] = []
+    update: List[SampleUpdate] = []
+    remove: List[str] = []
+
+class FollowUpsPatch(BaseModel):
+    replace: bool = False
+    add: List[FollowUpCreate] = []
+    update: List[FollowUpUpdate] = []
+    remove: List[str] = []
+
+class InteractionPage(BaseModel):
+    items: List[Interaction]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,278 @@
+"""
+Pluggable sentiment backend for the agent's sentiment_analyzer
+
+SENTIMENT_BACKEND picks who labels a summary:
+- llm (default): the LLM, as before
+- local: a CPU classifier (lexicon + bag-of-words logistic regression
+  scored with NumPy); no LLM call at all
+- hybrid: the local classifier, falling back to the LLM when its
+  confidence is below SENTIMENT_LLM_THRESHOLD
+
+The classifier ships as a small JSON artifact (data/sentiment_model.json),
+rebuilt from labelled examples with:
+    python -m app.sentiment [--data app/data/sentiment_train.jsonl]
+"""
+import argparse
+import json
+import math
+import os
+import re
+import threading
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from .agent_registry import agent_module
+
+LABELS = ("negative", "neutral", "positive")
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+DEFAULT_MODEL_PATH = os.path.join(DATA_DIR, "sentiment_model.json")
+DEFAULT_TRAIN_PATH = os.path.join(DATA_DIR, "sentiment_train.jsonl")
+
+# Lexicon polarity, -1 (negative) to 1 (positive); negation flips it
+LEXICON = {
+    "receptive": 1.0, "enthusiastic": 1.0, "impressed": 1.0, "interest": 0.6, "interested": 0.8,
+    "pleased": 1.0, "keen": 0.8, "appreciated": 0.8, "supportive": 1.0, "positive": 1.0, "happy": 1.0,
+    "committed": 0.6, "convincing": 0.8, "excited": 1.0, "thanked": 0.8, "satisfied": 1.0, "praised": 1.0,
+    "agreed": 0.6, "benefit": 0.6, "well": 0.4, "great": 1.0, "good": 0.8, "excellent": 1.0,
+    "skeptical": -1.0, "concerns": -0.8, "concerned": -0.8, "refused": -1.0, "dismissive": -1.0,
+    "complained": -1.0, "declined": -1.0, "frustrated": -1.0, "bad": -0.8, "unhappy": -1.0,
+    "rejected": -1.0, "annoyed": -1.0, "worried": -0.8, "unimpressed": -1.0, "competitor": -0.6,
+    "disappointed": -1.0, "hesitant": -0.8, "resistant": -0.8, "irritated": -1.0, "poor": -0.8,
+    "stopped": -0.6, "issues": -0.6, "negative": -1.0, "angry": -1.0, "toxicity": -0.6,
+}
+_NEGATIONS = {"not", "no", "never", "without", "didn't", "don't", "doesn't", "wasn't", "isn't", "hasn't", "won't"}
+# Tokens after a negation that are marked negated
+NEGATION_SCOPE = 3
+_TOKEN = re.compile(r"[a-z][a-z'-]*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased words; words shortly after a negation get a "not_" prefix"""
+    tokens, scope = [], 0
+    for word in _TOKEN.findall((text or "").lower()):
+        if word in _NEGATIONS:
+            scope = NEGATION_SCOPE
+            tokens.append(word)
+            continue
+        tokens.append(f"not_{word}" if scope else word)
+        scope = max(scope - 1, 0)
+    return tokens
+
+
+def lexicon_features(tokens: Sequence[str]) -> tuple:
+    """(positive, negative) lexicon mass, length-normalized"""
+    pos = neg = 0.0
+    for token in tokens:
+        negated = token.startswith("not_")
+        polarity = LEXICON.get(token[4:] if negated else token, 0.0)
+        if negated:
+            polarity = -polarity
+        if polarity > 0:
+            pos += polarity
+        else:
+            neg -= polarity
+    norm = math.sqrt(len(tokens)) or 1.0
+    return pos / norm, neg / norm
+
+
+class SentimentModel:
+    """
+    Multinomial logistic regression over binary bag-of-words plus two
+    lexicon features
+
+    score_batch() builds one (texts x features) matrix and scores every text
+    with a single matrix product.
+    """
+
+    def __init__(self, vocab: List[str], weights, bias):
+        self.vocab = list(vocab)
+        self.index = {word: i for i, word in enumerate(self.vocab)}
+        # (n_features, n_labels); the last two rows weight the lexicon features
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+
+    @property
+    def n_features(self) -> int:
+        return len(self.vocab) + 2
+
+    def features(self, texts: Sequence[str]) -> np.ndarray:
+        rows, cols, lexicon = [], [], np.zeros((len(texts), 2), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            for col in {self.index[t] for t in tokens if t in self.index}:
+                rows.append(row)
+                cols.append(col)
+            lexicon[row] = lexicon_features(tokens)
+        x = np.zeros((len(texts), self.n_features), dtype=np.float32)
+        x[rows, cols] = 1.0
+        x[:, -2:] = lexicon
+        return x
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        """(len(texts), 3) probabilities in LABELS order"""
+        if not len(texts):
+            return np.zeros((0, len(LABELS)), dtype=np.float32)
+        return _softmax(self.features(texts) @ self.weights + self.bias)
+
+    def score_batch(self, texts: Sequence[str]) -> List[dict]:
+        """The sentiment_analyzer result shape for each text"""
+        probs = self.predict_proba(texts)
+        best = probs.argmax(axis=1)
+        return [{"sentiment": LABELS[i], "confidence": round(float(p[i]), 4)} for i, p in zip(best, probs)]
+
+    def score(self, text: str) -> dict:
+        return self.score_batch([text])[0]
+
+    def to_dict(self) -> dict:
+        return {"labels": list(LABELS), "vocab": self.vocab,
+                "weights": np.round(self.weights, 5).tolist(), "bias": np.round(self.bias, 5).tolist()}
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_MODEL_PATH) -> "SentimentModel":
+        with open(path) as f:
+            data = json.load(f)
+        if tuple(data["labels"]) != LABELS:
+            raise ValueError(f"Sentiment model labels {data['labels']} do not match {LABELS}")
+        return cls(data["vocab"], data["weights"], data["bias"])
+
+    def save(self, path: str = DEFAULT_MODEL_PATH):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"))
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def train(texts: Sequence[str], labels: Sequence[str], min_count: int = 2, epochs: int = 300,
+          learning_rate: float = 0.5, l2: float = 1e-3) -> SentimentModel:
+    """Full-batch gradient descent; words seen fewer than min_count times are dropped"""
+    counts = {}
+    for text in texts:
+        for token in set(tokenize(text)):
+            counts[token] = counts.get(token, 0) + 1
+    vocab = sorted(t for t, c in counts.items() if c >= min_count)
+    model = SentimentModel(vocab, np.zeros((len(vocab) + 2, len(LABELS))), np.zeros(len(LABELS)))
+    x = model.features(texts)
+    y = np.zeros((len(texts), len(LABELS)), dtype=np.float32)
+    y[np.arange(len(texts)), [LABELS.index(label) for label in labels]] = 1.0
+    for _ in range(epochs):
+        grad = (_softmax(x @ model.weights + model.bias) - y) / len(texts)
+        model.weights -= learning_rate * (x.T @ grad + l2 * model.weights)
+        model.bias -= learning_rate * grad.sum(axis=0)
+    return model
+
+
+class SentimentBackend:
+    """
+    The local half of sentiment_analyzer, installed into the agent
+
+    Returns a result for the agent to use as-is, or None to let the LLM
+    decide (hybrid mode, low confidence).
+    """
+
+    def __init__(self, model: SentimentModel, mode: str = "hybrid", threshold: float = 0.65):
+        if mode not in ("local", "hybrid"):
+            raise ValueError(f"Unknown sentiment backend mode: {mode}")
+        self.model = model
+        self.mode = mode
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.counts = {"local": 0, "deferred_to_llm": 0}
+
+    def __call__(self, text: str) -> Optional[dict]:
+        result = self.model.score(text)
+        local = self.mode == "local" or result["confidence"] >= self.threshold
+        with self._lock:
+            self.counts["local" if local else "deferred_to_llm"] += 1
+        return result if local else None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+        total = counts["local"] + counts["deferred_to_llm"]
+        counts["local_rate"] = round(counts["local"] / total, 4) if total else 0.0
+        return counts
+
+
+# Process-wide backend, set up by configure_from_env() at startup
+_backend: Optional[SentimentBackend] = None
+_model: Optional[SentimentModel] = None
+_model_lock = threading.Lock()
+
+
+def get_model() -> SentimentModel:
+    """The installed backend's model, else the shipped artifact (loaded once)"""
+    global _model
+    if _backend is not None:
+        return _backend.model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = SentimentModel.load(os.getenv("SENTIMENT_MODEL_PATH") or DEFAULT_MODEL_PATH)
+    return _model
+
+
+def score_batch(texts: Sequence[str]) -> List[dict]:
+    return get_model().score_batch(texts)
+
+
+def install(backend: SentimentBackend):
+    global _backend
+    _backend = backend
+    agent_module.set_sentiment_backend(backend)
+
+
+def uninstall():
+    global _backend
+    agent_module.set_sentiment_backend(None)
+    _backend = None
+
+
+def configure_from_env():
+    """
+    SENTIMENT_BACKEND: llm (default), local or hybrid
+    SENTIMENT_LLM_THRESHOLD: hybrid mode asks the LLM below this confidence (default 0.65)
+    SENTIMENT_MODEL_PATH: model artifact (default: the shipped data/sentiment_model.json)
+    """
+    mode = os.getenv("SENTIMENT_BACKEND", "llm").lower()
+    if mode == "llm":
+        return
+    install(SentimentBackend(
+        SentimentModel.load(os.getenv("SENTIMENT_MODEL_PATH") or DEFAULT_MODEL_PATH),
+        mode=mode,
+        threshold=float(os.getenv("SENTIMENT_LLM_THRESHOLD", "0.65")),
+    ))
+
+
+def stats() -> dict:
+    if _backend is None:
+        return {"backend": "llm"}
+    return {"backend": _backend.mode, "threshold": _backend.threshold, **_backend.snapshot()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local sentiment model")
+    parser.add_argument("--data", default=DEFAULT_TRAIN_PATH, help="JSONL with text and label")
+    parser.add_argument("--out", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with open(args.data) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    split = int(len(rows) * (1 - args.holdout))
+    texts, labels = [r["text"] for r in rows], [r["label"] for r in rows]
+    held_out = train(texts[:split], labels[:split])
+    predicted = [r["sentiment"] for r in held_out.score_batch(texts[split:])]
+    accuracy = sum(p == y for p, y in zip(predicted, labels[split:])) / max(len(predicted), 1)
+    print(f"holdout accuracy {accuracy:.3f} on {len(predicted)} examples")
+
+    model = train(texts, labels)
+    model.save(args.out)
+    print(f"saved {args.out}: {len(model.vocab)} words, {os.path.getsize(args.out) / 1024:.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
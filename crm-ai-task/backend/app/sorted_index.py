@@ -0,0 +1,129 @@
+"""
+Sorted key index for keyset pagination in the in-memory store
+"""
+import bisect
+from typing import Iterator, List, Tuple
+
+# Sublists are split once they grow past twice this size
+LOAD = 1000
+
+
+class SortedIndex:
+    """
+    Sorted collection of comparable keys (e.g. (timestamp, id) tuples)
+
+    Keys live in a list of sorted sublists, so inserts and removes move at
+    most ~2*LOAD pointers instead of shifting one big list, and a range scan
+    starts with two bisects wherever the cursor points. Page N of a listing
+    therefore costs the same as page 1.
+
+    Writes are copy-on-write: a mutation builds new outer lists and a new
+    copy of the one sublist it touches, then publishes them with a single
+    attribute assignment. Readers iterate whatever state they started with,
+    so they need no lock. Writers must be serialized by the caller.
+    """
+
+    def __init__(self):
+        # (sublists, max key of each sublist), replaced as a unit
+        self._state: Tuple[List[list], list] = ([], [])
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def clear(self):
+        self.__init__()
+
+    def update(self, keys):
+        """Add many keys at once: one sort instead of an insort per key"""
+        merged = [k for sub in self._state[0] for k in sub]
+        merged.extend(keys)
+        merged.sort()
+        lists = [merged[i:i + LOAD] for i in range(0, len(merged), LOAD)]
+        self._state = (lists, [sub[-1] for sub in lists])
+        self._len = len(merged)
+
+    def add(self, key):
+        lists, maxes = self._state
+        if not lists:
+            self._state = ([[key]], [key])
+            self._len = 1
+            return
+        pos = bisect.bisect_left(maxes, key)
+        if pos == len(maxes):
+            pos -= 1
+        sub = list(lists[pos])
+        bisect.insort(sub, key)
+        if len(sub) > 2 * LOAD:
+            parts = [sub[:LOAD], sub[LOAD:]]
+        else:
+            parts = [sub]
+        self._state = (lists[:pos] + parts + lists[pos + 1:],
+                       maxes[:pos] + [p[-1] for p in parts] + maxes[pos + 1:])
+        self._len += 1
+
+    def remove(self, key):
+        """Remove one occurrence of key; missing keys are ignored"""
+        lists, maxes = self._state
+        pos = bisect.bisect_left(maxes, key)
+        if pos == len(maxes):
+            return
+        idx = bisect.bisect_left(lists[pos], key)
+        if idx == len(lists[pos]) or lists[pos][idx] != key:
+            return
+        sub = lists[pos][:idx] + lists[pos][idx + 1:]
+        parts = [sub] if sub else []
+        self._state = (lists[:pos] + parts + lists[pos + 1:],
+                       maxes[:pos] + [p[-1] for p in parts] + maxes[pos + 1:])
+        self._len -= 1
+
+    def irange(self, lo=None, hi=None, inclusive=(True, True), reverse: bool = False) -> Iterator:
+        """
+        Keys between lo and hi (None = unbounded) in ascending or descending order
+
+        Iteration is lazy, so callers that stop after a page touch only that page.
+        """
+        lists, maxes = self._state
+        if not lists:
+            return
+        if reverse:
+            yield from self._iter_desc(lists, maxes, lo, hi, inclusive)
+        else:
+            yield from self._iter_asc(lists, maxes, lo, hi, inclusive)
+
+    @staticmethod
+    def _iter_asc(lists, maxes, lo, hi, inclusive):
+        if lo is None:
+            pos, idx = 0, 0
+        else:
+            find = bisect.bisect_left if inclusive[0] else bisect.bisect_right
+            pos = find(maxes, lo)
+            if pos == len(maxes):
+                return
+            idx = find(lists[pos], lo)
+        for p in range(pos, len(lists)):
+            sub = lists[p]
+            for i in range(idx if p == pos else 0, len(sub)):
+                key = sub[i]
+                if hi is not None and (key > hi or (key == hi and not inclusive[1])):
+                    return
+                yield key
+
+    @staticmethod
+    def _iter_desc(lists, maxes, lo, hi, inclusive):
+        if hi is None:
+            pos = len(lists) - 1
+            idx = len(lists[pos])
+        else:
+            find = bisect.bisect_right if inclusive[1] else bisect.bisect_left
+            pos = find(maxes, hi)
+            if pos == len(maxes):
+                pos -= 1
+            idx = find(lists[pos], hi)
+        for p in range(pos, -1, -1):
+            sub = lists[p]
+            for i in range(idx - 1 if p == pos else len(sub) - 1, -1, -1):
+                key = sub[i]
+                if lo is not None and (key < lo or (key == lo and not inclusive[0])):
+                    return
+                yield key
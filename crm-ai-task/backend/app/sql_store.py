@@ -0,0 +1,371 @@
+"""
+SQLAlchemy storage backend over the models in models.py
+
+Selected with STORAGE_BACKEND=sql. Works against SQLite (e.g.
+DATABASE_URL=sqlite:///./crm.db) for local runs and Postgres in production.
+Interactions are loaded with selectinload so children cost one query per
+table, not per row, and child rows are written with executemany inserts.
+"""
+import os
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import delete, func, literal, or_, select, tuple_, update
+from sqlalchemy.orm import selectinload
+
+from . import models, schemas
+from .db import Base, SessionLocal, engine
+from .name_index import NameIndex, normalize_name
+from .pagination import to_naive_utc
+
+NAME = "sql"
+
+# Upper bound on HCP rows pulled from the database for ranking one search
+SEARCH_CANDIDATE_LIMIT = 1000
+
+_CHILD_OPTIONS = (
+    selectinload(models.Interaction.materials),
+    selectinload(models.Interaction.samples),
+    selectinload(models.Interaction.follow_ups),
+)
+
+# Interaction columns update_interaction may change
+_UPDATABLE = {"hcp_id", "rep_id", "mode", "datetime", "summary", "sentiment",
+              "topics", "outcome", "source_raw"}
+
+
+def init():
+    """Create missing tables unless DB_CREATE_TABLES=false (e.g. when migrations manage the schema)"""
+    if os.getenv("DB_CREATE_TABLES", "true").lower() not in ("0", "false", "no"):
+        Base.metadata.create_all(bind=engine)
+
+
+def close():
+    engine.dispose()
+
+
+def reset_store():
+    with SessionLocal.begin() as session:
+        for model in (models.FollowUp, models.Sample, models.MaterialShared,
+                      models.Interaction, models.HCP):
+            session.execute(delete(model))
+
+
+# Row -> dict conversion (same shapes as memory_store)
+
+def _hcp_dict(h: models.HCP) -> dict:
+    return {
+        "id": h.id,
+        "name": h.name,
+        "title": h.title,
+        "speciality": h.speciality,
+        "organisation": h.organisation,
+        "contact": h.contact,
+        "created_at": h.created_at,
+        "updated_at": h.updated_at
+    }
+
+
+def _interaction_dict(i: models.Interaction) -> dict:
+    return {
+        "id": i.id,
+        "hcp_id": i.hcp_id,
+        "rep_id": i.rep_id,
+        "mode": i.mode,
+        "datetime": i.datetime,
+        "summary": i.summary,
+        "sentiment": i.sentiment.value if i.sentiment else None,
+        "topics": i.topics,
+        "outcome": i.outcome,
+        "source_raw": i.source_raw,
+        "created_at": i.created_at,
+        "updated_at": i.updated_at,
+        "materials": [
+            {"id": m.id, "interaction_id": m.interaction_id, "material_type": m.material_type,
+             "quantity": m.quantity, "notes": m.notes}
+            for m in i.materials
+        ],
+        "samples": [
+            {"id": s.id, "interaction_id": s.interaction_id, "product_code": s.product_code,
+             "quantity": s.quantity, "lot": s.lot}
+            for s in i.samples
+        ],
+        "follow_ups": [
+            {"id": f.id, "interaction_id": f.interaction_id, "due_date": f.due_date,
+             "action_item": f.action_item, "owner": f.owner, "status": f.status}
+            for f in i.follow_ups
+        ]
+    }
+
+
+# HCP CRUD
+
+def get_hcp_by_id(hcp_id: str):
+    with SessionLocal() as session:
+        h = session.get(models.HCP, hcp_id)
+        return _hcp_dict(h) if h else None
+
+
+def search_hcp_by_name(name: str, limit: int = 10, min_score: float = 0.0):
+    """
+    Ranked name search
+
+    Candidates are fetched with ILIKE on each query token (and on its first
+    three letters, so misspellings still surface), then ranked with the same
+    NameIndex scoring the memory backend uses.
+    """
+    tokens = normalize_name(name)
+    if not tokens:
+        return []
+
+    patterns = set()
+    for token in tokens:
+        patterns.add(f"%{token}%")
+        if len(token) > 3:
+            patterns.add(f"%{token[:3]}%")
+
+    with SessionLocal() as session:
+        rows = session.scalars(
+            select(models.HCP)
+            .where(or_(*[models.HCP.name.ilike(p) for p in patterns]))
+            .limit(SEARCH_CANDIDATE_LIMIT)
+        ).all()
+
+    by_id = {h.id: h for h in rows}
+    index = NameIndex()
+    for h in rows:
+        index.add(h.id, h.name)
+    return [
+        {**_hcp_dict(by_id[hcp_id]), "score": score}
+        for hcp_id, score in index.search(name, limit=limit, min_score=min_score)
+    ]
+
+
+def _hcp_row(hcp_in: schemas.HCPCreate, now: datetime) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "name": hcp_in.name,
+        "title": hcp_in.title,
+        "speciality": hcp_in.speciality,
+        "organisation": hcp_in.organisation,
+        "contact": hcp_in.contact,
+        "created_at": now,
+        "updated_at": now
+    }
+
+
+def create_hcp(hcp_in: schemas.HCPCreate):
+    return bulk_create_hcps([hcp_in])[0]
+
+
+def _key_values(columns, values):
+    # Bind each cursor value with its column's type (ids are stored as hex on non-Postgres databases)
+    return tuple_(*[literal(v, c.type) for c, v in zip(columns, values)])
+
+
+def list_hcps(speciality: Optional[str] = None, organisation: Optional[str] = None,
+              after: Optional[tuple] = None, limit: int = 50):
+    """HCPs in name order, starting after the `after` key (served by ix_hcps_name_sort)"""
+    query = select(models.HCP)
+    if speciality:
+        query = query.where(func.lower(models.HCP.speciality) == speciality.lower())
+    if organisation:
+        query = query.where(func.lower(models.HCP.organisation) == organisation.lower())
+    if after is not None:
+        columns = (models.HCP.name, models.HCP.id)
+        query = query.where(tuple_(*columns) > _key_values(columns, after))
+    query = query.order_by(models.HCP.name, models.HCP.id).limit(limit)
+    with SessionLocal() as session:
+        return [_hcp_dict(h) for h in session.scalars(query)]
+
+
+def bulk_create_hcps(hcps_in: List[schemas.HCPCreate]):
+    now = datetime.utcnow()
+    rows = [_hcp_row(h, now) for h in hcps_in]
+    if rows:
+        with SessionLocal.begin() as session:
+            session.execute(models.HCP.__table__.insert(), rows)
+    return rows
+
+
+# Interaction CRUD
+
+def get_interaction(interaction_id: str):
+    with SessionLocal() as session:
+        inter = session.get(models.Interaction, interaction_id, options=_CHILD_OPTIONS)
+        return _interaction_dict(inter) if inter else None
+
+
+def _interactions_where(condition):
+    with SessionLocal() as session:
+        rows = session.scalars(
+            select(models.Interaction)
+            .where(condition)
+            .options(*_CHILD_OPTIONS)
+            .order_by(models.Interaction.created_at)
+        ).all()
+        return [_interaction_dict(i) for i in rows]
+
+
+def get_interactions_by_hcp(hcp_id: str):
+    return _interactions_where(models.Interaction.hcp_id == hcp_id)
+
+
+def get_interactions_by_rep(rep_id: str):
+    return _interactions_where(models.Interaction.rep_id == rep_id)
+
+
+def list_interactions(hcp_id: Optional[str] = None, rep_id: Optional[str] = None,
+                      sentiment: Optional[str] = None, mode: Optional[str] = None,
+                      date_from: Optional[datetime] = None, date_to: Optional[datetime] = None,
+                      after: Optional[tuple] = None, limit: int = 50, descending: bool = True):
+    """
+    One page of interactions in (timestamp, id) order, starting after the `after` key
+
+    The cursor becomes a row-value comparison, so the database seeks into the
+    (hcp_id|rep_id, sort_at, id) index instead of skipping an OFFSET.
+    """
+    sort_at, inter_id = models.interaction_sort_at, models.Interaction.id
+    query = select(models.Interaction).options(*_CHILD_OPTIONS)
+    if hcp_id is not None:
+        query = query.where(models.Interaction.hcp_id == hcp_id)
+    if rep_id is not None:
+        query = query.where(models.Interaction.rep_id == rep_id)
+    if sentiment is not None:
+        query = query.where(models.Interaction.sentiment == models.SentimentEnum(sentiment))
+    if mode is not None:
+        query = query.where(models.Interaction.mode == mode)
+    if date_from is not None:
+        query = query.where(sort_at >= date_from)
+    if date_to is not None:
+        query = query.where(sort_at <= date_to)
+    if after is not None:
+        key, cursor = tuple_(sort_at, inter_id), _key_values((sort_at, inter_id), after)
+        query = query.where(key < cursor if descending else key > cursor)
+    if descending:
+        query = query.order_by(sort_at.desc(), inter_id.desc())
+    else:
+        query = query.order_by(sort_at, inter_id)
+
+    with SessionLocal() as session:
+        return [_interaction_dict(i) for i in session.scalars(query.limit(limit))]
+
+
+def _material_row(interaction_id: str, m: schemas.MaterialSharedCreate) -> dict:
+    return {"id": str(uuid.uuid4()), "interaction_id": interaction_id, "material_type": m.material_type,
+            "quantity": m.quantity, "notes": m.notes}
+
+
+def _sample_row(interaction_id: str, s: schemas.SampleCreate) -> dict:
+    return {"id": str(uuid.uuid4()), "interaction_id": interaction_id, "product_code": s.product_code,
+            "quantity": s.quantity, "lot": s.lot}
+
+
+def _follow_up_row(interaction_id: str, f: schemas.FollowUpCreate) -> dict:
+    return {"id": str(uuid.uuid4()), "interaction_id": interaction_id, "due_date": to_naive_utc(f.due_date),
+            "action_item": f.action_item, "owner": f.owner, "status": f.status or "open"}
+
+
+# Child table -> (model, row builder)
+_CHILD_TABLES = {
+    "materials": (models.MaterialShared, _material_row),
+    "samples": (models.Sample, _sample_row),
+    "follow_ups": (models.FollowUp, _follow_up_row),
+}
+
+
+def _build_rows(interaction_in: schemas.InteractionCreate, now: datetime):
+    """Row dicts for one interaction and its children, plus the API-shaped result"""
+    interaction_id = str(uuid.uuid4())
+    inter = {
+        "id": interaction_id,
+        "hcp_id": interaction_in.hcp_id,
+        "rep_id": interaction_in.rep_id,
+        "mode": interaction_in.mode or "conversational",
+        "datetime": to_naive_utc(interaction_in.datetime),
+        "summary": interaction_in.summary,
+        "sentiment": interaction_in.sentiment.value if interaction_in.sentiment else None,
+        "topics": interaction_in.topics,
+        "outcome": interaction_in.outcome,
+        "source_raw": interaction_in.source_raw,
+        "created_at": now,
+        "updated_at": now
+    }
+    materials = [_material_row(interaction_id, m) for m in interaction_in.materials or []]
+    samples = [_sample_row(interaction_id, s) for s in interaction_in.samples or []]
+    follow_ups = [_follow_up_row(interaction_id, f) for f in interaction_in.follow_ups or []]
+    result = {**inter, "materials": materials, "samples": samples, "follow_ups": follow_ups}
+    return inter, materials, samples, follow_ups, result
+
+
+def _insert_rows(session, interactions, materials, samples, follow_ups):
+    # One executemany per table, through Core to skip per-row ORM bookkeeping
+    for model, rows in ((models.Interaction, interactions), (models.MaterialShared, materials),
+                        (models.Sample, samples), (models.FollowUp, follow_ups)):
+        if rows:
+            session.execute(model.__table__.insert(), rows)
+
+
+def create_interaction(interaction_in: schemas.InteractionCreate):
+    return bulk_create_interactions([interaction_in])[0]
+
+
+def bulk_create_interactions(interactions_in: List[schemas.InteractionCreate]):
+    now = datetime.utcnow()
+    interactions, materials, samples, follow_ups, results = [], [], [], [], []
+    for interaction_in in interactions_in:
+        inter, mats, samps, fus, result = _build_rows(interaction_in, now)
+        interactions.append(inter)
+        materials.extend(mats)
+        samples.extend(samps)
+        follow_ups.extend(fus)
+        results.append(result)
+
+    if interactions:
+        with SessionLocal.begin() as session:
+            _insert_rows(session, interactions, materials, samples, follow_ups)
+    return results
+
+
+def _coerce(key: str, value):
+    # DateTime columns drop the offset, so store UTC rather than shifted local times
+    if key == "datetime":
+        return to_naive_utc(value)
+    if key == "sentiment" and value is not None:
+        return models.SentimentEnum(value)
+    return value
+
+
+def _patch_children(session, interaction_id: str, model, build, child_patch):
+    """Apply a MaterialsPatch/SamplesPatch/FollowUpsPatch with one statement per operation"""
+    owned = model.interaction_id == interaction_id
+    if child_patch.replace:
+        session.execute(delete(model).where(owned))
+    elif child_patch.remove:
+        session.execute(delete(model).where(owned, model.id.in_(child_patch.remove)))
+    for item in child_patch.update:
+        values = item.model_dump(exclude_unset=True, exclude={"id"})
+        if "due_date" in values:
+            values["due_date"] = to_naive_utc(values["due_date"])
+        if values:
+            session.execute(update(model).where(owned, model.id == item.id).values(**values))
+    if child_patch.add:
+        session.execute(model.__table__.insert(), [build(interaction_id, item) for item in child_patch.add])
+
+
+def update_interaction(interaction_id: str, patch: dict):
+    with SessionLocal.begin() as session:
+        inter = session.get(models.Interaction, interaction_id)
+        if not inter:
+            return None
+        for k, v in patch.items():
+            if k in _UPDATABLE:
+                setattr(inter, k, _coerce(k, v))
+        inter.updated_at = datetime.utcnow()
+        for name, (model, build) in _CHILD_TABLES.items():
+            if patch.get(name) is not None:
+                _patch_children(session, interaction_id, model, build, patch[name])
+
+    # Return with related data
+    return get_interaction(interaction_id)
@@ -0,0 +1,63 @@
+"""
+Storage backend interface and selection
+
+A backend is any module (or object) providing the functions below. crud
+forwards every call to the active backend, chosen by STORAGE_BACKEND:
+
+- "memory" (default): app.memory_store, module-level dicts
+- "sql": app.sql_store, SQLAlchemy over DATABASE_URL (SQLite or Postgres)
+"""
+import importlib
+import os
+from datetime import datetime
+from typing import List, Optional, Protocol
+
+from . import schemas
+
+BACKENDS = {
+    "memory": ".memory_store",
+    "sql": ".sql_store",
+}
+
+
+class StorageBackend(Protocol):
+    def get_hcp_by_id(self, hcp_id: str) -> Optional[dict]: ...
+    def search_hcp_by_name(self, name: str, limit: int = 10, min_score: float = 0.0) -> List[dict]: ...
+    def create_hcp(self, hcp_in: schemas.HCPCreate) -> dict: ...
+    def bulk_create_hcps(self, hcps_in: List[schemas.HCPCreate]) -> List[dict]: ...
+    def list_hcps(self, speciality: Optional[str] = None, organisation: Optional[str] = None,
+                  after: Optional[tuple] = None, limit: int = 50) -> List[dict]: ...
+    def get_interaction(self, interaction_id: str) -> Optional[dict]: ...
+    def get_interactions_by_hcp(self, hcp_id: str) -> List[dict]: ...
+    def get_interactions_by_rep(self, rep_id: str) -> List[dict]: ...
+    def list_interactions(self, hcp_id: Optional[str] = None, rep_id: Optional[str] = None,
+                          sentiment: Optional[str] = None, mode: Optional[str] = None,
+                          date_from: Optional[datetime] = None, date_to: Optional[datetime] = None,
+                          after: Optional[tuple] = None, limit: int = 50,
+                          descending: bool = True) -> List[dict]: ...
+    def create_interaction(self, interaction_in: schemas.InteractionCreate) -> dict: ...
+    def bulk_create_interactions(self, interactions_in: List[schemas.InteractionCreate]) -> List[dict]: ...
+    def update_interaction(self, interaction_id: str, patch: dict) -> Optional[dict]: ...
+    def reset_store(self) -> None: ...
+
+
+def load_backend(name: str = None) -> StorageBackend:
+    """
+    Import and initialise a storage backend
+
+    Args:
+        name: Key of BACKENDS; defaults to STORAGE_BACKEND (or "memory")
+    """
+    name = name or os.getenv("STORAGE_BACKEND", "memory")
+    if name not in BACKENDS:
+        raise ValueError(f"STORAGE_BACKEND must be one of {sorted(BACKENDS)}, got {name!r}")
+    backend = importlib.import_module(BACKENDS[name], __package__)
+    if hasattr(backend, "init"):
+        backend.init()
+    return backend
+
+
+def close_backend(backend: StorageBackend):
+    """Flush and release a backend's resources (journal, connection pool)"""
+    if hasattr(backend, "close"):
+        backend.close()
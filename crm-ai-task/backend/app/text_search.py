@@ -0,0 +1,532 @@
+"""
+Full-text search over interaction summaries, outcomes and raw notes
+
+An inverted index maps each term of summary + outcome + source_raw
+(lowercased, stopwords dropped, light suffix stripping so "dosing" finds
+"dose" and "doses") to a posting list of integer doc ids and term
+frequencies, held in array("I") / array("H") pairs. Doc ids index parallel
+per-document arrays (length, date, updated_at, hcp and rep codes), so a
+document costs a few dozen bytes besides its postings.
+
+Queries are ranked with BM25 (k1=1.2, b=0.75). Scores, filters by
+hcp/rep/date and the top-k selection run in numpy over the posting arrays,
+so latency depends on how many documents contain the query terms, not on
+how many interactions exist.
+
+A crud change listener keeps the index current. An edit that changes the
+text marks the old doc id deleted and appends the document under a new id
+(posting lists stay sorted by id with plain appends); an edit that only
+changes the hcp, rep or date updates those arrays in place. Like Lucene,
+deleted documents still count toward term document frequencies until the
+index is compacted, which happens once they outnumber the live ones.
+
+With SEARCH_INDEX_PATH set, the index is saved there (pickled, written
+atomically) on shutdown and every SEARCH_INDEX_SAVE_INTERVAL seconds while
+it has changes, and loaded at startup instead of re-tokenizing every
+interaction. A background pass then compares each stored interaction's
+updated_at with the saved one and re-indexes only what changed while the
+index was not running.
+"""
+import logging
+import math
+import os
+import pickle
+import re
+import threading
+import time
+from array import array
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import crud
+from .journal import gc_paused
+from .pagination import decode_score_cursor, encode_cursor, to_naive_utc
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("summary", "outcome", "source_raw")
+K1 = 1.2
+B = 0.75
+MAX_TF = 65535
+# Compact once there are this many deleted documents and more deleted than live ones
+COMPACT_MIN_DELETED = 1000
+# Bumped whenever the saved layout changes; older files are ignored and rebuilt
+FORMAT_VERSION = 1
+
+_TOKEN = re.compile(r"[0-9a-z]+")
+STOPWORDS = frozenset("""
+a about after all also an and any are as at be been but by can could did do does for from had has have he her
+him his how i if in into is it its me my no not of on or our she so than that the their them then there these
+they this to up us was we were what when where which who will with would you your
+""".split())
+_EPOCH = datetime(1970, 1, 1)
+
+
+def stem(token: str) -> str:
+    """Light suffix stripping: studies -> study, dosing/doses/dosed/dose -> dos, concerns -> concern"""
+    if len(token) <= 3 or token.isdigit():
+        return token
+    if token.endswith("ies") and len(token) > 4:
+        return token[:-3] + "y"
+    for suffix in ("ing", "ed", "es", "s"):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            if suffix == "s" and token.endswith(("ss", "us", "is")):
+                break
+            token = token[:-len(suffix)]
+            break
+    return token[:-1] if token.endswith("e") and len(token) > 3 else token
+
+
+# token -> stem ("" for stopwords); notes reuse a small vocabulary, so most lookups hit
+_stems: Dict[str, str] = {}
+STEM_CACHE_SIZE = 200000
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    stems = _stems
+    if len(stems) > STEM_CACHE_SIZE:
+        stems.clear()
+    result = []
+    for token in _TOKEN.findall((text or "").lower()):
+        stemmed = stems.get(token)
+        if stemmed is None:
+            stemmed = stems[token] = "" if token in STOPWORDS else stem(token)
+        if stemmed:
+            result.append(stemmed)
+    return result
+
+
+def _text(inter: dict) -> str:
+    return "\n".join(inter.get(field) or "" for field in FIELDS)
+
+
+def _timestamp(value) -> float:
+    value = to_naive_utc(value)
+    return (value - _EPOCH).total_seconds() if value is not None else 0.0
+
+
+def _from_numpy(typecode: str, values: np.ndarray) -> array:
+    result = array(typecode)
+    result.frombytes(values.tobytes())
+    return result
+
+
+class SearchIndex:
+    """Inverted index with array-backed postings over integer doc ids"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids: List[Optional[str]] = []
+        self._docs: Dict[str, int] = {}
+        self._lengths = array("I")
+        self._times = array("d")
+        self._updated = array("d")
+        self._hcps = array("I")
+        self._reps = array("I")
+        self._live = bytearray()
+        # hcp/rep id -> code in _hcps/_reps (0 = none)
+        self._codes: Dict[str, int] = {}
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._total_len = 0
+        self._deleted = 0
+        self.dirty = False
+        self.updates = 0
+        self.compactions = 0
+        self.rebuild_ms = 0.0
+        self.load_ms = 0.0
+        self.last_save: Optional[dict] = None
+        self.last_verify: Optional[dict] = None
+
+    def _code(self, value: Optional[str]) -> int:
+        if not value:
+            return 0
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self._codes) + 1
+        return code
+
+    def _add(self, inter: dict, counts: Counter, length: int):
+        """Append a document; caller holds _lock"""
+        docid = len(self._ids)
+        self._ids.append(inter["id"])
+        self._docs[inter["id"]] = docid
+        self._lengths.append(length)
+        self._times.append(_timestamp(inter.get("datetime") or inter["created_at"]))
+        self._updated.append(_timestamp(inter.get("updated_at")))
+        self._hcps.append(self._code(inter.get("hcp_id")))
+        self._reps.append(self._code(inter.get("rep_id")))
+        self._live.append(1)
+        self._total_len += length
+        postings = self._postings
+        for term, tf in counts.items():
+            posting = postings.get(term)
+            if posting is None:
+                posting = postings[term] = (array("I"), array("H"))
+            posting[0].append(docid)
+            posting[1].append(tf if tf < MAX_TF else MAX_TF)
+
+    def _remove(self, docid: int):
+        """Mark a document deleted; caller holds _lock"""
+        del self._docs[self._ids[docid]]
+        self._ids[docid] = None
+        self._live[docid] = 0
+        self._total_len -= self._lengths[docid]
+        self._deleted += 1
+
+    def _set_meta(self, docid: int, inter: dict):
+        self._times[docid] = _timestamp(inter.get("datetime") or inter["created_at"])
+        self._updated[docid] = _timestamp(inter.get("updated_at"))
+        self._hcps[docid] = self._code(inter.get("hcp_id"))
+        self._reps[docid] = self._code(inter.get("rep_id"))
+
+    @staticmethod
+    def _analyze(inter: dict) -> Tuple[Counter, int]:
+        tokens = tokenize(_text(inter))
+        return Counter(tokens), len(tokens)
+
+    def apply(self, old: Optional[dict], new: Optional[dict]):
+        """crud listener: re-index an interaction whose text changed, or update its filters in place"""
+        if old is None and new is None:
+            self.clear()
+            return
+        same_text = old is not None and new is not None and _text(old) == _text(new)
+        analyzed = self._analyze(new) if new is not None and not same_text else None
+        with self._lock:
+            docid = self._docs.get((new or old)["id"])
+            if same_text and docid is not None:
+                self._set_meta(docid, new)
+            else:
+                if docid is not None:
+                    self._remove(docid)
+                if new is not None:
+                    self._add(new, *(analyzed or self._analyze(new)))
+            self.updates += 1
+            self.dirty = True
+            self._maybe_compact()
+
+    def clear(self):
+        with self._lock:
+            self._ids, self._docs, self._codes, self._postings = [], {}, {}, {}
+            self._lengths, self._hcps, self._reps = array("I"), array("I"), array("I")
+            self._times, self._updated = array("d"), array("d")
+            self._live = bytearray()
+            self._total_len = self._deleted = 0
+            self.dirty = True
+
+    def rebuild(self, interactions):
+        """Index from scratch (e.g. every interaction in the store at startup)"""
+        start = time.perf_counter()
+        self.clear()
+        with gc_paused():
+            for inter in interactions:
+                analyzed = self._analyze(inter)
+                with self._lock:
+                    if inter["id"] not in self._docs:
+                        self._add(inter, *analyzed)
+        self.rebuild_ms = (time.perf_counter() - start) * 1000
+
+    def _maybe_compact(self):
+        if self._deleted >= COMPACT_MIN_DELETED and self._deleted > len(self._docs):
+            self._compact()
+
+    def _compact(self):
+        """Drop deleted documents and renumber the rest in order; caller holds _lock"""
+        live = np.frombuffer(self._live, dtype=np.uint8).astype(bool)
+        remap = (np.cumsum(live) - 1).astype(np.uint32)
+        postings = {}
+        for term, (ids, tfs) in self._postings.items():
+            ids_np = np.frombuffer(ids, dtype=np.uint32)
+            keep = live[ids_np]
+            if keep.any():
+                postings[term] = (_from_numpy("I", remap[ids_np[keep]]),
+                                  _from_numpy("H", np.frombuffer(tfs, dtype=np.uint16)[keep]))
+            del ids_np
+        for name, typecode, dtype in (("_lengths", "I", np.uint32), ("_times", "d", np.float64),
+                                      ("_updated", "d", np.float64), ("_hcps", "I", np.uint32),
+                                      ("_reps", "I", np.uint32)):
+            setattr(self, name, _from_numpy(typecode, np.frombuffer(getattr(self, name), dtype=dtype)[live]))
+        del live
+        self._postings = postings
+        self._ids = [doc_id for doc_id in self._ids if doc_id is not None]
+        self._docs = {doc_id: docid for docid, doc_id in enumerate(self._ids)}
+        self._live = bytearray(b"\x01" * len(self._ids))
+        self._deleted = 0
+        self.compactions += 1
+
+    def compact(self):
+        with self._lock:
+            if self._deleted:
+                self._compact()
+
+    def search(self, query: str, hcp_id: Optional[str] = None, rep_id: Optional[str] = None,
+               date_from: Optional[datetime] = None, date_to: Optional[datetime] = None,
+               cursor: Optional[str] = None, limit: int = 20) -> dict:
+        """
+        Interactions matching any query term, best BM25 score first
+
+        Filters are exact hcp_id / rep_id and an inclusive range on the
+        interaction's datetime (created_at when unset). Returns {"items":
+        [{"id", "score"}], "total", "next_cursor"}; pass next_cursor back as
+        cursor with the same query and filters for the next page. Raises
+        ValueError for a cursor we did not issue.
+        """
+        after = decode_score_cursor(cursor) if cursor else None
+        terms = set(tokenize(query))
+        with self._lock:
+            hits, total = self._rank(terms, hcp_id, rep_id, date_from, date_to, after, limit + 1)
+        next_cursor = encode_cursor(list(hits[limit - 1][::-1])) if len(hits) > limit else None
+        return {"items": [{"id": doc_id, "score": round(score, 4)} for doc_id, score in hits[:limit]],
+                "total": total, "next_cursor": next_cursor}
+
+    def _rank(self, terms, hcp_id, rep_id, date_from, date_to, after, k) -> Tuple[List[Tuple[str, float]], int]:
+        """
+        Top k (id, score) after the cursor, and the number of matches; caller holds _lock
+
+        The numpy views of the arrays go away when this returns, before the
+        lock is released (an array can't grow while a view of it exists).
+        """
+        if not terms or not self._docs:
+            return [], 0
+        codes = []
+        for value in (hcp_id, rep_id):
+            if value is not None and value not in self._codes:
+                return [], 0
+            codes.append(self._codes.get(value))
+        docs = len(self._ids)
+        avgdl = self._total_len / len(self._docs) or 1.0
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+        scores = np.zeros(docs)
+        matched = np.zeros(docs, dtype=bool)
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            ids = np.frombuffer(posting[0], dtype=np.uint32)
+            tf = np.frombuffer(posting[1], dtype=np.uint16).astype(np.float64)
+            idf = math.log(1 + (docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            scores[ids] += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * lengths[ids] / avgdl))
+            matched[ids] = True
+        matched &= np.frombuffer(self._live, dtype=np.bool_)
+        cand = np.flatnonzero(matched)
+        keep = np.ones(len(cand), dtype=bool)
+        for column, code in ((self._hcps, codes[0]), (self._reps, codes[1])):
+            if code is not None:
+                keep &= np.frombuffer(column, dtype=np.uint32)[cand] == code
+        if date_from is not None or date_to is not None:
+            times = np.frombuffer(self._times, dtype=np.float64)[cand]
+            if date_from is not None:
+                keep &= times >= _timestamp(date_from)
+            if date_to is not None:
+                keep &= times <= _timestamp(date_to)
+        cand = cand[keep]
+        total = len(cand)
+        cand_scores = scores[cand]
+        if after is not None:
+            # Ties are ordered by doc id; an id no longer indexed skips the rest of its tie
+            last_doc = self._docs.get(after[1], docs)
+            later = (cand_scores < after[0]) | ((cand_scores == after[0]) & (cand > last_doc))
+            cand, cand_scores = cand[later], cand_scores[later]
+        if len(cand) > k:
+            threshold = np.partition(cand_scores, len(cand) - k)[len(cand) - k]
+            top = cand_scores >= threshold
+            cand, cand_scores = cand[top], cand_scores[top]
+        order = np.lexsort((cand, -cand_scores))[:k]
+        hits = [(self._ids[d], s) for d, s in zip(cand[order].tolist(), cand_scores[order].tolist())]
+        return hits, total
+
+    def _state(self) -> dict:
+        """Copy of everything save() writes; caller holds _lock"""
+        return {
+            "version": FORMAT_VERSION, "backend": crud.backend_name(), "saved_at": time.time(),
+            "ids": list(self._ids), "lengths": self._lengths[:], "times": self._times[:],
+            "updated": self._updated[:], "hcps": self._hcps[:], "reps": self._reps[:], "live": bytes(self._live),
+            "codes": dict(self._codes), "total_len": self._total_len, "deleted": self._deleted,
+            "postings": {term: (ids[:], tfs[:]) for term, (ids, tfs) in self._postings.items()},
+        }
+
+    def save(self, path: str):
+        """Write the index to path atomically (temp file, fsync, rename)"""
+        start = time.perf_counter()
+        with self._lock:
+            state = self._state()
+            self.dirty = False
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(state, f, protocol=5)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        self.last_save = {"ms": round((time.perf_counter() - start) * 1000, 1), "bytes": os.path.getsize(path),
+                          "at": time.time()}
+
+    @classmethod
+    def load(cls, path: str) -> "SearchIndex":
+        """Read an index written by save(); raises ValueError when it is from another format or backend"""
+        start = time.perf_counter()
+        with gc_paused(), open(path, "rb") as f:
+            state = pickle.load(f)
+        if not isinstance(state, dict) or state.get("version") != FORMAT_VERSION:
+            raise ValueError("Search index file has an unsupported format")
+        if state["backend"] != crud.backend_name():
+            raise ValueError(f"Search index file was built from the {state['backend']} backend")
+        index = cls()
+        index._ids = state["ids"]
+        index._docs = {doc_id: docid for docid, doc_id in enumerate(state["ids"]) if doc_id is not None}
+        index._lengths, index._times, index._updated = state["lengths"], state["times"], state["updated"]
+        index._hcps, index._reps = state["hcps"], state["reps"]
+        index._live = bytearray(state["live"])
+        index._codes, index._postings = state["codes"], state["postings"]
+        index._total_len, index._deleted = state["total_len"], state["deleted"]
+        index.load_ms = (time.perf_counter() - start) * 1000
+        return index
+
+    def verify(self, source) -> dict:
+        """
+        Catch up with the store after loading a saved index
+
+        source is a callable returning every interaction (e.g.
+        crud.iter_interactions). Interactions that are new, or were updated
+        after the saved copy, are re-indexed; indexed ones that are no
+        longer stored are deleted. Writes seen by the listener meanwhile
+        are never rolled back: only a strictly newer updated_at replaces
+        a document, and documents written since the pass started are never
+        deleted.
+        """
+        start = time.perf_counter()
+        started = _timestamp(datetime.utcnow())
+        seen, reindexed = set(), 0
+        for inter in source():
+            seen.add(inter["id"])
+            updated = _timestamp(inter.get("updated_at"))
+            with self._lock:
+                docid = self._docs.get(inter["id"])
+                if docid is not None and self._updated[docid] >= updated:
+                    continue
+            analyzed = self._analyze(inter)
+            with self._lock:
+                docid = self._docs.get(inter["id"])
+                if docid is not None:
+                    if self._updated[docid] >= updated:
+                        continue
+                    self._remove(docid)
+                self._add(inter, *analyzed)
+                self.dirty = True
+            reindexed += 1
+        with self._lock:
+            gone = [docid for doc_id, docid in self._docs.items()
+                    if doc_id not in seen and self._updated[docid] < started]
+            for docid in gone:
+                self._remove(docid)
+            if gone:
+                self.dirty = True
+            self._maybe_compact()
+        self.last_verify = {"checked": len(seen), "reindexed": reindexed, "removed": len(gone),
+                            "ms": round((time.perf_counter() - start) * 1000, 1), "at": time.time()}
+        return self.last_verify
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            postings = sum(len(ids) for ids, _ in self._postings.values())
+            arrays = sum(a.itemsize * len(a) for a in (self._lengths, self._times, self._updated, self._hcps, self._reps))
+            return {
+                "documents": len(self._docs), "deleted": self._deleted, "terms": len(self._postings),
+                "postings": postings, "array_bytes": arrays + len(self._live) + postings * 6,
+                "updates": self.updates, "compactions": self.compactions, "rebuild_ms": round(self.rebuild_ms, 1),
+                "load_ms": round(self.load_ms, 1), "last_save": self.last_save, "last_verify": self.last_verify,
+            }
+
+
+# Process-wide index, set up by configure_from_env() at startup
+_index: Optional[SearchIndex] = None
+_path: Optional[str] = None
+_threads: List[threading.Thread] = []
+_stop = threading.Event()
+
+
+def _verify(index: SearchIndex):
+    try:
+        result = index.verify(crud.iter_interactions)
+        logger.info("Search index caught up with the store: %s", result)
+    except Exception:
+        logger.exception("Search index verification failed")
+
+
+def _save_every(index: SearchIndex, path: str, interval: float):
+    while not _stop.wait(interval):
+        if index.dirty:
+            try:
+                index.save(path)
+            except Exception:
+                logger.exception("Saving the search index failed")
+
+
+def _start(target, *args, name: str):
+    thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+    thread.start()
+    _threads.append(thread)
+
+
+def install(index: SearchIndex = None, rebuild: bool = True, path: Optional[str] = None,
+            save_interval: float = 0, verify: bool = True):
+    """
+    Load the index from path (or index every stored interaction), then
+    follow writes through a crud listener
+    """
+    global _index, _path
+    uninstall()
+    loaded = None
+    if index is None and path and os.path.exists(path):
+        try:
+            loaded = SearchIndex.load(path)
+        except Exception as e:
+            logger.warning("Rebuilding the search index, could not load %s: %s", path, e)
+    index = loaded or index or SearchIndex()
+    if loaded is None and rebuild:
+        index.rebuild(crud.iter_interactions())
+    crud.add_listener(index.apply)
+    _index, _path = index, path
+    _stop.clear()
+    if loaded is not None and verify:
+        _start(_verify, index, name="search-index-verify")
+    if path and save_interval > 0:
+        _start(_save_every, index, path, save_interval, name="search-index-save")
+
+
+def uninstall():
+    global _index, _path
+    _stop.set()
+    for thread in _threads:
+        thread.join()
+    _threads.clear()
+    if _index is not None:
+        crud.remove_listener(_index.apply)
+        if _path and _index.dirty:
+            _index.save(_path)
+    _index, _path = None, None
+
+
+def configure_from_env():
+    """
+    SEARCH_INDEX_ENABLED: maintain the full-text index (default true)
+    SEARCH_INDEX_PATH: file the index is saved to and loaded from (default unset = rebuilt on every start)
+    SEARCH_INDEX_SAVE_INTERVAL: seconds between saves while there are changes (default 300; 0 = only on shutdown)
+    SEARCH_INDEX_VERIFY: after loading, re-index what changed in the store in the background (default true)
+    """
+    if os.getenv("SEARCH_INDEX_ENABLED", "true").lower() in ("0", "false", "no"):
+        return
+    install(path=os.getenv("SEARCH_INDEX_PATH") or None,
+            save_interval=float(os.getenv("SEARCH_INDEX_SAVE_INTERVAL", "300")),
+            verify=os.getenv("SEARCH_INDEX_VERIFY", "true").lower() not in ("0", "false", "no"))
+
+
+def get_index() -> Optional[SearchIndex]:
+    return _index
+
+
+def stats() -> dict:
+    if _index is None:
+        return {"enabled": False}
+    return {"enabled": True, "path": _path, **_index.snapshot()}
@@ -0,0 +1,5 @@
+"""
+Offline benchmarks for the CRM backend
+
+Run from the backend directory, e.g. `python -m benchmarks.crud_lookup`.
+"""
@@ -0,0 +1,108 @@
+"""
+Dashboard queries from analytics rollups vs scanning every interaction
+
+Usage:
+    python -m benchmarks.analytics_rollups [--sizes 10000,100000] [--queries 200]
+
+For each store size, seeds interactions spread over 90 days, 50 reps and
+2000 HCPs on the in-memory backend, then times three dashboard queries
+("weekly sentiment trend for one HCP", "top topics this week",
+"interactions per rep today") answered from the rollups and by a scan
+over every stored interaction. Also reports the cost the rollup listener
+adds to create_interaction and update_interaction.
+"""
+import argparse
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from app import analytics, crud, memory_store, schemas
+from app.pagination import to_naive_utc
+
+TOPICS = ["efficacy", "dosing", "safety", "pricing", "access", "adherence", "side effects", "formulary"]
+END = datetime(2026, 6, 30)
+
+
+def seed(count: int, rng: random.Random) -> list:
+    hcps = [f"hcp-{i}" for i in range(2000)]
+    batch = [
+        schemas.InteractionCreate(
+            hcp_id=rng.choice(hcps), rep_id=f"rep-{rng.randrange(50)}",
+            datetime=END - timedelta(minutes=rng.randrange(90 * 24 * 60)),
+            sentiment=rng.choice(["positive", "neutral", "negative"]), topics=rng.sample(TOPICS, 2),
+            samples=[schemas.SampleCreate(product_code="ABC-10", quantity=rng.randint(1, 4))],
+        )
+        for _ in range(count)
+    ]
+    return crud.bulk_create_interactions(batch)
+
+
+def scan_queries(hcp_id: str, week_start, today):
+    """The three dashboard answers from a pass over every stored record"""
+    trend, topics, per_rep = Counter(), Counter(), Counter()
+    for inter in memory_store._interactions.values():
+        day = to_naive_utc(inter.datetime or inter.created_at).date()
+        if inter.hcp_id == hcp_id:
+            trend[(analytics.bucket_start(day, "week"), inter.sentiment)] += 1
+        if day >= week_start:
+            topics.update(inter.topics or ())
+        if day == today:
+            per_rep[inter.rep_id] += 1
+    return trend, topics.most_common(10), per_rep.most_common(50)
+
+
+def rollup_queries(rollups: analytics.Rollups, hcp_id: str, week_start, today):
+    start, end = analytics.default_range("week", today)
+    return (rollups.trend("hcp", hcp_id, "week", start, end),
+            rollups.top_topics("all", "", "week", week_start, today),
+            rollups.breakdown("rep", "day", today))
+
+
+def per_call_us(fn, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def write_cost(rng: random.Random, ids: list, calls: int) -> tuple:
+    """(create us, update us) per call"""
+    item = schemas.InteractionCreate(rep_id="rep-1", hcp_id="hcp-1", sentiment="positive", topics=["efficacy"])
+    create_us = per_call_us(lambda: crud.create_interaction(item), calls)
+    update_us = per_call_us(lambda: crud.update_interaction(rng.choice(ids), {"sentiment": rng.choice(["positive", "negative"]),
+                                                                               "topics": rng.sample(TOPICS, 2)}), calls)
+    return create_us, update_us
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--queries", type=int, default=200, help="rollup queries timed per size")
+    args = parser.parse_args()
+
+    crud.set_backend(memory_store)
+    today = END.date()
+    week_start = analytics.bucket_start(today, "week")
+    print(f"{'interactions':>12} {'scan ms':>9} {'rollups us':>11} {'create us off/on':>17} {'update us off/on':>17}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        rng = random.Random(5)
+        analytics.uninstall()
+        memory_store.reset_store()
+        ids = [i["id"] for i in seed(size, rng)]
+        off = write_cost(rng, ids, 2000)
+
+        analytics.install()
+        rollups = analytics.get_rollups()
+        hcp_id = memory_store._interactions[ids[0]].hcp_id
+        on = write_cost(rng, ids, 2000)
+
+        scan_ms = per_call_us(lambda: scan_queries(hcp_id, week_start, today), 3) / 1000
+        rollup_us = per_call_us(lambda: rollup_queries(rollups, hcp_id, week_start, today), args.queries)
+        print(f"{size:>12} {scan_ms:>9.1f} {rollup_us:>11.1f} {off[0]:>8.1f}/{on[0]:<8.1f} {off[1]:>8.1f}/{on[1]:<8.1f}")
+        print(f"{'':>12} rebuild at startup: {rollups.rebuild_ms:.0f} ms")
+    analytics.uninstall()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,68 @@
+"""
+Import throughput: POST /api/interactions/import vs one POST per record
+
+Usage:
+    python -m benchmarks.bulk_import [--rows 50000] [--chunk-size 5000] [--single 2000]
+
+Runs against whichever backend STORAGE_BACKEND selects (e.g. STORAGE_BACKEND=sql
+DATABASE_URL=sqlite:///./bench.db). Every 100th record is invalid to exercise
+per-row error reporting.
+"""
+import argparse
+import json
+import time
+
+from fastapi.testclient import TestClient
+
+from app import crud
+from app.main import app
+
+
+def make_records(n: int, hcp_id: str) -> list:
+    records = []
+    for i in range(n):
+        records.append({
+            "hcp_id": hcp_id,
+            "rep_id": f"rep_{i % 100}",
+            "datetime": "2024-05-01T10:00:00",
+            "summary": "Discussed product efficacy",
+            "sentiment": "bogus" if i % 100 == 99 else "positive",
+            "materials": [{"material_type": "brochure", "quantity": 2}],
+            "samples": [{"product_code": "ABC-10", "quantity": 1, "lot": "L1"}],
+            "follow_ups": [{"action_item": "Send study data"}],
+        })
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--single", type=int, default=2000, help="records sent one POST each, for comparison")
+    args = parser.parse_args()
+
+    with TestClient(app) as client:
+        crud.reset_store()
+        hcp_id = client.post("/api/hcps", json={"name": "Dr. Bench"}).json()["id"]
+
+        single = [r for r in make_records(args.single, hcp_id) if r["sentiment"] != "bogus"]
+        start = time.perf_counter()
+        for record in single:
+            client.post("/api/interactions", json=record)
+        single_rate = len(single) / (time.perf_counter() - start)
+
+        body = "\n".join(json.dumps(r) for r in make_records(args.rows, hcp_id)).encode()
+        start = time.perf_counter()
+        report = client.post("/api/interactions/import", content=body,
+                             params={"chunk_size": args.chunk_size},
+                             headers={"content-type": "application/x-ndjson"}).json()
+        bulk_rate = report["imported"] / (time.perf_counter() - start)
+
+    print(f"backend: {crud.backend_name()}")
+    print(f"one POST per record: {single_rate:>9.0f} rows/s")
+    print(f"bulk import:         {bulk_rate:>9.0f} rows/s "
+          f"(imported {report['imported']}, failed {report['failed']}, chunks {report['chunks']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Lookup cost of the in-memory store as the number of interactions grows
+
+Usage:
+    python -m benchmarks.crud_lookup [--sizes 1000,10000,100000,1000000] [--lookups 10000]
+
+get_interaction and the hcp/rep lookups go through the secondary indexes, so
+the per-call cost should stay flat from 1k to 1M interactions. The listing
+columns time a 50-row page of list_interactions at the start and from a cursor
+in the middle of the data; keyset pagination makes both cost the same.
+"""
+import argparse
+import random
+import time
+
+from app import crud, pagination, schemas
+
+
+def populate(n: int, hcp_count: int = 1000, rep_count: int = 100):
+    crud.reset_store()
+    hcp_ids = [crud.create_hcp(schemas.HCPCreate(name=f"Dr. Bench {i}"))["id"] for i in range(hcp_count)]
+    ids = []
+    for i in range(n):
+        inter = crud.create_interaction(schemas.InteractionCreate(
+            hcp_id=hcp_ids[i % hcp_count],
+            rep_id=f"rep_{i % rep_count}",
+            summary="Discussed product efficacy",
+            materials=[schemas.MaterialSharedCreate(material_type="brochure", quantity=2)],
+            samples=[schemas.SampleCreate(product_code="ABC-10", quantity=1)],
+            follow_ups=[schemas.FollowUpCreate(action_item="Send study data")],
+        ))
+        ids.append(inter["id"])
+    return ids, hcp_ids
+
+
+def time_per_call(fn, args) -> float:
+    start = time.perf_counter()
+    for a in args:
+        fn(a)
+    return (time.perf_counter() - start) / len(args) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+    parser.add_argument("--lookups", type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f"{'interactions':>12} {'populate s':>10} {'get_interaction us':>19} {'by_rep us/row':>14}"
+          f" {'page 1 us':>10} {'mid page us':>12}")
+    for n in [int(x) for x in args.sizes.split(",")]:
+        start = time.perf_counter()
+        ids, _ = populate(n)
+        populate_s = time.perf_counter() - start
+
+        sample = random.choices(ids, k=args.lookups)
+        get_us = time_per_call(crud.get_interaction, sample)
+
+        # rep lookups return every interaction for the rep; report per returned row
+        reps = [f"rep_{i % 100}" for i in range(100)]
+        start = time.perf_counter()
+        rows = sum(len(crud.get_interactions_by_rep(r)) for r in reps)
+        rep_us = (time.perf_counter() - start) / rows * 1e6
+
+        mid = pagination.encode_cursor(pagination.interaction_key(crud.get_interaction(ids[n // 2])))
+        first_us = time_per_call(lambda _: crud.list_interactions(limit=50), range(20))
+        mid_us = time_per_call(lambda _: crud.list_interactions(cursor=mid, limit=50), range(20))
+
+        print(f"{n:>12} {populate_s:>10.2f} {get_us:>19.2f} {rep_us:>14.2f} {first_us:>10.0f} {mid_us:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Natural-language edits: rule parser and field-scoped prompts vs the full-record prompt
+
+Usage:
+    python -m benchmarks.edit_pipeline [--edits 200] [--latency 0.3] [--source-chars 1500]
+
+Seeds interactions shaped like real conversational logs (a long source_raw,
+materials, samples, follow-ups) and runs a mix of simple edits ("change
+sentiment to negative", "add 2 samples of XYZ-5") and free-form ones
+through aedit_interaction_via_agent against the fake LLM, first with
+EDIT_RULES_ENABLED off and then on. Prompt sizes are compared with the
+previous prompt, which embedded json.dumps of the whole interaction.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from app import agent_registry, agent_service, crud, edit_parser, memory_store, schemas
+from app.fake_llm import FakeChatModel
+
+SIMPLE_EDITS = [
+    "change sentiment to negative",
+    "set outcome to agreed to start two patients next month",
+    "add 2 samples of XYZ-5",
+    "change ABC-10 samples to 4",
+    "mark follow-ups as done",
+    "add topics pricing and access",
+    "remove the brochures and add 1 leaflet",
+    "add a follow-up: send the renal dosing reprint by 20 March 2026",
+]
+FREE_FORM_EDITS = [
+    "she was actually quite annoyed about the reimbursement paperwork",
+    "the doctor asked us to come back with the cardiology team",
+    "swap the sample product to the new formulation she asked for",
+]
+
+
+def _full_prompt(existing: dict, edit_request: str) -> str:
+    # The prompt edit_interaction_via_agent sent before field-scoped prompts
+    return f"""Given this interaction data and an edit request, return ONLY a JSON object with fields to update:
+
+Current Interaction:
+{json.dumps(existing, default=str)}
+
+Edit Request: {edit_request}
+
+Return JSON with only fields to update:"""
+
+
+def seed(count: int, source_chars: int) -> list:
+    note = ("Met Dr. Meera Patel at the clinic to go over the efficacy and renal dosing data in detail. " * 40)[:source_chars]
+    interaction = schemas.InteractionCreate(
+        rep_id="rep-1", summary="Discussed efficacy data; doctor was receptive.", sentiment="positive",
+        topics=["efficacy", "dosing"], outcome="Agreed to trial with two patients", source_raw=note,
+        materials=[schemas.MaterialSharedCreate(material_type="brochure", quantity=3)],
+        samples=[schemas.SampleCreate(product_code="ABC-10", quantity=2)],
+        follow_ups=[schemas.FollowUpCreate(action_item="Send phase III study summary", owner="rep-1"),
+                    schemas.FollowUpCreate(action_item="Schedule follow-up visit in two weeks", owner="rep-1")],
+    )
+    return [i["id"] for i in crud.bulk_create_interactions([interaction] * count)]
+
+
+async def run(ids: list, edits: list) -> list:
+    """Per-edit seconds and whether each succeeded"""
+    results = []
+    for interaction_id, edit in zip(ids, edits):
+        start = time.perf_counter()
+        result = await agent_service.aedit_interaction_via_agent(interaction_id, edit)
+        results.append((time.perf_counter() - start, result["success"]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--edits", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.3, help="fake LLM seconds per call")
+    parser.add_argument("--source-chars", type=int, default=1500, help="length of each seeded source_raw")
+    parser.add_argument("--simple", type=float, default=0.7, help="share of edits the rules can handle")
+    args = parser.parse_args()
+
+    crud.set_backend(memory_store)
+    rng = random.Random(7)
+    edits = [rng.choice(SIMPLE_EDITS if rng.random() < args.simple else FREE_FORM_EDITS) for _ in range(args.edits)]
+    llm = FakeChatModel(latency=args.latency)
+    agent_registry.agent_module.set_llm(llm)
+
+    full_chars = compact_chars = 0
+    memory_store.reset_store()
+    for interaction_id, edit in zip(seed(args.edits, args.source_chars), edits):
+        existing = crud.get_interaction(interaction_id)
+        full_chars += len(_full_prompt(existing, edit))
+        compact_chars += len(edit_parser.edit_prompt(existing, edit))
+
+    results = {}
+    for label, rules in (("LLM only", False), ("rules + LLM", True)):
+        agent_service.EDIT_RULES_ENABLED = rules
+        memory_store.reset_store()
+        edit_parser._stats.reset()
+        ids = seed(args.edits, args.source_chars)
+        llm.calls = 0
+        timings = asyncio.run(run(ids, edits))
+        seconds = [t for t, _ in timings]
+        results[label] = (sum(seconds) / len(seconds), llm.calls / len(edits), sum(ok for _, ok in timings))
+    stats = edit_parser.stats()
+    agent_service.EDIT_RULES_ENABLED = True
+
+    print(f"{args.edits} edits ({args.simple:.0%} simple), source_raw {args.source_chars} chars, "
+          f"fake LLM at {args.latency * 1000:.0f} ms per call")
+    print(f"{'':>12} {'ms/edit':>8} {'LLM calls/edit':>15} {'succeeded':>10}")
+    for label, (avg, calls, ok) in results.items():
+        print(f"{label:>12} {avg * 1000:>8.1f} {calls:>15.2f} {ok:>10}")
+    print(f"prompt chars per LLM edit: full record {full_chars / args.edits:.0f}, "
+          f"field-scoped {compact_chars / args.edits:.0f} ({compact_chars / full_chars:.0%})")
+    print(f"rules: hit rate {stats['rule_hit_rate']:.0%}, {stats['avg_rule_ms']:.3f} ms/edit")
+
+
+if __name__ == "__main__":
+    main()
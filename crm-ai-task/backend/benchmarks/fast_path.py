@@ -0,0 +1,94 @@
+"""
+Hit rate and latency saved by the rule-based pre-extractor
+
+Usage:
+    python -m benchmarks.fast_path [--notes 200] [--latency 0.3] [--templated 0.6]
+
+Runs a mix of templated notes ("Met Dr. X on <date>, gave 2 samples of
+ABC-10, ...") and free-form notes through the sequential async graph against
+the fake LLM, first without and then with the fast path installed. The
+gazetteer is a store seeded with the HCPs the notes mention.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from app import agent_registry, agent_service, crud, fast_extract, memory_store, schemas
+from app.fake_llm import FakeChatModel
+
+DOCTORS = ["Meera Patel", "John Smith", "Aisha Khan", "Luis Ortega", "Hannah Weber", "Kenji Sato"]
+PRODUCTS = ["ABC-10", "XYZ-5", "CZ-100"]
+MONTHS = ["January", "February", "March", "April", "May", "June"]
+TEMPLATES = [
+    "Met Dr. {doc} on {day} {month} 2026 at {hour}pm, gave {qty} samples of {code}, shared {n} brochures, agreed to trial with two patients",
+    "Visited Dr. {doc} yesterday, discussed efficacy and dosing, left {n} leaflets",
+    "Dr. {doc} 2026-0{m}-{day:02d} 10:30 gave {qty} {code} samples",
+    "Called Dr. {doc} on {month} {day}, discussed the new formulary, will send the study reprint",
+]
+FREE_FORM = [
+    "Had a long chat with Dr. {doc} about her concerns with side effects; she seemed hesitant but open to more data. Gave {qty} samples of {code}.",
+    "Dr. {doc} was busy so we only spoke briefly in the corridor, mostly about reimbursement hassles for elderly patients.",
+    "Lunch meeting with the cardiology team; Dr. {doc} asked lots of questions on renal dosing and wants the MSL to call back.",
+]
+
+
+def make_note(rng: random.Random, templated: bool) -> str:
+    pattern = rng.choice(TEMPLATES if templated else FREE_FORM)
+    return pattern.format(doc=rng.choice(DOCTORS), day=rng.randint(1, 28), month=rng.choice(MONTHS),
+                          m=rng.randint(1, 9), hour=rng.randint(1, 5), qty=rng.randint(1, 6),
+                          code=rng.choice(PRODUCTS), n=rng.randint(1, 4))
+
+
+async def run(notes, concurrency: int = 8) -> list:
+    """Per-note seconds through the async graph"""
+    agent = agent_registry.get_agent(agent_registry.variant_name("sequential", use_async=True))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(text):
+        async with semaphore:
+            start = time.perf_counter()
+            await agent.ainvoke(agent_service._initial_state(text))
+            return time.perf_counter() - start
+
+    return await asyncio.gather(*[one(text) for text in notes])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.3, help="fake LLM seconds per call")
+    parser.add_argument("--templated", type=float, default=0.6, help="share of templated notes")
+    args = parser.parse_args()
+
+    crud.set_backend(memory_store)
+    memory_store.reset_store()
+    crud.bulk_create_hcps([schemas.HCPCreate(name=f"Dr. {doc}") for doc in DOCTORS])
+    rng = random.Random(42)
+    notes = [make_note(rng, rng.random() < args.templated) for _ in range(args.notes)]
+
+    llm = FakeChatModel(latency=args.latency)
+    agent_registry.agent_module.set_llm(llm)
+
+    results = {}
+    for label in ("LLM only", "fast path"):
+        fast_extract.uninstall()
+        if label == "fast path":
+            fast_extract.install(fast_extract.FastExtractor(product_codes=PRODUCTS))
+        llm.calls = 0
+        seconds = asyncio.run(run(notes))
+        results[label] = (sum(seconds) / len(seconds), llm.calls / len(notes))
+    stats = fast_extract.stats()
+    fast_extract.uninstall()
+
+    print(f"{args.notes} notes ({args.templated:.0%} templated), fake LLM at {args.latency * 1000:.0f} ms per call")
+    print(f"{'':>10} {'ms/note':>8} {'LLM calls/note':>15}")
+    for label, (avg, calls) in results.items():
+        print(f"{label:>10} {avg * 1000:>8.0f} {calls:>15.2f}")
+    print(f"hit rate {stats['hit_rate']:.0%} (partial {stats['partial_hits']}, misses {stats['misses']}), "
+          f"{stats['fields_from_rules']:.0%} of fields from rules, rules {stats['avg_rule_ms']:.2f} ms/note, "
+          f"estimated saved {stats['saved_ms_per_note']} ms/note")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Due-soon and overdue follow-up queries from the due-date index vs a scan
+
+Usage:
+    python -m benchmarks.follow_up_index [--sizes 10000,100000] [--queries 500]
+
+For each store size, seeds interactions with one to three follow-ups each
+(50 reps, due dates spread 60 days either side of now, a third of them
+already done) on the in-memory backend, then times "first page of what is
+due for rep R in the next 7 days" and "rep R's overdue follow-ups" answered
+by the index and by a scan over every interaction's follow-ups. Also
+reports the startup rebuild and the cost of completing a follow-up (a crud
+update that moves it out of the index).
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from app import crud, follow_ups, memory_store, schemas
+from app.pagination import to_naive_utc
+
+WEEK = timedelta(days=7)
+
+
+def seed(count: int, rng: random.Random, now: datetime) -> list:
+    return crud.bulk_create_interactions([
+        schemas.InteractionCreate(
+            rep_id=f"rep-{rng.randrange(50)}",
+            follow_ups=[schemas.FollowUpCreate(action_item="Send study summary",
+                                               due_date=now + timedelta(minutes=rng.randrange(-60 * 1440, 60 * 1440)),
+                                               status="done" if rng.random() < 0.33 else "open")
+                        for _ in range(rng.randint(1, 3))],
+        )
+        for _ in range(count)
+    ])
+
+
+def scan(rep_id: str, start, end, limit: int = 50) -> list:
+    """(due_date, id) of rep_id's pending follow-ups due in [start, end), first page"""
+    found = []
+    for inter in memory_store._interactions.values():
+        for f in inter.follow_ups:
+            if (f.owner or inter.rep_id) != rep_id or f.status in follow_ups.CLOSED or f.due_date is None:
+                continue
+            due = to_naive_utc(f.due_date)
+            if (start is None or due >= start) and due < end:
+                found.append((due, f.id))
+    return sorted(found)[:limit]
+
+
+def per_call_us(fn, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    crud.set_backend(memory_store)
+    now = datetime.utcnow()
+    print(f"{'interactions':>12} {'scan ms':>9} {'due us':>8} {'overdue us':>11} {'rebuild ms':>11} {'complete us':>12}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        rng = random.Random(13)
+        follow_ups.uninstall()
+        memory_store.reset_store()
+        created = seed(size, rng, now)
+        follow_ups.install()
+        index = follow_ups.get_index()
+        reps = [f"rep-{rng.randrange(50)}" for _ in range(args.queries)]
+
+        start = time.perf_counter()
+        for rep_id in reps[:5]:
+            expected = [fid for _, fid in scan(rep_id, now, now + WEEK)]
+            assert expected == [f["id"] for f in index.due_soon(rep_id, WEEK, now)["items"]]
+        scan_ms = (time.perf_counter() - start) / 5 * 1000
+
+        due_us = per_call_us(lambda: index.due_soon(rng.choice(reps), WEEK, now), args.queries)
+        overdue_us = per_call_us(lambda: index.overdue(rng.choice(reps), now), args.queries)
+
+        pending = [(inter["id"], f["id"]) for inter in rng.sample(created, min(2000, len(created)))
+                   for f in inter["follow_ups"] if f["status"] == "open"]
+        start = time.perf_counter()
+        for interaction_id, fid in pending:
+            crud.update_interaction(interaction_id, {"follow_ups": {"update": [{"id": fid, "status": "done"}]}})
+        complete_us = (time.perf_counter() - start) / len(pending) * 1e6
+        assert all(index.get(fid)["status"] == "done" for _, fid in pending)
+        print(f"{size:>12} {scan_ms:>9.1f} {due_us:>8.1f} {overdue_us:>11.1f} {index.rebuild_ms:>11.0f} {complete_us:>12.1f}")
+    follow_ups.uninstall()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,106 @@
+"""
+Queued agent jobs vs holding the request open
+
+Usage:
+    python -m benchmarks.job_queue [--notes 200] [--workers 16] [--latency lognormal:0.2,0.5]
+        [--failure-rate 0.1]
+
+Sends a burst of notes through the ASGI app in-process against the fake LLM,
+first as concurrent POST /api/agent/conversational requests (each client
+holds its connection until the agent pipeline finishes), then as
+POST /api/agent/conversational/jobs submissions drained by JOB_WORKERS
+workers and polled until done. Reported: how long clients wait for a
+response, time until every note is processed, and job outcomes (retries
+absorb the injected LLM failures).
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+import httpx
+
+from app import fake_llm, main
+from app.fake_llm import FakeChatModel
+from .fast_path import make_note
+from .load_suite import summarize_ms
+
+
+async def held_open(client: httpx.AsyncClient, notes: list) -> dict:
+    latencies, failed = [], 0
+
+    async def one(note):
+        nonlocal failed
+        start = time.perf_counter()
+        response = await client.post("/api/agent/conversational", json={"text": note, "rep_id": "rep-bench"})
+        latencies.append(time.perf_counter() - start)
+        failed += response.status_code != 200
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(note) for note in notes])
+    return {"response_ms": summarize_ms(latencies), "all_done_s": time.perf_counter() - start, "failed": failed}
+
+
+async def queued(client: httpx.AsyncClient, notes: list) -> dict:
+    latencies, job_ids = [], []
+
+    async def submit(note):
+        start = time.perf_counter()
+        response = await client.post("/api/agent/conversational/jobs", json={"text": note, "rep_id": "rep-bench"})
+        latencies.append(time.perf_counter() - start)
+        job_ids.append(response.json()["job_id"])
+
+    start = time.perf_counter()
+    await asyncio.gather(*[submit(note) for note in notes])
+    pending, jobs = set(job_ids), {}
+    while pending:
+        await asyncio.sleep(0.05)
+        for job_id in list(pending):
+            job = (await client.get(f"/api/agent/jobs/{job_id}")).json()
+            if job["status"] in ("succeeded", "failed"):
+                jobs[job_id] = job
+                pending.discard(job_id)
+    outcomes = [job["status"] for job in jobs.values()]
+    return {
+        "response_ms": summarize_ms(latencies), "all_done_s": time.perf_counter() - start,
+        "failed": outcomes.count("failed"), "retries": sum(job["attempts"] - 1 for job in jobs.values()),
+    }
+
+
+async def bench(args) -> dict:
+    os.environ.update(JOB_WORKERS=str(args.workers), JOB_QUEUE_MAX_DEPTH=str(args.notes),
+                      JOB_RETRY_BACKOFF="0.2", JOB_MAX_ATTEMPTS="3")
+    rng = random.Random(11)
+    notes = [make_note(rng, rng.random() < 0.6) for _ in range(args.notes)]
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    fake_llm.install(FakeChatModel(latency=args.latency, failure_rate=args.failure_rate, seed=3))
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            results["held open"] = await held_open(client, notes)
+            results["queued"] = await queued(client, notes)
+    fake_llm.uninstall()
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--latency", default="lognormal:0.2,0.5", help="fake LLM seconds per call or distribution")
+    parser.add_argument("--failure-rate", type=float, default=0.1, help="share of LLM calls that raise")
+    args = parser.parse_args()
+
+    results = asyncio.run(bench(args))
+    print(f"{args.notes} notes at once, {args.workers} job workers, fake LLM {args.latency}, "
+          f"{args.failure_rate:.0%} LLM failures")
+    print(f"{'':>10} {'response p50':>13} {'p95':>9} {'max':>9} {'all done s':>11} {'failed':>7} {'retries':>8}")
+    for label, r in results.items():
+        ms = r["response_ms"]
+        print(f"{label:>10} {ms['p50']:>13.1f} {ms['p95']:>9.1f} {ms['max']:>9.1f} {r['all_done_s']:>11.2f} "
+              f"{r['failed']:>7} {r.get('retries', '-'):>8}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,77 @@
+"""
+Write overhead and restart time of the journaled in-memory store
+
+Usage:
+    python -m benchmarks.journal_restore [--interactions 1000000] [--tail 10000] [--dir /tmp/crm-journal]
+
+Loads N interactions through bulk_create_interactions, snapshots, writes a
+tail of single creates/updates that only exist in the journal, then times
+recovery (snapshot load + tail replay + index rebuild).
+"""
+import argparse
+import shutil
+import time
+
+from app import memory_store, schemas
+
+
+def make(i: int) -> schemas.InteractionCreate:
+    return schemas.InteractionCreate(
+        hcp_id=f"hcp_{i % 1000}",
+        rep_id=f"rep_{i % 100}",
+        summary="Discussed product efficacy",
+        samples=[schemas.SampleCreate(product_code="ABC-10", quantity=1)],
+        follow_ups=[schemas.FollowUpCreate(action_item="Send study data")],
+    )
+
+
+def per_write_us(n: int) -> float:
+    start = time.perf_counter()
+    for i in range(n):
+        memory_store.create_interaction(make(i))
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--interactions", type=int, default=1000000)
+    parser.add_argument("--tail", type=int, default=10000)
+    parser.add_argument("--dir", default="/tmp/crm-journal")
+    args = parser.parse_args()
+    shutil.rmtree(args.dir, ignore_errors=True)
+
+    memory_store.reset_store()
+    plain_us = per_write_us(args.tail)
+
+    memory_store.open_journal(args.dir, snapshot_every=0)
+    journaled_us = per_write_us(args.tail)
+    memory_store.reset_store()
+
+    start = time.perf_counter()
+    for offset in range(0, args.interactions, 10000):
+        memory_store.bulk_create_interactions([make(i) for i in range(offset, min(offset + 10000, args.interactions))])
+    load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    memory_store.snapshot()
+    snapshot_s = time.perf_counter() - start
+
+    ids = list(memory_store._interactions)[:args.tail // 2]
+    for i, interaction_id in enumerate(ids):
+        memory_store.create_interaction(make(i))
+        memory_store.update_interaction(interaction_id, {"sentiment": "positive"})
+    memory_store.close_journal(snapshot_first=False)
+
+    start = time.perf_counter()
+    memory_store.open_journal(args.dir, snapshot_every=0)
+    restore_s = time.perf_counter() - start
+    restored = len(memory_store._interactions)
+    memory_store.close_journal(snapshot_first=False)
+
+    print(f"create_interaction: {plain_us:.1f} us in memory, {journaled_us:.1f} us journaled (group fsync)")
+    print(f"bulk load {args.interactions} interactions: {load_s:.1f} s, snapshot: {snapshot_s:.1f} s")
+    print(f"restore (snapshot + {len(ids) * 2} journal records): {restore_s:.1f} s, {restored} interactions")
+
+
+if __name__ == "__main__":
+    main()
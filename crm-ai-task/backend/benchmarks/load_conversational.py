@@ -0,0 +1,56 @@
+"""
+Concurrency load test for /api/agent/conversational against a fake LLM
+
+Usage:
+    python -m benchmarks.load_conversational [--requests 200] [--latency 0.2] [--mode sequential|single_call]
+
+Runs the same burst of concurrent requests twice: once with the synchronous
+pipeline on Starlette's threadpool (AGENT_ASYNC_MODE=false) and once with the
+async pipeline. Each note makes three LLM calls, so the sync run is capped by
+the threadpool size while the async run overlaps every in-flight call.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from app import main, agent_registry
+from app.fake_llm import FakeChatModel
+
+
+async def run_burst(n: int, mode: str = None) -> float:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        payload = {"text": "Met Dr. Meera Patel at 4pm, discussed Product X, gave 2 samples", "rep_id": "rep_bench", "mode": mode}
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[client.post("/api/agent/conversational", json=payload) for _ in range(n)])
+        elapsed = time.perf_counter() - start
+    failed = [r for r in responses if r.status_code != 200]
+    if failed:
+        raise RuntimeError(f"{len(failed)} requests failed: {failed[0].text}")
+    return elapsed
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake LLM seconds per call")
+    parser.add_argument("--mode", default=None, help="agent graph mode (default: AGENT_MODE)")
+    args = parser.parse_args()
+
+    llm = FakeChatModel(latency=args.latency)
+    agent_registry.agent_module.set_llm(llm)
+    agent_registry.warm_up()
+
+    print(f"{args.requests} concurrent requests, fake LLM at {args.latency * 1000:.0f} ms per call")
+    print(f"{'mode':>6} {'wall s':>8} {'req/s':>8} {'LLM calls/req':>14}")
+    for mode in ("sync", "async"):
+        main.AGENT_ASYNC_MODE = mode == "async"
+        llm.calls = 0
+        elapsed = asyncio.run(run_burst(args.requests, args.mode))
+        print(f"{mode:>6} {elapsed:>8.2f} {args.requests / elapsed:>8.1f} {llm.calls / args.requests:>14.1f}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,282 @@
+"""
+Offline load test of the API at fixed concurrency levels, against the fake LLM
+
+Usage:
+    python -m benchmarks.load_suite [--scenarios conversational,edit,search,crud]
+        [--concurrency 1,8,32] [--requests 200] [--latency lognormal:0.2,0.5]
+        [--failure-rate 0] [--malformed-rate 0] [--out PATH] [--compare PATH]
+
+Every scenario runs closed-loop: `concurrency` clients each send their next
+request as soon as the previous one returns, until `--requests` have been
+sent. Requests go through the ASGI app in-process, so the numbers cover
+routing, validation, the agent graph and the store, but not the network.
+
+Scenarios:
+    conversational  POST /api/agent/conversational with templated and free-form notes
+    edit            POST /api/agent/edit/{id} with simple (rule-parsed) and free-form edits
+    search          GET /api/hcps/search over the seeded HCPs
+    crud            create / get / list page / patch interactions, in rotation
+
+Reported per scenario and level: throughput, error count and latency
+p50/p95/p99. Agent scenarios also report time per graph node. Results are
+written as JSON (by default benchmarks/results/load_suite_<git sha>.json);
+--compare prints the change against an earlier results file.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import httpx
+
+from app import agent_registry, crud, main, schemas
+from app import fake_llm
+from app.fake_llm import FakeChatModel
+from .edit_pipeline import FREE_FORM_EDITS, SIMPLE_EDITS
+from .fast_path import DOCTORS, make_note
+
+SCENARIOS = ("conversational", "edit", "search", "crud")
+SEED_HCPS = 2000
+SEED_INTERACTIONS = 2000
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def summarize_ms(seconds: list) -> dict:
+    values = sorted(s * 1000 for s in seconds)
+    return {
+        "mean": round(sum(values) / len(values), 2) if values else 0.0,
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "p99": round(percentile(values, 99), 2),
+        "max": round(values[-1], 2) if values else 0.0,
+    }
+
+
+class NodeTimer:
+    """Node observer collecting per-node run times"""
+
+    def __init__(self):
+        self.seconds = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def __call__(self, node: str, seconds: float, error):
+        self.seconds[node].append(seconds)
+        if error is not None:
+            self.errors[node] += 1
+
+    def reset(self):
+        self.seconds.clear()
+        self.errors.clear()
+
+    def report(self) -> dict:
+        return {node: {"runs": len(values), "errors": self.errors[node], **summarize_ms(values)}
+                for node, values in sorted(self.seconds.items())}
+
+
+def seed_store(rng: random.Random) -> dict:
+    """HCPs and interactions for the search, edit and crud scenarios"""
+    crud.reset_store()
+    last_names = ["Patel", "Smith", "Khan", "Ortega", "Weber", "Sato", "Nguyen", "Rossi", "Dubois", "Kowalski"]
+    first_names = ["Meera", "John", "Aisha", "Luis", "Hannah", "Kenji", "Linh", "Marco", "Claire", "Piotr"]
+    hcps = crud.bulk_create_hcps([
+        schemas.HCPCreate(name=f"Dr. {rng.choice(first_names)} {rng.choice(last_names)} {i}",
+                          speciality=rng.choice(["Cardiology", "Oncology", "Nephrology"]))
+        for i in range(SEED_HCPS)
+    ] + [schemas.HCPCreate(name=f"Dr. {doc}") for doc in DOCTORS])
+    interactions = crud.bulk_create_interactions([
+        schemas.InteractionCreate(
+            hcp_id=rng.choice(hcps)["id"], rep_id=f"rep-{i % 20}", summary="Discussed efficacy data.",
+            sentiment="positive", topics=["efficacy"], source_raw=make_note(rng, True),
+            samples=[schemas.SampleCreate(product_code="ABC-10", quantity=2)],
+            materials=[schemas.MaterialSharedCreate(material_type="brochure", quantity=1)],
+            follow_ups=[schemas.FollowUpCreate(action_item="Send study summary", owner=f"rep-{i % 20}")],
+        )
+        for i in range(SEED_INTERACTIONS)
+    ])
+    return {"interaction_ids": [i["id"] for i in interactions],
+            "names": last_names + first_names + [doc.split()[-1] for doc in DOCTORS]}
+
+
+def make_request(scenario: str, i: int, rng: random.Random, ctx: dict):
+    """(method, url, json body) for the i-th request of a scenario"""
+    if scenario == "conversational":
+        return "POST", "/api/agent/conversational", {"text": make_note(rng, rng.random() < 0.6), "rep_id": "rep-bench"}
+    if scenario == "edit":
+        edit = rng.choice(SIMPLE_EDITS if rng.random() < 0.7 else FREE_FORM_EDITS)
+        return "POST", f"/api/agent/edit/{rng.choice(ctx['interaction_ids'])}", {"edit_request": edit}
+    if scenario == "search":
+        query = rng.choice(ctx["names"])
+        return "GET", f"/api/hcps/search?q={query[:rng.randint(3, len(query))]}", None
+    step, interaction_id = i % 4, rng.choice(ctx["interaction_ids"])
+    if step == 0:
+        return "POST", "/api/interactions", {"rep_id": "rep-bench", "summary": "Quick check-in", "sentiment": "neutral",
+                                             "samples": [{"product_code": "XYZ-5", "quantity": 1}]}
+    if step == 1:
+        return "GET", f"/api/interactions/{interaction_id}", None
+    if step == 2:
+        return "GET", f"/api/interactions?rep_id=rep-{rng.randrange(20)}&limit=20", None
+    return "PATCH", f"/api/interactions/{interaction_id}", {"outcome": "Agreed to review the data"}
+
+
+async def run_level(scenario: str, concurrency: int, requests: int, ctx: dict, seed: int) -> dict:
+    """Closed-loop run of one scenario at one concurrency level"""
+    rng = random.Random(seed)
+    plan = [make_request(scenario, i, rng, ctx) for i in range(requests)]
+    latencies, errors, statuses = [], 0, defaultdict(int)
+    next_index = 0
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def worker():
+            nonlocal next_index, errors
+            while next_index < len(plan):
+                method, url, body = plan[next_index]
+                next_index += 1
+                start = time.perf_counter()
+                try:
+                    response = await client.request(method, url, json=body)
+                    status = response.status_code
+                except Exception:
+                    status = 599
+                latencies.append(time.perf_counter() - start)
+                statuses[status] += 1
+                if status >= 400:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        wall = time.perf_counter() - start
+
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "status_codes": {str(k): v for k, v in sorted(statuses.items())},
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(requests / wall, 2),
+        "latency_ms": summarize_ms(latencies),
+    }
+
+
+async def run_suite(llm: FakeChatModel, scenarios: list, levels: list, args) -> list:
+    """Every scenario at every level, inside the app's lifespan so startup configuration (fast path, caches, ...) applies"""
+    agent_module = agent_registry.agent_module
+    # Installed before startup so the warm-up sees an LLM; shutdown removes it
+    fake_llm.install(llm)
+    async with main.lifespan(main.app):
+        ctx = seed_store(random.Random(args.seed))
+        timer = NodeTimer()
+        agent_module.add_node_observer(timer)
+        print(f"fake LLM {llm.latency.describe()} s, failure rate {args.failure_rate}, malformed rate {args.malformed_rate}; "
+              f"storage {crud.backend_name()}, {SEED_HCPS} HCPs, {SEED_INTERACTIONS} interactions seeded")
+        print(f"{'scenario':>15} {'conc':>5} {'req/s':>9} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        results = []
+        try:
+            for scenario in scenarios:
+                for concurrency in levels:
+                    timer.reset()
+                    calls_before = llm.calls
+                    result = await run_level(scenario, concurrency, args.requests, ctx, args.seed + concurrency)
+                    result["llm_calls_per_request"] = round((llm.calls - calls_before) / args.requests, 2)
+                    if scenario in ("conversational", "edit"):
+                        result["nodes"] = timer.report()
+                    results.append(result)
+                    lat = result["latency_ms"]
+                    print(f"{scenario:>15} {concurrency:>5} {result['throughput_rps']:>9.1f} {result['errors']:>7} "
+                          f"{lat['p50']:>9.1f} {lat['p95']:>9.1f} {lat['p99']:>9.1f}")
+        finally:
+            agent_module.remove_node_observer(timer)
+    return results
+
+
+def git_sha() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "local"
+
+
+def compare(results: list, previous_path: str):
+    with open(previous_path) as f:
+        previous = {(r["scenario"], r["concurrency"]): r for r in json.load(f)["results"]}
+    print(f"\nvs {previous_path}")
+    print(f"{'scenario':>15} {'conc':>5} {'req/s':>16} {'p50 ms':>18} {'p95 ms':>18}")
+    for r in results:
+        old = previous.get((r["scenario"], r["concurrency"]))
+        if old is None:
+            continue
+
+        def delta(new, before):
+            return f"{new:.1f} ({(new - before) / before:+.0%})" if before else f"{new:.1f}"
+
+        print(f"{r['scenario']:>15} {r['concurrency']:>5} {delta(r['throughput_rps'], old['throughput_rps']):>16} "
+              f"{delta(r['latency_ms']['p50'], old['latency_ms']['p50']):>18} "
+              f"{delta(r['latency_ms']['p95'], old['latency_ms']['p95']):>18}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario and level")
+    parser.add_argument("--latency", default="lognormal:0.2,0.5", help="fake LLM latency (seconds or distribution spec)")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None, help="results JSON (default benchmarks/results/load_suite_<sha>.json)")
+    parser.add_argument("--compare", default=None, help="earlier results JSON to diff against")
+    args = parser.parse_args()
+
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {sorted(unknown)}")
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    llm = FakeChatModel(latency=args.latency, failure_rate=args.failure_rate,
+                        malformed_rate=args.malformed_rate, seed=args.seed)
+    results = asyncio.run(run_suite(llm, scenarios, levels, args))
+
+    for result in results:
+        if result.get("nodes"):
+            print(f"\nper-node ms, {result['scenario']} at concurrency {result['concurrency']}:")
+            for node, stats in result["nodes"].items():
+                print(f"  {node:>20} runs {stats['runs']:>5}  p50 {stats['p50']:>8.1f}  p95 {stats['p95']:>8.1f}")
+
+    sha = git_sha()
+    out = args.out or os.path.join(os.path.dirname(__file__), "results", f"load_suite_{sha}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump({
+            "meta": {
+                "git_sha": sha,
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "storage": crud.backend_name(),
+                "agent_mode": agent_registry.DEFAULT_MODE,
+                "async_mode": main.AGENT_ASYNC_MODE,
+                "args": vars(args),
+                "llm": llm.snapshot(),
+            },
+            "results": results,
+        }, f, indent=2)
+    print(f"\nresults written to {out}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,127 @@
+"""
+Memory held by the in-memory store, measured with tracemalloc
+
+Usage:
+    python -m benchmarks.memory_footprint [--sizes 100000,1000000]
+
+Loads N interactions (one material, one sample and one follow-up each, 200
+reps, 2000 HCPs, unique summaries) and reports the bytes still allocated
+once the inputs are gone:
+- dict rows: the previous layout, one dict per row plus child tables and
+  interaction_id -> [child ids] lists
+- records: the same rows as slotted records with interned strings
+- store: memory_store as a whole, records plus every index
+Rows are parsed from JSON like import rows, so every string is a fresh
+object and the dict layout pays for every repeated "rep_12".
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+import uuid
+from datetime import datetime
+
+from app import memory_store, schemas
+
+CHUNK = 10000
+
+
+def make(i: int) -> schemas.InteractionCreate:
+    # Parsed from JSON like an import row, so every string is a fresh object
+    return schemas.InteractionCreate.model_validate(json.loads(json.dumps({
+        "hcp_id": f"hcp_{i % 2000}",
+        "rep_id": f"rep_{i % 200}",
+        "mode": "conversational",
+        "summary": f"Discussed efficacy of ABC-10 in visit {i}",
+        "sentiment": ("positive", "neutral", "negative")[i % 3],
+        "topics": [f"topic_{i % 7}"],
+        "materials": [{"material_type": f"brochure_{i % 3}", "quantity": 1}],
+        "samples": [{"product_code": f"ABC-{i % 20}", "quantity": 2}],
+        "follow_ups": [{"action_item": f"Send study data {i}", "owner": f"rep_{i % 200}"}],
+    })))
+
+
+def dict_rows(interaction_in: schemas.InteractionCreate, now: datetime, tables: dict):
+    """The dict-per-row layout the store used before records"""
+    interaction_id = str(uuid.uuid4())
+    for name, children in (("materials", interaction_in.materials), ("samples", interaction_in.samples),
+                           ("follow_ups", interaction_in.follow_ups)):
+        ids = []
+        for child in children:
+            row = {"id": str(uuid.uuid4()), "interaction_id": interaction_id, **child.model_dump()}
+            tables[name][row["id"]] = row
+            ids.append(row["id"])
+        tables[name + "_by_interaction"][interaction_id] = ids
+    tables["interactions"][interaction_id] = {
+        "id": interaction_id,
+        "hcp_id": interaction_in.hcp_id,
+        "rep_id": interaction_in.rep_id,
+        "mode": interaction_in.mode,
+        "datetime": interaction_in.datetime,
+        "summary": interaction_in.summary,
+        "sentiment": interaction_in.sentiment.value,
+        "topics": interaction_in.topics,
+        "outcome": interaction_in.outcome,
+        "source_raw": interaction_in.source_raw,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def measure(load) -> int:
+    """Bytes allocated by load() that are still live afterwards"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = load()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return used
+
+
+def load_dicts(n: int):
+    names = ["interactions", "materials", "samples", "follow_ups",
+             "materials_by_interaction", "samples_by_interaction", "follow_ups_by_interaction"]
+    tables = {name: {} for name in names}
+    for offset in range(0, n, CHUNK):
+        now = datetime.utcnow()
+        for i in range(offset, min(offset + CHUNK, n)):
+            dict_rows(make(i), now, tables)
+    return tables
+
+
+def load_records(n: int):
+    rows = {}
+    for offset in range(0, n, CHUNK):
+        now = datetime.utcnow()
+        for i in range(offset, min(offset + CHUNK, n)):
+            inter = memory_store._build_interaction(make(i), now)
+            rows[inter.id] = inter
+    return rows
+
+
+def load_store(n: int):
+    memory_store.reset_store()
+    for offset in range(0, n, CHUNK):
+        memory_store.bulk_create_interactions([make(i) for i in range(offset, min(offset + CHUNK, n))])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100000,1000000")
+    args = parser.parse_args()
+
+    print(f"{'interactions':>12} {'dict rows':>12} {'records':>12} {'reduction':>9} {'store':>12} {'store/row':>9}")
+    for n in (int(x) for x in args.sizes.split(",")):
+        dicts = measure(lambda: load_dicts(n))
+        records = measure(lambda: load_records(n))
+        store = measure(lambda: load_store(n))
+        memory_store.reset_store()
+        print(f"{n:>12} {dicts / 2 ** 20:>10.1f}MB {records / 2 ** 20:>10.1f}MB {dicts / records:>8.1f}x "
+              f"{store / 2 ** 20:>10.1f}MB {store / n:>8.0f}B")
+
+
+if __name__ == "__main__":
+    main()
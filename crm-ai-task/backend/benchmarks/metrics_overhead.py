@@ -0,0 +1,84 @@
+"""
+Per-request cost of metrics collection and trace logging
+
+Usage:
+    python -m benchmarks.metrics_overhead [--requests 2000] [--rounds 5]
+
+Sends the same sequential requests through the ASGI app in-process with
+metrics off, on, and on with METRICS_TRACE_LOG (trace lines written to an
+in-memory handler), against a zero-latency fake LLM so the instrumentation
+is not hidden behind model time. Rounds alternate between the settings and
+the fastest round of each is reported.
+"""
+import argparse
+import asyncio
+import io
+import logging
+import time
+
+import httpx
+
+from app import crud, fake_llm, main, metrics, schemas
+from app.fake_llm import FakeChatModel
+
+NOTE = "Met Dr. Meera Patel at the clinic, discussed efficacy and dosing, gave 2 samples of ABC-10; she was receptive."
+
+
+async def run(client: httpx.AsyncClient, requests: int, interaction_id: str) -> dict:
+    """Mean microseconds per request for a store read and a conversational note"""
+    results = {}
+    start = time.perf_counter()
+    for _ in range(requests):
+        await client.get(f"/api/interactions/{interaction_id}")
+    results["GET interaction"] = (time.perf_counter() - start) / requests * 1e6
+    notes = max(1, requests // 10)
+    start = time.perf_counter()
+    for _ in range(notes):
+        await client.post("/api/agent/conversational", json={"text": NOTE})
+    results["conversational"] = (time.perf_counter() - start) / notes * 1e6
+    return results
+
+
+async def bench(requests: int, rounds: int) -> dict:
+    fake_llm.install(FakeChatModel(latency=0.0))
+    handler = logging.StreamHandler(io.StringIO())
+    metrics.trace_logger.addHandler(handler)
+    metrics.trace_logger.setLevel(logging.INFO)
+    metrics.trace_logger.propagate = False
+    best = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app):
+        interaction_id = crud.create_interaction(schemas.InteractionCreate(rep_id="rep-1", summary="Bench"))["id"]
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await run(client, 50, interaction_id)
+            for _ in range(rounds):
+                for label, setting in (("off", None), ("on", False), ("on + trace log", True)):
+                    # Installed after the lifespan's wrappers, so the LLM timing wrapper sits outermost here;
+                    # that only moves it, the per-call cost is the same
+                    metrics.uninstall()
+                    if setting is not None:
+                        metrics.install(trace_log=setting)
+                    for name, us in (await run(client, requests, interaction_id)).items():
+                        best[(label, name)] = min(best.get((label, name), us), us)
+    metrics.trace_logger.removeHandler(handler)
+    fake_llm.uninstall()
+    return best
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="GET requests per round (notes are a tenth)")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    best = asyncio.run(bench(args.requests, args.rounds))
+    print(f"{'':>16} {'GET interaction':>16} {'conversational':>15}   (us/request, best of {args.rounds})")
+    for label in ("off", "on", "on + trace log"):
+        get_us, note_us = best[(label, "GET interaction")], best[(label, "conversational")]
+        delta = "" if label == "off" else (
+            f"   +{get_us - best[('off', 'GET interaction')]:.0f} / +{note_us - best[('off', 'conversational')]:.0f} us")
+        print(f"{label:>16} {get_us:>16.0f} {note_us:>15.0f}{delta}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,86 @@
+"""
+Compliance queries from the sample ledger vs scanning sample rows
+
+Usage:
+    python -m benchmarks.sample_ledger [--sizes 10000,100000] [--queries 500]
+
+For each store size, seeds interactions over a year with one or two sample
+rows each (50 reps, 20 products, 5 lots per product) on the in-memory
+backend, then times "units of product P, lot L distributed by rep R in
+quarter Q" answered by the ledger and by a scan over every interaction's
+samples (the join back to rep_id and dates included). Also reports the
+startup rebuild and a full reconciliation.
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from app import crud, memory_store, sample_ledger, schemas
+from app.pagination import to_naive_utc
+
+PRODUCTS = [f"P{i:02d}-10" for i in range(20)]
+LOTS = ["A", "B", "C", "D", "E"]
+YEAR_START = datetime(2026, 1, 1)
+QUARTERS = [(date(2026, 1, 1), date(2026, 3, 31)), (date(2026, 4, 1), date(2026, 6, 30)),
+            (date(2026, 7, 1), date(2026, 9, 30)), (date(2026, 10, 1), date(2026, 12, 31))]
+
+
+def seed(count: int, rng: random.Random):
+    crud.bulk_create_interactions([
+        schemas.InteractionCreate(
+            rep_id=f"rep-{rng.randrange(50)}", datetime=YEAR_START + timedelta(minutes=rng.randrange(365 * 24 * 60)),
+            samples=[schemas.SampleCreate(product_code=rng.choice(PRODUCTS), lot=rng.choice(LOTS),
+                                          quantity=rng.randint(1, 6)) for _ in range(rng.randint(1, 2))],
+        )
+        for _ in range(count)
+    ])
+
+
+def scan(rep_id: str, product: str, lot: str, start: date, end: date) -> int:
+    units = 0
+    for inter in memory_store._interactions.values():
+        if inter.rep_id != rep_id:
+            continue
+        day = to_naive_utc(inter.datetime or inter.created_at).date()
+        if start <= day <= end:
+            units += sum(s.quantity for s in inter.samples if s.product_code == product and s.lot == lot)
+    return units
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    crud.set_backend(memory_store)
+    print(f"{'interactions':>12} {'scan ms':>9} {'ledger us':>10} {'rebuild ms':>11} {'reconcile ms':>13}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        rng = random.Random(9)
+        sample_ledger.uninstall()
+        memory_store.reset_store()
+        seed(size, rng)
+        sample_ledger.install()
+        ledger = sample_ledger.get_ledger()
+        asks = [(f"rep-{rng.randrange(50)}", rng.choice(PRODUCTS), rng.choice(LOTS), *rng.choice(QUARTERS))
+                for _ in range(args.queries)]
+
+        start = time.perf_counter()
+        for rep_id, product, lot, a, b in asks[:5]:
+            assert scan(rep_id, product, lot, a, b) == ledger.query(rep_id, product, lot, a, b)["units"]
+        scan_ms = (time.perf_counter() - start) / 5 * 1000
+
+        start = time.perf_counter()
+        for rep_id, product, lot, a, b in asks:
+            ledger.query(rep_id, product, lot, a, b)
+        ledger_us = (time.perf_counter() - start) / len(asks) * 1e6
+
+        result = ledger.reconcile(crud.iter_interactions)
+        assert result["mismatches"] == 0
+        print(f"{size:>12} {scan_ms:>9.1f} {ledger_us:>10.1f} {ledger.rebuild_ms:>11.0f} {result['ms']:>13.0f}")
+    sample_ledger.uninstall()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,72 @@
+"""
+Local sentiment classifier vs the LLM sentiment tool
+
+Usage:
+    python -m benchmarks.sentiment_backend [--texts 10000] [--latency 0.3] [--threshold 0.65]
+
+Reports the classifier's throughput scoring texts one at a time vs in one
+vectorized batch, then runs sentiment_analyzer over a set of varied
+summaries with the fake LLM under each backend: llm, local and hybrid
+(local unless the confidence is below --threshold).
+"""
+import argparse
+import time
+
+from app import agent_registry, sentiment
+from app.fake_llm import FakeChatModel
+
+SUMMARIES = [
+    "Discussed efficacy data for Product X; doctor was receptive.",
+    "Doctor seemed hesitant but open to more data.",
+    "Dropped off samples, brief chat in the corridor.",
+    "Great meeting, very interested in the new trial.",
+    "She was not convinced by the data and prefers the competitor.",
+    "Reviewed dosing schedule and storage conditions.",
+    "He complained about the price again and declined samples.",
+    "Asked for the product monograph and the updated label.",
+    "Very positive about tolerability, agreed to start three patients.",
+    "Worried about liver toxicity in elderly patients.",
+    "Took the brochure, will review with colleagues next week.",
+    "Thanked us for the support program, patients doing well.",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=10000)
+    parser.add_argument("--latency", type=float, default=0.3, help="fake LLM seconds per call")
+    parser.add_argument("--threshold", type=float, default=0.65)
+    args = parser.parse_args()
+
+    model = sentiment.SentimentModel.load()
+    texts = [SUMMARIES[i % len(SUMMARIES)] for i in range(args.texts)]
+    start = time.perf_counter()
+    for text in texts:
+        model.score(text)
+    single = time.perf_counter() - start
+    start = time.perf_counter()
+    model.score_batch(texts)
+    batch = time.perf_counter() - start
+    print(f"classifier, {args.texts} texts: {single / args.texts * 1e6:.1f} us/text one at a time, "
+          f"{batch / args.texts * 1e6:.1f} us/text in one batch")
+
+    llm = FakeChatModel(latency=args.latency)
+    agent_module = agent_registry.agent_module
+    agent_module.set_llm(llm)
+    print(f"sentiment_analyzer over {len(SUMMARIES)} summaries, fake LLM at {args.latency * 1000:.0f} ms per call")
+    print(f"{'backend':>8} {'ms/summary':>11} {'LLM calls':>10}")
+    for mode in ("llm", "local", "hybrid"):
+        sentiment.uninstall()
+        if mode != "llm":
+            sentiment.install(sentiment.SentimentBackend(model, mode=mode, threshold=args.threshold))
+        llm.calls = 0
+        start = time.perf_counter()
+        for summary in SUMMARIES:
+            agent_module.sentiment_analyzer.invoke({"text": summary})
+        elapsed = time.perf_counter() - start
+        print(f"{mode:>8} {elapsed / len(SUMMARIES) * 1000:>11.1f} {llm.calls:>10}")
+    sentiment.uninstall()
+
+
+if __name__ == "__main__":
+    main()
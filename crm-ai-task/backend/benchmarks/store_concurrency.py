@@ -0,0 +1,164 @@
+"""
+Concurrency stress test and throughput for the in-memory store
+
+Usage:
+    python -m benchmarks.store_concurrency [--threads 1,4,16] [--seconds 3]
+
+Each worker thread mixes creates, updates, get_interaction and
+list_interactions. The stress phase asserts on every read:
+- every interaction has all of its children (creates are atomic)
+- summary and outcome, which every update sets together, always match (no
+  half-applied update is visible)
+- the hcp/rep/sorted indexes agree with the rows once the threads stop
+
+The stress phase shrinks the interpreter's thread switch interval so that
+threads interleave inside store calls far more often than they would in
+production. The throughput phase runs the same mix against the store as-is (lock stripes,
+lock-free reads) and with every call wrapped in one global lock.
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+
+from app import crud, memory_store, schemas
+
+REPS = [f"rep_{i}" for i in range(8)]
+HCPS = [f"hcp_{i}" for i in range(32)]
+
+
+def make_interaction() -> schemas.InteractionCreate:
+    return schemas.InteractionCreate(
+        hcp_id=random.choice(HCPS),
+        rep_id=random.choice(REPS),
+        summary="v0",
+        outcome="v0",
+        samples=[schemas.SampleCreate(product_code="ABC-10", quantity=1),
+                 schemas.SampleCreate(product_code="XYZ-5", quantity=2)],
+        follow_ups=[schemas.FollowUpCreate(action_item="Send study data")],
+    )
+
+
+def check(inter: dict):
+    assert len(inter["samples"]) == 2 and len(inter["follow_ups"]) == 1, "partially created interaction"
+    assert inter["summary"] == inter["outcome"], "partially applied update"
+
+
+class Workload:
+    def __init__(self, store, verify: bool):
+        self.store = store
+        self.verify = verify
+        self.ids = [store.create_interaction(make_interaction())["id"] for _ in range(200)]
+        self.ops = 0
+        self.errors = []
+        self._stop = threading.Event()
+        self._ops_lock = threading.Lock()
+
+    def worker(self):
+        store, ops = self.store, 0
+        try:
+            while not self._stop.is_set():
+                roll = random.random()
+                if roll < 0.2:
+                    self.ids.append(store.create_interaction(make_interaction())["id"])
+                elif roll < 0.5:
+                    version = f"v{random.randrange(10 ** 6)}"
+                    patch = {"summary": version, "outcome": version}
+                    if random.random() < 0.3:
+                        patch["rep_id"] = random.choice(REPS)
+                        patch["datetime"] = f"2024-0{random.randint(1, 9)}-1{random.randint(0, 9)}T10:00:00"
+                    store.update_interaction(random.choice(self.ids), patch)
+                elif roll < 0.9:
+                    inter = store.get_interaction(random.choice(self.ids))
+                    if self.verify:
+                        check(inter)
+                else:
+                    page = store.list_interactions(rep_id=random.choice(REPS), limit=20)
+                    if self.verify:
+                        for inter in page:
+                            check(inter)
+                ops += 1
+        except Exception as e:
+            self.errors.append(repr(e))
+        with self._ops_lock:
+            self.ops += ops
+
+    def run(self, threads: int, seconds: float) -> float:
+        workers = [threading.Thread(target=self.worker) for _ in range(threads)]
+        start = time.perf_counter()
+        for w in workers:
+            w.start()
+        time.sleep(seconds)
+        self._stop.set()
+        for w in workers:
+            w.join()
+        return self.ops / (time.perf_counter() - start)
+
+
+class GlobalLockStore:
+    """The same store with every call serialized on a single lock"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        fn = getattr(memory_store, name)
+
+        def locked(*args, **kwargs):
+            with self._lock:
+                return fn(*args, **kwargs)
+        return locked
+
+
+def check_indexes():
+    """Index invariants once all writers have stopped"""
+    rows = memory_store._interactions
+    by_rep = {i: rep for rep, ids in memory_store._interactions_by_rep.items() for i in ids}
+    by_hcp = {i: hcp for hcp, ids in memory_store._interactions_by_hcp.items() for i in ids}
+    assert sum(len(ids) for ids in memory_store._interactions_by_rep.values()) == len(rows)
+    assert all(by_rep[i] == inter.rep_id and by_hcp[i] == inter.hcp_id for i, inter in rows.items())
+    assert len(memory_store._interaction_keys) == len(rows)
+
+    seen, cursor = [], None
+    while True:
+        page = crud.list_interactions(cursor=cursor, limit=500)
+        seen.extend(inter["id"] for inter in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(rows), "listing does not cover every interaction exactly once"
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", default="1,4,16")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+    thread_counts = [int(x) for x in args.threads.split(",")]
+
+    crud.set_backend(memory_store)
+    memory_store.reset_store()
+    stress = Workload(memory_store, verify=True)
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        stress.run(max(thread_counts), args.seconds)
+    finally:
+        sys.setswitchinterval(switch_interval)
+    if stress.errors:
+        raise SystemExit(f"stress test failed: {stress.errors[:3]}")
+    print(f"stress: {stress.ops} ops on {max(thread_counts)} threads, {check_indexes()} interactions, invariants hold")
+
+    print(f"{'threads':>7} {'striped ops/s':>14} {'global lock ops/s':>18}")
+    for threads in thread_counts:
+        memory_store.reset_store()
+        striped = Workload(memory_store, verify=False).run(threads, args.seconds)
+        memory_store.reset_store()
+        global_lock = Workload(GlobalLockStore(), verify=False).run(threads, args.seconds)
+        print(f"{threads:>7} {striped:>14.0f} {global_lock:>18.0f}")
+
+
+if __name__ == "__main__":
+    main()
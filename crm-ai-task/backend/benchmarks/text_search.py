@@ -0,0 +1,94 @@
+"""
+Full-text search: BM25 over the inverted index vs scanning every note
+
+Usage:
+    python -m benchmarks.text_search [--sizes 100000,1000000] [--queries 200]
+
+Generates 100k interaction-like notes (about 60 words drawn from a
+Zipf-distributed 20k-word vocabulary plus pharma terms, 50 reps, a year of
+dates), repeated under new ids up to each size, and indexes them directly,
+without a store. Reports index build time, array memory, the latency of
+rare, common, two-term and filtered queries, save/load time and file size,
+and a substring scan over the 100k raw notes for comparison.
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from app import text_search
+
+DOMAIN = ["dosing", "concerns", "efficacy", "nausea", "renal", "titration", "formulary", "adherence",
+          "hepatic", "label", "trial", "samples", "pricing", "access", "safety"]
+START = datetime(2026, 1, 1)
+
+
+def make_notes(count: int, seed: int = 3):
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(20000)]
+    cum_weights = list(itertools.accumulate(1 / (i + 1) for i in range(len(vocab))))
+    for i in range(count):
+        words = rng.choices(vocab, cum_weights=cum_weights, k=55) + rng.sample(DOMAIN, rng.randint(0, 3))
+        rng.shuffle(words)
+        yield {
+            "id": f"i{i:08d}", "hcp_id": f"hcp-{rng.randrange(5000)}", "rep_id": f"rep-{rng.randrange(50)}",
+            "datetime": START + timedelta(minutes=rng.randrange(365 * 24 * 60)), "created_at": START, "updated_at": START,
+            "summary": " ".join(words[:20]), "outcome": None, "source_raw": " ".join(words),
+        }
+
+
+def latency_ms(fn, calls: int) -> tuple:
+    times = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.95) - 1]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100000,1000000")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    queries = {
+        "rare term": dict(query="titration"),
+        "common term": dict(query="w3"),
+        "two terms": dict(query="dosing concerns"),
+        "two terms + rep": dict(query="dosing concerns", rep_id="rep-7"),
+        "+ date range": dict(query="dosing concerns", date_from=datetime(2026, 3, 1), date_to=datetime(2026, 3, 31)),
+    }
+    notes = list(make_notes(100000))
+    for size in (int(s) for s in args.sizes.split(",")):
+        index = text_search.SearchIndex()
+        index.rebuild({**note, "id": f"{n}-{note['id']}"} for n in range(-(-size // len(notes)))
+                      for note in notes[:size - n * len(notes)])
+        info = index.snapshot()
+        print(f"{size} notes: built in {index.rebuild_ms / 1000:.1f} s, {info['terms']} terms, "
+              f"{info['postings']} postings, {info['array_bytes'] / 2 ** 20:.0f} MiB of arrays")
+        for label, q in queries.items():
+            p50, p95 = latency_ms(lambda: index.search(**q, limit=20), args.queries)
+            hits = index.search(**q, limit=1)["total"]
+            print(f"  {label:<16} {hits:>8} hits  p50 {p50:7.2f} ms  p95 {p95:7.2f} ms")
+
+        start = time.perf_counter()
+        found = sum(1 for n in notes if "dosing" in n["source_raw"] or "concerns" in n["source_raw"])
+        print(f"  substring scan over {len(notes)} notes: {(time.perf_counter() - start) * 1000:.0f} ms ({found} hits)")
+
+        path = os.path.join(tempfile.mkdtemp(), "search.pkl")
+        index.save(path)
+        loaded = text_search.SearchIndex.load(path)
+        assert loaded.search("dosing concerns")["items"] == index.search("dosing concerns")["items"]
+        print(f"  save {index.last_save['ms'] / 1000:.1f} s ({index.last_save['bytes'] / 2 ** 20:.0f} MiB), "
+              f"load {loaded.load_ms / 1000:.1f} s")
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,38 +1,163 @@
 from langgraph.graph import StateGraph, END
+from langgraph.config import get_stream_writer
 from langchain_groq import ChatGroq
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_core.tools import tool
 from typing import TypedDict, Annotated, List
 from datetime import datetime
+import asyncio
+import functools
 import json
 import os
+import re
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
 # Initialize Groq LLM (lazy initialization)
 llm = None
+_llm_lock = threading.Lock()
 
-def get_llm():
-    """Get or create LLM instance"""
+# (wrapper, nodes) pairs applied by get_llm(); wrapper(llm, node) returns an
+# object with the same invoke/ainvoke/bind interface (e.g. a response cache).
+# nodes=None applies the wrapper to every caller. Wrappers registered first
+# sit closest to the real client.
+_llm_wrappers = []
+
+def get_llm(node: str = None):
+    """
+    Get or create LLM instance
+
+    Args:
+        node: Name of the calling node/tool, used to select per-node wrappers
+    """
     global llm
     if llm is None:
-        api_key = os.getenv("GROQ_API_KEY", "")
-        if not api_key:
-            raise ValueError("GROQ_API_KEY environment variable is not set")
-        llm = ChatGroq(
-            model="llama-3.1-8b-instant",
-            temperature=0.7,
-            groq_api_key=api_key
-        )
-    return llm
+        with _llm_lock:
+            if llm is None:
+                api_key = os.getenv("GROQ_API_KEY", "")
+                if not api_key:
+                    raise ValueError("GROQ_API_KEY environment variable is not set")
+                llm = ChatGroq(
+                    model="llama-3.1-8b-instant",
+                    temperature=0.7,
+                    groq_api_key=api_key
+                )
+    wrapped = llm
+    for wrapper, nodes in _llm_wrappers:
+        if nodes is None or node in nodes:
+            wrapped = wrapper(wrapped, node)
+    return wrapped
+
+def add_llm_wrapper(wrapper, nodes=None):
+    """
+    Wrap the LLM returned by get_llm()
+
+    Args:
+        wrapper: Callable (llm, node) -> llm-like object
+        nodes: Node names the wrapper applies to, or None for all
+    """
+    with _llm_lock:
+        _llm_wrappers.append((wrapper, frozenset(nodes) if nodes is not None else None))
+
+def remove_llm_wrapper(wrapper):
+    with _llm_lock:
+        _llm_wrappers[:] = [(w, n) for w, n in _llm_wrappers if w is not wrapper]
+
+# Optional rule-based extractor run by the pre_extract node:
+# (text, crud_functions) -> extracted_data with "field_confidence" and
+# "llm_fields" (the fields extract_entities must still ask the LLM for)
+_pre_extractor = None
+
+def set_pre_extractor(extractor):
+    """Install (or with None, remove) the pre_extract node's extractor"""
+    global _pre_extractor
+    _pre_extractor = extractor
+
+# Optional local sentiment classifier consulted before the LLM:
+# text -> {"sentiment", "confidence"}, or None to let the LLM decide
+_sentiment_backend = None
+
+def set_sentiment_backend(backend):
+    """Install (or with None, remove) the local sentiment backend"""
+    global _sentiment_backend
+    _sentiment_backend = backend
+
+def local_sentiment(text: str):
+    """The local backend's verdict for text, or None if the LLM should be asked"""
+    backend = _sentiment_backend
+    return backend(text) if backend is not None else None
+
+# Callables (node, seconds, error) told about every graph node run, e.g. to
+# record per-node latency; error is the exception raised, or None
+_node_observers = []
+
+def add_node_observer(observer):
+    with _llm_lock:
+        _node_observers.append(observer)
+
+def remove_node_observer(observer):
+    with _llm_lock:
+        _node_observers[:] = [o for o in _node_observers if o is not observer]
+
+def _notify(node: str, seconds: float, error):
+    for observer in list(_node_observers):
+        observer(node, seconds, error)
+
+def _observed(node: str, fn):
+    """Node function that reports its run time to the node observers"""
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def run(state):
+            if not _node_observers:
+                return await fn(state)
+            start, error = time.perf_counter(), None
+            try:
+                return await fn(state)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                _notify(node, time.perf_counter() - start, error)
+    else:
+        @functools.wraps(fn)
+        def run(state):
+            if not _node_observers:
+                return fn(state)
+            start, error = time.perf_counter(), None
+            try:
+                return fn(state)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                _notify(node, time.perf_counter() - start, error)
+    return run
+
+def set_llm(instance):
+    """Replace the shared LLM instance (e.g. with a fake chat model for offline load tests)"""
+    global llm
+    with _llm_lock:
+        llm = instance
+
+def llm_configured() -> bool:
+    """True if get_llm() can return a client without raising"""
+    return llm is not None or bool(os.getenv("GROQ_API_KEY", ""))
 
 # Import CRUD functions (will be passed as context)
 # For now, we'll create a state that can hold the CRUD functions
 
+def merge_extracted(left: dict, right: dict) -> dict:
+    """Reducer for extracted_data so parallel branches can each write their own keys"""
+    merged = dict(left or {})
+    merged.update(right or {})
+    return merged
+
 class AgentState(TypedDict):
     messages: Annotated[List, "messages"]
-    extracted_data: dict
+    extracted_data: Annotated[dict, merge_extracted]
     interaction_id: str | None
     crud_functions: dict  # Will hold references to CRUD functions
 
@@ -104,31 +229,20 @@ def search_hcp(name: str) -> List[dict]:
     """
     return []
 
-@tool
-def sentiment_analyzer(text: str) -> dict:
-    """
-    Analyze sentiment from text.
-    
-    Args:
-        text: Text to analyze
-    
-    Returns:
-        dict with sentiment (positive/neutral/negative) and confidence
-    """
-    # Use LLM to analyze sentiment
-    prompt = f"""Analyze the sentiment of this text and return ONLY a JSON object with "sentiment" (positive/neutral/negative) and "confidence" (0-1):
+def _sentiment_prompt(text: str) -> str:
+    return f"""Analyze the sentiment of this text and return ONLY a JSON object with "sentiment" (positive/neutral/negative) and "confidence" (0-1):
     
 Text: {text}
 
 JSON:"""
-    
-    response = get_llm().invoke([HumanMessage(content=prompt)])
+
+def _parse_sentiment(content: str) -> dict:
     try:
-        result = json.loads(response.content)
+        result = json.loads(content)
         return result
     except:
         # Fallback parsing
-        content = response.content.lower()
+        content = content.lower()
         if "positive" in content:
             return {"sentiment": "positive", "confidence": 0.8}
         elif "negative" in content:
@@ -137,27 +251,45 @@ JSON:"""
             return {"sentiment": "neutral", "confidence": 0.7}
 
 @tool
-def followup_suggestor(summary: str, sentiment: str = None) -> List[dict]:
+def sentiment_analyzer(text: str) -> dict:
     """
-    Suggest follow-up actions based on interaction summary.
+    Analyze sentiment from text.
     
     Args:
-        summary: Summary of the interaction
-        sentiment: Optional sentiment (positive/neutral/negative)
+        text: Text to analyze
     
     Returns:
-        List of suggested follow-up actions
+        dict with sentiment (positive/neutral/negative) and confidence
     """
-    prompt = f"""Based on this interaction summary, suggest 2-3 specific follow-up actions. Return ONLY a JSON array of objects with "action_item" (string) and "priority" (high/medium/low):
+    local = local_sentiment(text)
+    if local is not None:
+        return local
+    # Use LLM to analyze sentiment
+    response = get_llm("sentiment_analyzer").invoke([HumanMessage(content=_sentiment_prompt(text))])
+    return _parse_sentiment(response.content)
+
+async def _asentiment_analyzer(text: str) -> dict:
+    # The local classifier takes microseconds, so it runs inline
+    local = local_sentiment(text)
+    if local is not None:
+        return local
+    response = await get_llm("sentiment_analyzer").ainvoke([HumanMessage(content=_sentiment_prompt(text))])
+    return _parse_sentiment(response.content)
+
+# Native async implementation used by sentiment_analyzer.ainvoke
+sentiment_analyzer.coroutine = _asentiment_analyzer
+
+def _followup_prompt(summary: str, sentiment: str = None) -> str:
+    return f"""Based on this interaction summary, suggest 2-3 specific follow-up actions. Return ONLY a JSON array of objects with "action_item" (string) and "priority" (high/medium/low):
 
 Summary: {summary}
 Sentiment: {sentiment or "unknown"}
 
 JSON:"""
-    
-    response = get_llm().invoke([HumanMessage(content=prompt)])
+
+def _parse_followups(content: str, sentiment: str = None) -> List[dict]:
     try:
-        result = json.loads(response.content)
+        result = json.loads(content)
         if isinstance(result, list):
             return result
         else:
@@ -168,43 +300,126 @@ JSON:"""
             {"action_item": "Send requested materials", "priority": "high" if sentiment == "positive" else "low"}
         ]
 
+@tool
+def followup_suggestor(summary: str, sentiment: str = None) -> List[dict]:
+    """
+    Suggest follow-up actions based on interaction summary.
+    
+    Args:
+        summary: Summary of the interaction
+        sentiment: Optional sentiment (positive/neutral/negative)
+    
+    Returns:
+        List of suggested follow-up actions
+    """
+    response = get_llm("followup_suggestor").invoke([HumanMessage(content=_followup_prompt(summary, sentiment))])
+    return _parse_followups(response.content, sentiment)
+
+async def _afollowup_suggestor(summary: str, sentiment: str = None) -> List[dict]:
+    response = await get_llm("followup_suggestor").ainvoke([HumanMessage(content=_followup_prompt(summary, sentiment))])
+    return _parse_followups(response.content, sentiment)
+
+# Native async implementation used by followup_suggestor.ainvoke
+followup_suggestor.coroutine = _afollowup_suggestor
+
 # ==================== AGENT NODES ====================
 
-def extract_entities(state: AgentState):
-    """Extract entities from user message using LLM"""
-    messages = state["messages"]
-    last_message = messages[-1].content if messages else ""
-    
+# Fields extract_entities produces, with their prompt descriptions
+EXTRACTION_FIELDS = ("hcp_name", "datetime", "summary", "materials", "samples", "topics", "outcome")
+_FIELD_PROMPTS = {
+    "hcp_name": "- hcp_name: Name of the healthcare professional",
+    "datetime": "- datetime: Date and time (ISO format if available)",
+    "summary": "- summary: Summary of discussion",
+    "materials": '- materials: Array of {"material_type": str, "quantity": int} if mentioned',
+    "samples": '- samples: Array of {"product_code": str, "quantity": int} if mentioned',
+    "topics": "- topics: Array of discussion topics",
+    "outcome": "- outcome: Any outcomes or decisions",
+}
+
+def _extraction_messages(text: str, fields=EXTRACTION_FIELDS) -> list:
+    field_lines = "\n".join(_FIELD_PROMPTS[f] for f in fields)
     extraction_prompt = f"""Extract the following information from this text and return ONLY valid JSON:
-- hcp_name: Name of the healthcare professional
-- datetime: Date and time (ISO format if available)
-- summary: Summary of discussion
-- materials: Array of {{"material_type": str, "quantity": int}} if mentioned
-- samples: Array of {{"product_code": str, "quantity": int}} if mentioned
-- topics: Array of discussion topics
-- outcome: Any outcomes or decisions
+{field_lines}
 
-Text: {last_message}
+Text: {text}
 
 Return JSON:"""
-    
-    response = get_llm().invoke([SystemMessage(content="You are an expert at extracting structured data from medical rep conversations."), 
-                           HumanMessage(content=extraction_prompt)])
-    
+    return [SystemMessage(content="You are an expert at extracting structured data from medical rep conversations."),
+            HumanMessage(content=extraction_prompt)]
+
+def _fallback_extraction(text: str) -> dict:
+    return {
+        "hcp_name": "",
+        "summary": text,
+        "materials": [],
+        "samples": [],
+        "topics": [],
+        "outcome": None
+    }
+
+def _parse_extraction(content: str, text: str) -> dict:
     try:
-        extracted = json.loads(response.content)
-        state["extracted_data"] = extracted
+        return json.loads(content)
     except:
         # Fallback extraction
-        state["extracted_data"] = {
-            "hcp_name": "",
-            "summary": last_message,
-            "materials": [],
-            "samples": [],
-            "topics": [],
-            "outcome": None
-        }
+        return _fallback_extraction(text)
+
+def pre_extract_node(state: AgentState):
+    """Rule-based extraction ahead of the LLM (no-op unless an extractor is installed)"""
+    extractor = _pre_extractor
+    messages = state["messages"]
+    if extractor is None or not messages:
+        return {}
+    return {"extracted_data": extractor(messages[-1].content, state.get("crud_functions", {}))}
+
+async def apre_extract_node(state: AgentState):
+    """Async variant of pre_extract_node; the gazetteer lookup runs in a worker thread"""
+    if _pre_extractor is None:
+        return {}
+    return await asyncio.to_thread(pre_extract_node, state)
+
+def _llm_fields(state: AgentState):
+    """Fields still needing the LLM after pre_extract (all of them if it didn't run)"""
+    llm_fields = state.get("extracted_data", {}).get("llm_fields")
+    return EXTRACTION_FIELDS if llm_fields is None else llm_fields
+
+def _merge_extraction(state: AgentState, fields, content: str, text: str) -> dict:
+    """Rule values for confident fields, LLM values for the rest"""
+    extracted = state.get("extracted_data", {})
+    parsed = _parse_extraction(content, text)
+    if not isinstance(parsed, dict):
+        parsed = _fallback_extraction(text)
+    if fields == EXTRACTION_FIELDS and "llm_fields" not in extracted:
+        return parsed
+    merged = dict(extracted)
+    fallback = _fallback_extraction(text)
+    for field in fields:
+        merged[field] = parsed.get(field, fallback.get(field))
+    return merged
+
+def extract_entities(state: AgentState):
+    """Extract entities from user message using LLM"""
+    messages = state["messages"]
+    last_message = messages[-1].content if messages else ""
+    fields = _llm_fields(state)
+    if not fields:
+        # pre_extract was confident about every field
+        return state
+    
+    response = get_llm("extract_entities").invoke(_extraction_messages(last_message, fields))
+    state["extracted_data"] = _merge_extraction(state, fields, response.content, last_message)
+    return state
+
+async def aextract_entities(state: AgentState):
+    """Async variant of extract_entities"""
+    messages = state["messages"]
+    last_message = messages[-1].content if messages else ""
+    fields = _llm_fields(state)
+    if not fields:
+        return state
     
+    response = await get_llm("extract_entities").ainvoke(_extraction_messages(last_message, fields))
+    state["extracted_data"] = _merge_extraction(state, fields, response.content, last_message)
     return state
 
 def analyze_sentiment_node(state: AgentState):
@@ -219,6 +434,18 @@ def analyze_sentiment_node(state: AgentState):
     
     return state
 
+async def aanalyze_sentiment_node(state: AgentState):
+    """Async variant of analyze_sentiment_node"""
+    extracted = state.get("extracted_data", {})
+    summary = extracted.get("summary", "")
+    
+    if summary:
+        sentiment_result = await sentiment_analyzer.ainvoke({"text": summary})
+        extracted["sentiment"] = sentiment_result.get("sentiment", "neutral")
+        state["extracted_data"] = extracted
+    
+    return state
+
 def suggest_followups_node(state: AgentState):
     """Generate follow-up suggestions"""
     extracted = state.get("extracted_data", {})
@@ -232,6 +459,152 @@ def suggest_followups_node(state: AgentState):
     
     return state
 
+async def asuggest_followups_node(state: AgentState):
+    """Async variant of suggest_followups_node"""
+    extracted = state.get("extracted_data", {})
+    summary = extracted.get("summary", "")
+    sentiment = extracted.get("sentiment", "neutral")
+    
+    if summary:
+        followups = await followup_suggestor.ainvoke({"summary": summary, "sentiment": sentiment})
+        extracted["suggested_follow_ups"] = followups
+        state["extracted_data"] = extracted
+    
+    return state
+
+# Parallel branches: each returns only its own extracted_data keys and never
+# mutates shared state, so the merge_extracted reducer can combine them
+
+def sentiment_branch(state: AgentState):
+    """Sentiment for the extracted summary"""
+    summary = state.get("extracted_data", {}).get("summary", "")
+    if not summary:
+        return {}
+    sentiment_result = sentiment_analyzer.invoke({"text": summary})
+    return {"extracted_data": {"sentiment": sentiment_result.get("sentiment", "neutral")}}
+
+async def asentiment_branch(state: AgentState):
+    """Async variant of sentiment_branch"""
+    summary = state.get("extracted_data", {}).get("summary", "")
+    if not summary:
+        return {}
+    sentiment_result = await sentiment_analyzer.ainvoke({"text": summary})
+    return {"extracted_data": {"sentiment": sentiment_result.get("sentiment", "neutral")}}
+
+def followups_branch(state: AgentState):
+    """Follow-up suggestions; runs alongside sentiment so no sentiment hint is passed"""
+    summary = state.get("extracted_data", {}).get("summary", "")
+    if not summary:
+        return {}
+    followups = followup_suggestor.invoke({"summary": summary})
+    return {"extracted_data": {"suggested_follow_ups": followups}}
+
+async def afollowups_branch(state: AgentState):
+    """Async variant of followups_branch"""
+    summary = state.get("extracted_data", {}).get("summary", "")
+    if not summary:
+        return {}
+    followups = await followup_suggestor.ainvoke({"summary": summary})
+    return {"extracted_data": {"suggested_follow_ups": followups}}
+
+def resolve_hcp_branch(state: AgentState):
+    """
+    Look up the extracted HCP name with the "resolve_hcp" CRUD function
+
+    Writes hcp_id (None if there is no confident match) so the service layer
+    only has to create a new HCP, not search again.
+    """
+    extracted = state.get("extracted_data", {})
+    hcp_name = extracted.get("hcp_name")
+    resolve_hcp = state.get("crud_functions", {}).get("resolve_hcp")
+    if not hcp_name or resolve_hcp is None or extracted.get("hcp_id"):
+        # Nothing to look up, or pre_extract already matched a known HCP
+        return {}
+    hcp = resolve_hcp(hcp_name)
+    return {"extracted_data": {"hcp_id": hcp["id"] if hcp else None}}
+
+async def aresolve_hcp_branch(state: AgentState):
+    """Async variant of resolve_hcp_branch; the CRUD lookup runs in a worker thread"""
+    return await asyncio.to_thread(resolve_hcp_branch, state)
+
+def _single_call_messages(text: str) -> list:
+    prompt = f"""Analyze this medical rep's note about a meeting with a healthcare professional and return ONLY a JSON object with these keys:
+- hcp_name: Name of the healthcare professional
+- datetime: Date and time (ISO format if available, else null)
+- summary: Summary of discussion
+- materials: Array of {{"material_type": str, "quantity": int}} (empty if none)
+- samples: Array of {{"product_code": str, "quantity": int}} (empty if none)
+- topics: Array of discussion topics
+- outcome: Any outcomes or decisions (or null)
+- sentiment: {{"label": "positive" | "neutral" | "negative", "confidence": number 0-1}}
+- follow_ups: Array of 2-3 specific follow-up actions {{"action_item": str, "priority": "high" | "medium" | "low"}}
+
+Text: {text}
+
+JSON:"""
+    return [SystemMessage(content="You are an expert at extracting structured data from medical rep conversations."),
+            HumanMessage(content=prompt)]
+
+def _parse_single_call(content: str, text: str) -> dict:
+    """Map the single-call payload onto the same extracted_data shape the multi-call graph produces"""
+    try:
+        data = json.loads(content)
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object")
+    except:
+        data = {}
+
+    if data:
+        extracted = {key: data.get(key) for key in
+                     ("hcp_name", "datetime", "summary", "materials", "samples", "topics", "outcome")}
+    else:
+        extracted = _fallback_extraction(text)
+    for key in ("materials", "samples", "topics"):
+        extracted[key] = extracted.get(key) or []
+
+    sentiment = data.get("sentiment")
+    if isinstance(sentiment, dict):
+        label, confidence = sentiment.get("label"), sentiment.get("confidence")
+    else:
+        label, confidence = sentiment, None
+    label = (label or "neutral").lower()
+    extracted["sentiment"] = label if label in ("positive", "neutral", "negative") else "neutral"
+    extracted["sentiment_confidence"] = confidence
+
+    follow_ups = data.get("follow_ups")
+    if not isinstance(follow_ups, list) or not follow_ups:
+        follow_ups = _parse_followups("", extracted["sentiment"])
+    extracted["suggested_follow_ups"] = follow_ups
+    return extracted
+
+def _json_llm():
+    # JSON mode so the single response is always a parseable object
+    return get_llm("extract_all").bind(response_format={"type": "json_object"})
+
+def single_call_extract(text: str) -> dict:
+    """Entities, sentiment and follow-ups in one LLM round trip"""
+    response = _json_llm().invoke(_single_call_messages(text))
+    return _parse_single_call(response.content, text)
+
+async def asingle_call_extract(text: str) -> dict:
+    """Async variant of single_call_extract"""
+    response = await _json_llm().ainvoke(_single_call_messages(text))
+    return _parse_single_call(response.content, text)
+
+def extract_all_node(state: AgentState):
+    """Extract entities, sentiment and follow-ups with a single LLM call"""
+    messages = state["messages"]
+    last_message = messages[-1].content if messages else ""
+    state["extracted_data"] = single_call_extract(last_message)
+    return state
+
+async def aextract_all_node(state: AgentState):
+    """Async variant of extract_all_node"""
+    messages = state["messages"]
+    last_message = messages[-1].content if messages else ""
+    state["extracted_data"] = await asingle_call_extract(last_message)
+    return state
+
 def log_interaction_node(state: AgentState):
     """Log the interaction using the log_interaction tool"""
     extracted = state.get("extracted_data", {})
@@ -263,28 +636,79 @@ def generate_response(state: AgentState):
             response_text += f"{i}. {fu.get('action_item', 'N/A')} ({fu.get('priority', 'medium')} priority)\n"
     
     state["messages"].append(AIMessage(content=response_text))
+
+    # Emit the text token by token for astream(stream_mode="custom") consumers;
+    # a no-op for invoke/ainvoke
+    writer = get_stream_writer()
+    for token in re.findall(r"\s*\S+", response_text):
+        writer({"token": token})
     return state
 
 # ==================== GRAPH DEFINITION ====================
 
-def create_agent():
-    """Create the LangGraph agent"""
+# "sequential": extract_entities -> analyze_sentiment -> suggest_followups (three LLM calls)
+# "single_call": extract_all (one structured LLM call returning the full payload)
+# "parallel": extract_entities, then sentiment / follow-ups / HCP lookup as concurrent branches
+# sequential and parallel start with pre_extract, which lets extract_entities
+# skip fields (or the whole call) that rules already extracted
+AGENT_MODES = ("sequential", "single_call", "parallel")
+
+def create_agent(use_async: bool = False, mode: str = "sequential"):
+    """
+    Create the LangGraph agent
+
+    Args:
+        use_async: Use the async LLM nodes; the graph must then be run with ainvoke/astream
+        mode: One of AGENT_MODES
+    """
+    if mode not in AGENT_MODES:
+        raise ValueError(f"Unknown agent mode: {mode}")
+
     workflow = StateGraph(AgentState)
-    
+
+    def add_node(name, fn):
+        # Every node reports its run time to the node observers
+        workflow.add_node(name, _observed(name, fn))
+
     # Add nodes
-    workflow.add_node("extract_entities", extract_entities)
-    workflow.add_node("analyze_sentiment", analyze_sentiment_node)
-    workflow.add_node("suggest_followups", suggest_followups_node)
-    workflow.add_node("log_interaction", log_interaction_node)
-    workflow.add_node("generate_response", generate_response)
-    
-    # Set entry point
-    workflow.set_entry_point("extract_entities")
+    if mode != "single_call":
+        add_node("pre_extract", apre_extract_node if use_async else pre_extract_node)
+    if mode == "single_call":
+        add_node("extract_all", aextract_all_node if use_async else extract_all_node)
+    elif mode == "parallel":
+        add_node("extract_entities", aextract_entities if use_async else extract_entities)
+        add_node("analyze_sentiment", asentiment_branch if use_async else sentiment_branch)
+        add_node("suggest_followups", afollowups_branch if use_async else followups_branch)
+        add_node("resolve_hcp", aresolve_hcp_branch if use_async else resolve_hcp_branch)
+    elif use_async:
+        add_node("extract_entities", aextract_entities)
+        add_node("analyze_sentiment", aanalyze_sentiment_node)
+        add_node("suggest_followups", asuggest_followups_node)
+    else:
+        add_node("extract_entities", extract_entities)
+        add_node("analyze_sentiment", analyze_sentiment_node)
+        add_node("suggest_followups", suggest_followups_node)
+    add_node("log_interaction", log_interaction_node)
+    add_node("generate_response", generate_response)
     
-    # Add edges
-    workflow.add_edge("extract_entities", "analyze_sentiment")
-    workflow.add_edge("analyze_sentiment", "suggest_followups")
-    workflow.add_edge("suggest_followups", "log_interaction")
+    # Set entry point and add edges
+    if mode == "single_call":
+        workflow.set_entry_point("extract_all")
+        workflow.add_edge("extract_all", "log_interaction")
+    elif mode == "parallel":
+        branches = ["analyze_sentiment", "suggest_followups", "resolve_hcp"]
+        workflow.set_entry_point("pre_extract")
+        workflow.add_edge("pre_extract", "extract_entities")
+        for branch in branches:
+            workflow.add_edge("extract_entities", branch)
+        # Join: log_interaction runs once, after every branch has finished
+        workflow.add_edge(branches, "log_interaction")
+    else:
+        workflow.set_entry_point("pre_extract")
+        workflow.add_edge("pre_extract", "extract_entities")
+        workflow.add_edge("extract_entities", "analyze_sentiment")
+        workflow.add_edge("analyze_sentiment", "suggest_followups")
+        workflow.add_edge("suggest_followups", "log_interaction")
     workflow.add_edge("log_interaction", "generate_response")
     workflow.add_edge("generate_response", END)
     